@@ -0,0 +1,68 @@
+import json
+
+from django.conf import settings
+from django.db import models
+
+from api.models import Image
+from plugins.cache import LRUCache
+
+
+class DetectionCache:
+    """
+    Detection 결과 캐시
+    1. 프로세스 내부 LRU 캐시(바이트 예산 기반, Image 필드 값을 저장하고 조회할 때마다 새 인스턴스 생성)
+    2. Image 모델의 digest 컬럼(인덱스)을 이용한 영구 캐시
+
+    캐시 키는 api.pipeline.detection_key 로 생성(업로드 바이트 + crop/watermark 옵션 + 검출 엔진 설정)
+    """
+
+    def __init__(self, max_bytes):
+        self.memory = LRUCache(max_bytes)
+
+    @staticmethod
+    def snapshot(image):
+        """
+        메모리 캐시에 저장하는 Image 필드 값
+        - 모델 인스턴스(FieldFile, JSON dict)를 스레드 간에 공유하지 않도록 파일은 이름, 검출 정보는 JSON 문자열
+        """
+        values = {}
+        for field in image._meta.concrete_fields:
+            value = getattr(image, field.attname)
+            if isinstance(field, models.FileField):
+                value = value.name
+            values[field.attname] = value
+        values["detection_info"] = json.dumps(values["detection_info"])
+        return values
+
+    @staticmethod
+    def restore(values):
+        """ snapshot 으로 새 Image 인스턴스 생성(요청마다 별도 인스턴스) """
+        values = dict(values, detection_info=json.loads(values["detection_info"]))
+        return Image.from_db(Image.objects.db, list(values), list(values.values()))
+
+    @staticmethod
+    def sizeof(values):
+        # 메모리 캐시에 올라가는 snapshot 의 대략적인 크기
+        return sum(len(value) for value in values.values() if isinstance(value, (str, bytes)))
+
+    def get(self, key):
+        values = self.memory.get(key)
+        # 삭제된 행(sweep_media 가 파일을 삭제할 수 있음)은 반환하지 않도록 행이 있는지 확인
+        if values is not None:
+            if Image.objects.filter(pk=values["id"]).exists():
+                return self.restore(values)
+            self.memory.delete(key)
+        image = Image.objects.filter(digest=key).order_by("-pk").first()
+        if image is not None:
+            self.set(key, image)
+        return image
+
+    def set(self, key, image):
+        values = self.snapshot(image)
+        self.memory.set(key, values, self.sizeof(values))
+
+    def clear(self):
+        self.memory.clear()
+
+
+detection_cache = DetectionCache(settings.DETECTION_CACHE_MAX_BYTES)
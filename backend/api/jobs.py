@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections
+
+from api.models import Job
+from api.pipeline import run_detection
+from api.serializers import JobSerializer
+from plugins.engines import send
+from plugins.ingest import open_buffer
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """
+    비동기 작업(Job) 실행기
+    - 작업 상태는 Job 테이블(SQLite)에 기록하고, 처리는 프로세스 내부 스레드 풀에서 수행
+    - 실행 중 + 대기 중인 작업 수를 max_workers + max_pending 으로 제한
+
+    Keyword arguments:
+        max_workers -- 동시에 처리할 작업 수
+        max_pending -- 대기열 크기
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def submit(self, job, url=None, key=None):
+        """ 작업 등록, 대기열이 가득 찬 경우 False 반환 """
+        if not self.slots.acquire(blocking=False):
+            return False
+        future = self.executor.submit(self._work, self.run, job.pk, url, key)
+        future.add_done_callback(lambda _: self.slots.release())
+        return True
+
+    def _work(self, func, *args):
+        # 작업 스레드의 DB 연결 정리
+        close_old_connections()
+        try:
+            func(*args)
+        finally:
+            close_old_connections()
+
+    def start(self):
+        """
+        서버 시작 시 호출(wsgi.py, asgi.py), JOB_RECOVER_ON_STARTUP 이면 중단된 작업 정리
+        - 요청 처리를 막지 않도록 작업 스레드에서 실행(ASGI 서버의 event loop 밖에서 DB 사용)
+        """
+        if settings.JOB_RECOVER_ON_STARTUP:
+            self.executor.submit(self._work, self.recover)
+
+    def recover(self):
+        """
+        이전 프로세스에서 대기/실행 중이던 작업을 실패로 기록
+        - 대기열은 프로세스 메모리에만 있으므로 재시작(장애) 후에는 처리되지 않고 상태가 남음
+        - OCR 엔진 주소, key 는 저장하지 않으므로 다시 실행하지 않고 입력 이미지 삭제 후 콜백 전송
+        - 작업을 실행하는 프로세스는 기록하지 않으므로 다른 프로세스에서 실행 중인 작업도 실패로 기록
+          (JOB_RECOVER_ON_STARTUP 은 서버를 하나의 프로세스로 실행하는 경우에만 사용)
+
+        Returns:
+            실패로 기록한 작업 수
+        """
+        jobs = Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING])
+        count = 0
+        for job in jobs.iterator():
+            job.status = Job.FAILED
+            job.error = "서버가 재시작되어 작업이 중단되었습니다."
+            if job.upload:
+                job.upload.delete(save=False)
+            job.save()
+            if job.callback:
+                self.notify(job)
+            count += 1
+        if count:
+            logger.warning("중단된 작업 %d개를 실패로 기록했습니다.", count)
+        return count
+
+    def run(self, job_id, url=None, key=None):
+        """
+        작업 처리
+        1. 저장된 입력 이미지에서 표 영역 검출 후 Image 저장
+        2. OCR 엔진 주소(url)가 주어진 경우 문자 인식 요청
+        3. 작업 결과 저장 후 콜백 주소로 결과 전송
+
+        Keyword arguments:
+            job_id -- Job primary key
+            url -- OCR engine url
+            key -- OCR engine secret key
+        """
+        job = Job.objects.get(pk=job_id)
+        job.status = Job.RUNNING
+        job.save(update_fields=["status", "updated_at"])
+        try:
+            # 저장된 입력 이미지는 mmap 으로 읽음
+            with job.upload.open("rb") as f, open_buffer(f) as data:
+                job.image, _ = run_detection(data, crop=job.crop, watermark=job.watermark)
+                if url:
+                    filename = os.path.basename(job.upload.name)
+                    job.recognition = send(data, filename, job.content_type, url, key)
+            job.status = Job.DONE
+        except Exception as ex:
+            job.status = Job.FAILED
+            job.error = str(ex)
+        # 처리가 끝난 입력 이미지는 삭제
+        job.upload.delete(save=False)
+        job.save()
+        if job.callback:
+            self.notify(job)
+
+    def notify(self, job):
+        try:
+            requests.post(
+                job.callback, json=JobSerializer(job).data, timeout=settings.JOB_CALLBACK_TIMEOUT
+            )
+        except requests.RequestException as ex:
+            logger.warning("콜백 전송에 실패했습니다. %s %s", job.callback, ex)
+
+
+job_runner = JobRunner(settings.JOB_WORKERS, settings.JOB_QUEUE_SIZE)
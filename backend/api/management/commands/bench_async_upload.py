@@ -0,0 +1,184 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+import httpx
+import uvicorn
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+
+from plugins.engines import LatencyStats
+from plugins.stub import StubOCRServer
+from plugins.synthetic import encode, make_table_image
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    스레드 수가 고정된 WSGI 서버(gunicorn --threads 와 같은 방식)
+    - 스레드가 모두 OCR 응답을 기다리는 동안 다른 요청은 대기
+    """
+
+    request_queue_size = 1024
+
+    def __init__(self, address, threads):
+        super().__init__(address, QuietHandler)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_wsgi(threads):
+    server = PooledWSGIServer(("127.0.0.1", 0), threads)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    return "http://127.0.0.1:{}".format(server.server_port), stop
+
+
+def serve_asgi():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(
+        uvicorn.Config(get_asgi_application(), lifespan="off", log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+
+    return "http://127.0.0.1:{}".format(sock.getsockname()[1]), stop
+
+
+async def load(url, uploads, ocr_url, concurrency):
+    """
+    concurrency 개의 요청을 동시에 유지하며 uploads 를 모두 전송
+
+    Returns:
+        (경과 시간(seconds), LatencyStats)
+    """
+    latency = LatencyStats(max_samples=len(uploads))
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+
+        async def upload(index, data):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        url,
+                        files={"file": ("table{}.jpg".format(index), data, "image/jpeg")},
+                        headers={"URL": ocr_url, "API-KEY": "key"},
+                    )
+                    error = response.status_code >= 400
+                except httpx.HTTPError:
+                    error = True
+                latency.record(time.perf_counter() - started, error=error)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[upload(index, data) for index, data in enumerate(uploads)])
+        return time.perf_counter() - started, latency
+
+
+class Command(BaseCommand):
+    help = "로컬 OCR 엔진 stub 으로 WSGI(sync view)와 ASGI(async view) 업로드 처리량, 지연 시간 비교"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="전송할 업로드 수")
+        parser.add_argument("--concurrency", type=int, default=64, help="동시 요청 수")
+        parser.add_argument("--threads", type=int, default=8, help="WSGI 서버의 스레드 수")
+        parser.add_argument("--delay", type=float, default=1.0, help="stub 의 요청당 처리 시간")
+        parser.add_argument(
+            "--unique",
+            action="store_true",
+            help="업로드마다 다른 이미지 사용(표 영역 검출 포함, 기본값: 같은 이미지로 OCR 대기만 측정)",
+        )
+        parser.add_argument("--size", type=int, default=1024, help="업로드 이미지의 가장 긴 변(px)")
+
+    def handle(self, *args, **options):
+        if options["unique"]:
+            uploads = [
+                encode(make_table_image(options["size"], seed=index))
+                for index in range(options["requests"])
+            ]
+        else:
+            uploads = [encode(make_table_image(options["size"]))] * options["requests"]
+
+        # 개발 DB, media 디렉터리 대신 테스트 DB, 임시 디렉터리에 저장
+        media_root = tempfile.mkdtemp()
+        if connection.vendor == "sqlite":
+            # 메모리 DB 는 여러 스레드가 동시에 저장하면 대기 없이 실패하므로 파일 DB 사용
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(media_root, "bench.sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            with override_settings(MEDIA_ROOT=media_root), StubOCRServer(
+                delay=options["delay"]
+            ) as stub:
+                self.stdout.write(
+                    "{:<28} {:>10} {:>10} {:>10} {:>8}".format(
+                        "server", "req/s", "p50(ms)", "p99(ms)", "errors"
+                    )
+                )
+                for name, path, serve in [
+                    ("wsgi ({} threads)".format(options["threads"]), "/api/upload/",
+                     lambda: serve_wsgi(options["threads"])),
+                    ("asgi (1 event loop)", "/api/upload/async/", serve_asgi),
+                ]:
+                    base_url, stop = serve()
+                    try:
+                        # 연결, 캐시 준비
+                        asyncio.run(load(base_url + path, uploads[:1], stub.url, 1))
+                        elapsed, latency = asyncio.run(
+                            load(base_url + path, uploads, stub.url, options["concurrency"])
+                        )
+                    finally:
+                        stop()
+                    stats = latency.snapshot()
+                    self.stdout.write(
+                        "{:<28} {:>10.1f} {:>10.1f} {:>10.1f} {:>8}".format(
+                            name,
+                            len(uploads) / elapsed,
+                            stats["p50"] * 1000,
+                            stats["p99"] * 1000,
+                            stats["errors"],
+                        )
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
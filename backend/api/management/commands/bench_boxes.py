@@ -0,0 +1,93 @@
+import json
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from plugins.boxes import pack_boxes, unpack_boxes
+from plugins.detector import Detection
+from plugins.synthetic import encode, make_table_image
+
+# 비교할 표(이름, make_table_image 옵션, Detection 옵션)
+TABLES = [
+    ("20x8", {"rows": 20, "cols": 8}, {}),
+    ("100x50", {"size": 4000, "rows": 100, "cols": 50}, {"max_size": 4000, "tile_size": 1024}),
+    (
+        "100x50 grid",
+        {"size": 4000, "rows": 100, "cols": 50},
+        {"max_size": 4000, "tile_size": 1024, "grid_engine": "projection"},
+    ),
+]
+
+
+def min_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times)
+
+
+class Command(BaseCommand):
+    help = "bounding_boxes 저장 크기, 저장/조회 시 직렬화 시간 비교(JSON 전체 컨투어 vs 정수 배열)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=7, help="반복 횟수")
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        self.stdout.write(
+            "{:<14} {:>7} {:>10} {:>11} {:>11}".format(
+                "", "boxes", "row(KB)", "write(ms)", "read(ms)"
+            )
+        )
+        for name, table, detection in TABLES:
+            detector = Detection(roi_preview_size=800, render_result=False, **detection)
+            data = encode(make_table_image(**table))
+            result = detector.detect(data)
+            grid = result.bounding_boxes.get("grid")
+            after = result.bounding_boxes["boxes"]
+            if grid is not None:
+                before = {"boxes": after, "grid": grid}
+            else:
+                # 이전 저장 형식: 작은 컨투어를 포함한 get_frame 결과 전체
+                img = cv2.imdecode(np.frombuffer(result.original_img, np.uint8), cv2.IMREAD_COLOR)
+                before = {"boxes": detector.get_frame(img)}
+            before_json = json.dumps(before)
+            spans = grid["cells"] if grid else None
+            packed = pack_boxes(after, spans)
+            info = {"grid": {"rows": grid["rows"], "cols": grid["cols"]}} if grid else {}
+            info = json.dumps(info)
+
+            def read_after():
+                array = unpack_boxes(packed)
+                data = {"boxes": array[:, :4].tolist()}
+                if grid:
+                    data["grid"] = dict(json.loads(info)["grid"], cells=array[:, 4:].tolist())
+                return json.dumps(data)
+
+            rows = [
+                (
+                    "JSON",
+                    len(before["boxes"]),
+                    len(before_json),
+                    min_ms(lambda: json.dumps(before), repeat),
+                    min_ms(lambda: json.dumps(json.loads(before_json)), repeat),
+                ),
+                (
+                    "packed",
+                    len(after),
+                    len(packed) + len(info),
+                    min_ms(lambda: pack_boxes(after, spans), repeat),
+                    min_ms(read_after, repeat),
+                ),
+            ]
+            self.stdout.write(name)
+            for label, count, size, write, read in rows:
+                self.stdout.write(
+                    "  {:<12} {:>7} {:>10.1f} {:>11.3f} {:>11.3f}".format(
+                        label, count, size / 1024, write, read
+                    )
+                )
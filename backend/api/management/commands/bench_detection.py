@@ -0,0 +1,184 @@
+import json
+import os
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from plugins.detector import FULL_DECODE_FLAG, Detection
+from plugins.synthetic import encode, make_table_image
+
+BASELINE_PATH = settings.BASE_DIR / "benchmarks" / "detection_baseline.json"
+
+
+def measure(func, repeat):
+    """
+    func 를 repeat 번 실행해 최소 시간(ms)과 최대 메모리 사용량(MB) 측정
+    - 다른 프로세스의 영향을 줄이기 위해 중간값 대신 최소 시간 사용
+    - 메모리는 별도 1회 실행에서 tracemalloc 으로 추적되는 할당(numpy 배열 포함) 기준
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak / 1024 / 1024
+
+
+def bench_stages(data, watermark, repeat, options):
+    """
+    Detection 단계별 실행 시간 측정
+    - 각 단계는 앞 단계의 결과 이미지를 입력으로 사용
+    """
+    # 단계별 측정은 양식(template) 재사용, 타일 분할 없이 수행
+    format_detector = Detection(**dict(options, template_capacity=0, tile_size=0))
+    results = {}
+
+    def stage(name, func):
+        results[name] = measure(func, repeat)
+        return func()
+
+    flag = FULL_DECODE_FLAG
+    if format_detector.reduced_decode:
+        flag = format_detector.decode_flag(
+            data, format_detector.max_size * format_detector.crop_headroom
+        )
+    orig = stage("decode", lambda: cv2.imdecode(np.frombuffer(data, np.uint8), flag))
+    target_size = format_detector.max_size if format_detector.roi_preview_size else None
+    img = stage(
+        "crop_roi",
+        lambda: format_detector.crop_roi(
+            orig, orig, target_size=target_size, reduced=flag != FULL_DECODE_FLAG
+        ),
+    )
+    img = stage("resize_image", lambda: format_detector.resize_image(img))
+    stage("encode", lambda: format_detector.encoder.encode(img))
+    frame_input = img
+    if watermark:
+        frame_input = stage("remove_wm", lambda: format_detector.remove_wm(img))
+    boxes = stage("get_frame", lambda: format_detector.get_frame(frame_input))
+    # 투영 프로파일 격자(grid_engine="projection")
+    stage("get_grid", lambda: format_detector.get_grid(frame_input))
+    if options.get("tile_size"):
+        tiled = Detection(**dict(options, template_capacity=0))
+        stage("get_frame_tiled", lambda: tiled.get_frame(frame_input))
+    detector = Detection(**options)
+    if options.get("template_capacity"):
+        # 등록된 양식과 레이아웃이 같은 경우(첫 실행에서 등록, 이후 셀 좌표 재사용)
+        stage("get_frame_template", lambda: detector.get_frame(frame_input))
+    stage("draw_frame", lambda: format_detector.draw_frame(img.copy(), boxes))
+    stage("detect", lambda: detector.detect(data, watermark=watermark))
+    return results
+
+
+class Command(BaseCommand):
+    help = "합성 표 이미지로 Detection 단계별 실행 시간, 처리량, 메모리 사용량 측정 및 baseline 비교"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="1024,2048,4000", help="이미지의 가장 긴 변(px) 목록"
+        )
+        parser.add_argument("--rows", type=int, default=20)
+        parser.add_argument("--cols", type=int, default=8)
+        parser.add_argument("--skew", type=float, default=0.05)
+        parser.add_argument("--watermark", action="store_true", help="워터마크 이미지로 측정")
+        parser.add_argument("--repeat", type=int, default=7, help="단계별 반복 횟수")
+        parser.add_argument(
+            "--max-size", type=int, help="결과 이미지의 최대 크기(px, 기본값: DETECTION_OPTIONS)"
+        )
+        parser.add_argument(
+            "--tile-size", type=int, help="get_frame 타일 높이(px, 기본값: DETECTION_OPTIONS)"
+        )
+        parser.add_argument(
+            "--template-capacity",
+            type=int,
+            help="재사용할 양식(template) 수(get_frame_template 단계 측정, 기본값: DETECTION_OPTIONS)",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            nargs="?",
+            const=str(BASELINE_PATH),
+            help="측정 결과를 baseline 으로 저장",
+        )
+        parser.add_argument(
+            "--compare",
+            nargs="?",
+            const=str(BASELINE_PATH),
+            help="baseline 과 비교해 느려진 단계가 있으면 실패",
+        )
+        parser.add_argument(
+            "--threshold", type=float, default=0.2, help="허용하는 성능 저하 비율(0.2: 20%%)"
+        )
+
+    def handle(self, *args, **options):
+        detection_options = dict(settings.DETECTION_OPTIONS)
+        for name in ["max_size", "tile_size", "template_capacity"]:
+            if options[name] is not None:
+                detection_options[name] = options[name]
+        results = {}
+        for size in [int(size) for size in options["sizes"].split(",")]:
+            img = make_table_image(
+                size,
+                rows=options["rows"],
+                cols=options["cols"],
+                skew=options["skew"],
+                watermark=options["watermark"],
+            )
+            data = encode(img)
+            stages = bench_stages(data, options["watermark"], options["repeat"], detection_options)
+            key = "{}px{}".format(size, "-wm" if options["watermark"] else "")
+            results[key] = {name: round(ms, 3) for name, (ms, _) in stages.items()}
+
+            detect_ms, detect_mb = stages["detect"]
+            megapixels = img.shape[0] * img.shape[1] / 1e6
+            self.stdout.write(
+                "{} ({:.1f} MP): {:.1f} images/s, {:.1f} MP/s, peak {:.1f} MB".format(
+                    key, megapixels, 1000 / detect_ms, megapixels * 1000 / detect_ms, detect_mb
+                )
+            )
+            for name, (ms, mb) in stages.items():
+                self.stdout.write("  {:<18} {:>9.2f} ms {:>8.1f} MB".format(name, ms, mb))
+
+        if options["save_baseline"]:
+            # 측정하지 않은 입력(워터마크 유무, 크기)의 baseline 은 유지
+            baseline = {}
+            if os.path.exists(options["save_baseline"]):
+                with open(options["save_baseline"]) as f:
+                    baseline = json.load(f)
+            baseline.update(results)
+            with open(options["save_baseline"], "w") as f:
+                json.dump(baseline, f, indent=2, sort_keys=True)
+            self.stdout.write("baseline 저장: {}".format(options["save_baseline"]))
+
+        if options["compare"]:
+            self.compare(results, options["compare"], options["threshold"])
+
+    def compare(self, results, path, threshold):
+        with open(path) as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for key, stages in results.items():
+            for name, ms in stages.items():
+                base = baseline.get(key, {}).get(name)
+                if base is None:
+                    continue
+                ratio = ms / base if base else 1.0
+                # 1ms 미만의 차이는 측정 오차로 간주
+                regressed = ratio > 1 + threshold and ms - base > 1.0
+                if regressed:
+                    regressions.append("{} {}".format(key, name))
+                self.stdout.write(
+                    "{:<10} {:<18} {:>9.2f} -> {:>9.2f} ms ({:+.0%}){}".format(
+                        key, name, base, ms, ratio - 1, "  REGRESSION" if regressed else ""
+                    )
+                )
+        if regressions:
+            raise CommandError("성능 저하: {}".format(", ".join(regressions)))
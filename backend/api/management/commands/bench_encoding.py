@@ -0,0 +1,89 @@
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from plugins.detector import Detection
+from plugins.encoding import ImageEncoder
+from plugins.synthetic import make_table_image
+
+# 비교할 인코딩 설정(이름, ImageEncoder 옵션), 첫 번째 설정이 기준(기존 저장 방식)
+ENCODINGS = [
+    ("jpeg q95", {"image_format": "jpeg", "quality": 95}),
+    ("jpeg q90", {"image_format": "jpeg", "quality": 90}),
+    ("jpeg q80", {"image_format": "jpeg", "quality": 80}),
+    ("jpeg q70", {"image_format": "jpeg", "quality": 70}),
+    ("webp q90", {"image_format": "webp", "quality": 90}),
+    ("webp q80", {"image_format": "webp", "quality": 80}),
+    ("webp lossless", {"image_format": "webp", "lossless": True}),
+    ("png level 1", {"image_format": "png", "png_compression": 1}),
+    ("png level 3", {"image_format": "png", "png_compression": 3}),
+    ("png level 9", {"image_format": "png", "png_compression": 9}),
+]
+
+
+def min_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times)
+
+
+def psnr(a, b):
+    """ 최대 신호 대 잡음비(dB, 무손실: inf) """
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+class Command(BaseCommand):
+    help = "original_img/result_img 저장 형식별 인코딩 크기, 인코딩/디코딩 시간, 화질(PSNR) 비교"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="1024,2048", help="입력 표 이미지의 가장 긴 변(px) 목록"
+        )
+        parser.add_argument(
+            "--files", nargs="*", default=[], help="합성 이미지 대신 사용할 표 이미지 파일"
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="반복 횟수")
+
+    def handle(self, *args, **options):
+        # 저장되는 이미지와 같은 크기(Detection.max_size 이하)로 축소해서 비교
+        format_detector = Detection()
+        inputs = [
+            (path, format_detector.resize_image(cv2.imread(path, cv2.IMREAD_COLOR)))
+            for path in options["files"]
+        ]
+        if not inputs:
+            inputs = [
+                ("{}px".format(size), format_detector.resize_image(make_table_image(size)))
+                for size in [int(size) for size in options["sizes"].split(",")]
+            ]
+
+        for name, img in inputs:
+            self.stdout.write("{} ({}x{})".format(name, img.shape[1], img.shape[0]))
+            self.stdout.write(
+                "  {:<16} {:>10} {:>8} {:>11} {:>11} {:>9}".format(
+                    "encoding", "size(KB)", "saving", "encode(ms)", "decode(ms)", "PSNR(dB)"
+                )
+            )
+            base_size = None
+            for label, encoding in ENCODINGS:
+                encoder = ImageEncoder(**encoding)
+                data = encoder.encode(img)
+                buf = np.frombuffer(data, np.uint8)
+                decoded = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+                base_size = base_size or len(data)
+                self.stdout.write(
+                    "  {:<16} {:>10.1f} {:>+8.0%} {:>11.2f} {:>11.2f} {:>9.1f}".format(
+                        label,
+                        len(data) / 1024,
+                        len(data) / base_size - 1,
+                        min_ms(lambda: encoder.encode(img), options["repeat"]),
+                        min_ms(lambda: cv2.imdecode(buf, cv2.IMREAD_COLOR), options["repeat"]),
+                        psnr(img, decoded),
+                    )
+                )
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from django.core.management.base import BaseCommand
+
+from plugins.engines import LatencyStats, MicroBatcher, OCRClient
+from plugins.stub import StubOCRServer
+
+
+class Command(BaseCommand):
+    help = "로컬 OCR 엔진 stub 으로 micro-batching window 별 처리량(images/s)과 지연 시간 측정"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400, help="전송할 이미지 수")
+        parser.add_argument("--concurrency", type=int, default=32, help="동시 요청 수")
+        parser.add_argument(
+            "--windows",
+            default="0,0.005,0.01,0.02,0.05",
+            help="측정할 batch window 목록(seconds, 0: batching 사용 안 함)",
+        )
+        parser.add_argument("--max-batch", type=int, default=8, help="batch 당 최대 이미지 수")
+        parser.add_argument("--max-in-flight", type=int, default=4, help="동시 엔진 호출 수")
+        parser.add_argument("--delay", type=float, default=0.05, help="stub 의 요청당 처리 시간")
+        parser.add_argument(
+            "--image-delay", type=float, default=0.005, help="stub 의 이미지당 처리 시간"
+        )
+
+    def handle(self, *args, **options):
+        data = b"\0" * 64 * 1024
+        windows = [float(window) for window in options["windows"].split(",")]
+
+        self.stdout.write(
+            "{:>8} {:>8} {:>10} {:>10} {:>10}".format(
+                "window", "calls", "images/s", "p50(ms)", "p95(ms)"
+            )
+        )
+        with StubOCRServer(delay=options["delay"], image_delay=options["image_delay"]) as server:
+            for window in windows:
+                client = OCRClient(max_in_flight=options["max_in_flight"])
+                if window > 0:
+                    recognizer = MicroBatcher(
+                        client,
+                        window=window,
+                        max_batch=options["max_batch"],
+                        max_workers=options["max_in_flight"],
+                    )
+                else:
+                    recognizer = client
+                latency = LatencyStats(max_samples=options["requests"])
+
+                def recognize(index):
+                    started = time.perf_counter()
+                    recognizer.recognize(
+                        data, "page{}.jpg".format(index), "image/jpeg", server.url, "key"
+                    )
+                    latency.record(time.perf_counter() - started)
+
+                calls = len(server.requests)
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                    list(executor.map(recognize, range(options["requests"])))
+                elapsed = time.perf_counter() - started
+
+                if recognizer is not client:
+                    recognizer.close()
+                client.close()
+
+                stats = latency.snapshot()
+                self.stdout.write(
+                    "{:>8} {:>8} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                        window,
+                        len(server.requests) - calls,
+                        options["requests"] / elapsed,
+                        stats["p50"] * 1000,
+                        stats["p95"] * 1000,
+                    )
+                )
@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from plugins.detector import Detection
+from plugins.spatial import BoxIndex, assign_fields, make_table
+from plugins.synthetic import encode, make_table_image
+
+
+def min_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times)
+
+
+def scan(boxes, points):
+    """ 기존 방식: 좌표마다 모든 셀을 순서대로 확인(O(fields x cells)) """
+    result = []
+    for px, py in points:
+        for index, (x, y, w, h) in enumerate(boxes):
+            if x <= px < x + w and y <= py < y + h:
+                result.append(index)
+                break
+        else:
+            result.append(-1)
+    return result
+
+
+def brute_force(boxes, points):
+    """ numpy (fields x cells) 비교 행렬 """
+    boxes = np.asarray(boxes, np.float64)
+    px, py = points[:, :1], points[:, 1:]
+    hit = (
+        (boxes[:, 0] <= px)
+        & (px < boxes[:, 0] + boxes[:, 2])
+        & (boxes[:, 1] <= py)
+        & (py < boxes[:, 1] + boxes[:, 3])
+    )
+    return np.where(hit.any(axis=1), hit.argmax(axis=1), -1)
+
+
+class Command(BaseCommand):
+    help = "OCR 결과(fields)를 셀에 대응시키는 시간 비교(순차 탐색, numpy 비교 행렬, BoxIndex)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100)
+        parser.add_argument("--cols", type=int, default=50)
+        parser.add_argument("--size", type=int, default=4000, help="표 이미지의 가장 긴 변(px)")
+        parser.add_argument("--fields-per-cell", type=int, default=2, help="셀별 field 수")
+        parser.add_argument("--repeat", type=int, default=5, help="반복 횟수")
+
+    def handle(self, *args, **options):
+        # 합성 표 이미지에서 검출한 셀 좌표(축소하지 않은 크기, 투영 프로파일 격자)
+        detector = Detection(
+            roi_preview_size=800,
+            render_result=False,
+            max_size=options["size"],
+            tile_size=1024,
+            grid_engine="projection",
+        )
+        img = make_table_image(options["size"], rows=options["rows"], cols=options["cols"])
+        result = detector.detect(encode(img))
+        boxes = result.bounding_boxes["boxes"]
+        grid = result.bounding_boxes["grid"]
+
+        # 셀마다 fields_per_cell 개의 field(셀 안의 임의 위치)
+        rng = np.random.default_rng(0)
+        cells = np.repeat(np.asarray(boxes, np.float64), options["fields_per_cell"], axis=0)
+        points = cells[:, :2] + rng.uniform(0.1, 0.9, (len(cells), 2)) * cells[:, 2:]
+        fields = [
+            {"inferText": str(index), "boundingPoly": {"vertices": [{"x": x, "y": y}]}}
+            for index, (x, y) in enumerate(points.tolist())
+        ]
+        self.stdout.write(
+            "{} x {} 격자, 셀 {}개, field {}개".format(
+                grid["rows"], grid["cols"], len(boxes), len(fields)
+            )
+        )
+
+        index = BoxIndex(boxes)
+        expected = index.query(points)
+        repeat = options["repeat"]
+        if len(boxes) * len(fields) <= 5e7:
+            assert list(expected) == scan(boxes, points)
+            self.report("scan", min_ms(lambda: scan(boxes, points), 1))
+        np.testing.assert_array_equal(brute_force(boxes, points), expected)
+        self.report("numpy brute force", min_ms(lambda: brute_force(boxes, points), repeat))
+        self.report("BoxIndex build", min_ms(lambda: BoxIndex(boxes), repeat))
+        self.report("BoxIndex query", min_ms(lambda: index.query(points), repeat))
+        self.report("assign_fields", min_ms(lambda: assign_fields(fields, boxes), repeat))
+        cells = assign_fields(fields, boxes)
+        self.report("make_table", min_ms(lambda: make_table(cells, (grid, boxes)), repeat))
+        self.report("make_table inferred", min_ms(lambda: make_table(cells), repeat))
+
+    def report(self, name, ms):
+        self.stdout.write("  {:<20} {:>10.2f} ms".format(name, ms))
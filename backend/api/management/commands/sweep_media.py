@@ -0,0 +1,81 @@
+from datetime import timedelta
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.storage import content_storage, delete_expired, sweep_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "보존 기간(--retention-days)이 지난 결과(Job, Document, Image 행)를 삭제한 뒤"
+        " 참조가 없는 media 파일 삭제(batch 단위로 확인, --max-batches 로 중단한 경우"
+        " 출력된 cursor 를 --cursor 로 전달해서 이어서 실행)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.MEDIA_SWEEP_BATCH_SIZE,
+            help="batch 하나에서 확인하는 파일 수",
+        )
+        parser.add_argument(
+            "--grace",
+            type=float,
+            default=settings.MEDIA_SWEEP_GRACE,
+            help="참조가 없어도 삭제하지 않는 기간(seconds, 파일 수정 시간 기준)",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=float,
+            default=settings.MEDIA_RETENTION_DAYS,
+            help="결과 보존 기간(days, 생성 시간 기준, 0: 행을 삭제하지 않음)",
+        )
+        parser.add_argument("--cursor", default="", help="이 파일 다음부터 확인")
+        parser.add_argument(
+            "--max-batches", type=int, default=0, help="실행할 최대 batch 수(0: 끝까지)"
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0, help="batch 사이 대기 시간(seconds, 디스크 부하 제한)"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="삭제하지 않고 대상만 출력")
+
+    def handle(self, *args, **options):
+        if options["retention_days"] > 0:
+            before = timezone.now() - timedelta(days=options["retention_days"])
+            deleted = delete_expired(
+                before, batch_size=options["batch_size"], dry_run=options["dry_run"]
+            )
+            for label, count in sorted(deleted.items()):
+                message = "보존 기간이 지난 {} {}개".format(label, count)
+                self.stdout.write(message if options["dry_run"] else message + " 삭제")
+
+        cursor = options["cursor"]
+        batches = checked = deleted = freed = 0
+        while True:
+            cursor, count, names, size = sweep_batch(
+                content_storage,
+                cursor,
+                batch_size=options["batch_size"],
+                grace=options["grace"],
+                dry_run=options["dry_run"],
+            )
+            batches += 1
+            checked += count
+            deleted += len(names)
+            freed += size
+            for name in names:
+                self.stdout.write("deleted " + name if not options["dry_run"] else name)
+            if cursor is None:
+                break
+            if options["max_batches"] and batches >= options["max_batches"]:
+                self.stdout.write("cursor: {}".format(cursor))
+                break
+            time.sleep(options["pause"])
+
+        self.stdout.write(
+            "확인한 파일 {}개, 삭제한 파일 {}개({:.1f} MB)".format(checked, deleted, freed / 2 ** 20)
+        )
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from django.utils.decorators import sync_and_async_middleware
+
+from plugins import timing
+
+
+def finish_request(response, timings, started):
+    timings["total"] = time.perf_counter() - started
+    timing.record("request", timings["total"])
+    response["Server-Timing"] = timing.server_timing(timings)
+    return response
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """
+    요청별 단계 실행 시간을 Server-Timing 응답 헤더로 전달
+    - settings.METRICS_ENABLED 가 False 인 경우 아무 작업도 하지 않음
+    - ASGI 서버에서는 async middleware 로 동작(async view 를 스레드로 실행하지 않도록)
+    """
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            if not timing.enabled:
+                return await get_response(request)
+
+            timings, token = timing.start_request()
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                timing.end_request(token)
+            return finish_request(response, timings, started)
+
+    else:
+
+        def middleware(request):
+            if not timing.enabled:
+                return get_response(request)
+
+            timings, token = timing.start_request()
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                timing.end_request(token)
+            return finish_request(response, timings, started)
+
+    return middleware
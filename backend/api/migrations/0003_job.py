@@ -0,0 +1,33 @@
+# Generated by Django 3.1 on 2026-10-18 19:40
+
+import api.models
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_image_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=10)),
+                ('upload', models.FileField(blank=True, upload_to=api.models.job_directory_path)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('crop', models.BooleanField(default=True)),
+                ('watermark', models.BooleanField(default=False)),
+                ('callback', models.URLField(blank=True)),
+                ('recognition', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('image', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.image')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.1 on 2026-10-18 19:48
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='image',
+            name='result_img',
+            field=models.ImageField(blank=True, upload_to=api.models.user_directory_path),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 3.1 on 2026-10-18 22:10
+
+from django.db import migrations, models
+import numpy as np
+
+# plugins.boxes 와 같은 저장 형식(마이그레이션은 이후 코드 변경과 관계없이 고정)
+MIN_BOX_SIZE = 30
+HEADER_DTYPE = np.dtype("<i4")
+VALUE_DTYPES = {2: np.dtype("<u2"), 4: np.dtype("<i4")}
+BATCH_SIZE = 500
+
+
+def pack(boxes, spans=None):
+    array = np.asarray(boxes, np.int64).reshape(-1, 4)
+    if spans is not None:
+        array = np.hstack((array, np.asarray(spans, np.int64).reshape(-1, 4)))
+    small = not array.size or (array.min() >= 0 and array.max() <= np.iinfo(np.uint16).max)
+    dtype = VALUE_DTYPES[2 if small else 4]
+    header = np.array([array.shape[1], dtype.itemsize], HEADER_DTYPE)
+    return header.tobytes() + array.astype(dtype).tobytes()
+
+
+def unpack(data):
+    if not data:
+        return np.zeros((0, 4), VALUE_DTYPES[4])
+    columns, itemsize = np.frombuffer(data, HEADER_DTYPE, count=2).tolist()
+    array = np.frombuffer(data, VALUE_DTYPES[itemsize], offset=HEADER_DTYPE.itemsize * 2)
+    return array.reshape(-1, columns)
+
+
+def pack_boxes(apps, schema_editor):
+    """ bounding_boxes(JSON)의 셀 좌표를 box_data(정수 배열)로 옮기고 작은 컨투어 제외 """
+    Image = apps.get_model("api", "Image")
+    batch = []
+    for image in Image.objects.only("id", "detection_info").iterator(chunk_size=BATCH_SIZE):
+        info = dict(image.detection_info or {})
+        boxes = info.pop("boxes", [])
+        grid = info.get("grid")
+        if grid is not None:
+            # 격자 셀은 모두 유지(boxes 와 grid.cells 는 같은 순서)
+            image.box_data = pack(boxes, grid["cells"])
+            info["grid"] = {"rows": grid["rows"], "cols": grid["cols"]}
+        else:
+            image.box_data = pack(
+                [box for box in boxes if box[2] > MIN_BOX_SIZE or box[3] > MIN_BOX_SIZE]
+            )
+        image.detection_info = info
+        batch.append(image)
+        if len(batch) >= BATCH_SIZE:
+            Image.objects.bulk_update(batch, ["box_data", "detection_info"])
+            batch = []
+    Image.objects.bulk_update(batch, ["box_data", "detection_info"])
+
+
+def unpack_boxes(apps, schema_editor):
+    """ box_data 를 bounding_boxes(JSON) 형식으로 되돌림(제외한 작은 컨투어는 복원되지 않음) """
+    Image = apps.get_model("api", "Image")
+    batch = []
+    for image in Image.objects.only("id", "detection_info", "box_data").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        array = unpack(image.box_data)
+        info = dict(image.detection_info or {})
+        info["boxes"] = array[:, :4].tolist()
+        if "grid" in info:
+            info["grid"] = dict(info["grid"], cells=array[:, 4:].tolist())
+        image.detection_info = info
+        batch.append(image)
+        if len(batch) >= BATCH_SIZE:
+            Image.objects.bulk_update(batch, ["detection_info"])
+            batch = []
+    Image.objects.bulk_update(batch, ["detection_info"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='box_data',
+            field=models.BinaryField(default=b'', editable=False),
+        ),
+        migrations.RenameField(
+            model_name='image',
+            old_name='bounding_boxes',
+            new_name='detection_info',
+        ),
+        migrations.RunPython(pack_boxes, unpack_boxes),
+        migrations.AlterField(
+            model_name='image',
+            name='detection_info',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_image_box_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='image',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.1 on 2026-10-18 23:40
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_image_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='image',
+            name='original_img',
+            field=models.ImageField(db_index=True, storage=api.storage.ContentAddressedStorage(), upload_to='objects'),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='result_img',
+            field=models.ImageField(blank=True, db_index=True, storage=api.storage.ContentAddressedStorage(), upload_to='objects'),
+        ),
+    ]
@@ -1,8 +1,12 @@
 from datetime import datetime
 import os
+import uuid
 
 from django.db import models
 
+from api.storage import content_storage
+from plugins.boxes import unpack_boxes
+
 
 def set_filename_format(now, instance, filename):
     """ 
@@ -33,9 +37,97 @@ def user_directory_path(instance, filename):
     return path
 
 
+class Document(models.Model):
+    """ 여러 페이지 문서(PDF, TIFF), 페이지별 결과는 Image(document, page) """
+
+    name = models.CharField(max_length=255, blank=True)
+    page_count = models.PositiveIntegerField(default=0)
+    # 업로드 문서 + detection 옵션의 sha256 digest
+    digest = models.CharField(max_length=64, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
 class Image(models.Model):
-    original_img = models.ImageField(upload_to=user_directory_path)
-    result_img = models.ImageField(upload_to=user_directory_path)
-    bounding_boxes = models.JSONField()
+    # 이미지 파일은 내용(sha256) 기준으로 저장(objects/ab/cd/{digest}.jpg, 같은 내용은 한 번만 저장)
+    # - 참조가 없는 파일은 python manage.py sweep_media 로 삭제(파일 이름 색인으로 참조 확인)
+    # - user_directory_path: 이전 저장 경로(images/{year}/{month}/{day}/...)
+    original_img = models.ImageField(upload_to="objects", storage=content_storage, db_index=True)
+    # 셀 테두리를 그린 결과 이미지(DETECTION_OPTIONS["render_result"] 가 False 이면 요청 시 생성)
+    result_img = models.ImageField(
+        upload_to="objects", storage=content_storage, blank=True, db_index=True
+    )
+    # 셀 좌표를 제외한 검출 정보(grid 의 행/열 수, transform)
+    # - 응답의 bounding_boxes 는 get_bounding_boxes() 로 요청 시 생성
+    detection_info = models.JSONField(default=dict)
+    # 셀 좌표(x, y, w, h)(와 격자 위치)의 정수 배열(plugins.boxes.pack_boxes)
+    box_data = models.BinaryField(default=b"", editable=False)
+    # 업로드 이미지 + detection 옵션의 sha256 digest (Detection 결과 캐시 키)
+    digest = models.CharField(max_length=64, blank=True, db_index=True)
+    # 문서의 페이지인 경우 문서, 페이지 번호(1~)
+    document = models.ForeignKey(
+        Document, null=True, blank=True, on_delete=models.CASCADE, related_name="pages"
+    )
+    page = models.PositiveIntegerField(null=True, blank=True)
+    # 목록 조회의 cursor pagination 기준(api.pagination.ImageCursorPagination)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # 조건부 요청(ETag, Last-Modified) 기준
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def box_array(self):
+        """ (셀 수, 4 or 8) 정수 배열(x, y, w, h[, row, col, rowspan, colspan]) """
+        return unpack_boxes(self.box_data)
+
+    @property
+    def boxes(self):
+        """ 셀 좌표(x, y, w, h) 목록 """
+        return [tuple(box) for box in self.box_array[:, :4].tolist()]
+
+    def get_bounding_boxes(self):
+        """
+        응답용 검출 정보(요청 시 생성)
+        - {"boxes": [[x, y, w, h], ...], "grid": {"rows", "cols", "cells"}, "transform": [...]}
+        """
+        array = self.box_array
+        data = {"boxes": array[:, :4].tolist()}
+        data.update(self.detection_info)
+        if "grid" in data:
+            data["grid"] = dict(data["grid"], cells=array[:, 4:].tolist())
+        return data
+
+
+def job_directory_path(instance, filename):
+    """
+    비동기 작업 입력 이미지 저장 경로
+    e.g)
+        jobs/{job id}{extension}
+        jobs/0b6e8d5c-2f0e-4f55-9a57-3c1c2d7d6f7e.png
+    """
+    return "jobs/{id}{extension}".format(id=instance.id, extension=os.path.splitext(filename)[1])
+
+
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    upload = models.FileField(upload_to=job_directory_path, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    crop = models.BooleanField(default=True)
+    watermark = models.BooleanField(default=False)
+    callback = models.URLField(blank=True)
+    image = models.ForeignKey(Image, null=True, blank=True, on_delete=models.SET_NULL)
+    recognition = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,15 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ImageCursorPagination(CursorPagination):
+    """
+    검출 결과 목록의 cursor pagination(최근 결과부터)
+    - OFFSET 대신 created_at 색인의 범위 조회를 사용하므로 뒤쪽 페이지도 조회 시간이 같고,
+      polling 중에 새 결과가 추가되어도 다음 페이지의 항목이 밀리거나 중복되지 않음
+    """
+
+    ordering = "-created_at"
+    page_size = settings.IMAGE_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.IMAGE_MAX_PAGE_SIZE
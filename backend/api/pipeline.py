@@ -0,0 +1,357 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import mimetypes
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.db import models, transaction
+
+from api.cache import detection_cache
+from api.models import Document, Image
+from plugins.atlas import CellAtlas, select_cells
+from plugins.cache import LRUCache, make_key
+from plugins.detector import Detection
+from plugins.engines import send
+from plugins.ingest import UploadError, check_bytes, check_image
+from plugins.pages import PageReader
+from plugins.spatial import assign_fields, make_table
+from plugins.parallel import detect_bytes, get_pool
+from plugins.timing import timer
+
+# OCR 요청과 동시에 표 영역 검출을 수행하기 위한 스레드 풀
+# - OpenCV 연산은 GIL 을 해제하므로 요청 스레드와 병렬로 실행됨
+detection_executor = ThreadPoolExecutor(
+    max_workers=settings.DETECTION_THREADS, thread_name_prefix="detection"
+)
+
+
+# settings.DETECTION_OPTIONS 로 생성한 공용 Detection 엔진
+# - 요청별 상태를 보관하지 않으므로 모든 요청, 스레드에서 공유
+format_detector = Detection(**settings.DETECTION_OPTIONS)
+
+# 요청 시 생성한 결과 이미지(encoded bytes) 캐시
+# - 삭제된 Image 의 pk 가 재사용될 수 있으므로 original_img 파일 이름 + digest 기준
+#   (같은 이미지 파일을 옵션이 다른 여러 Image 가 공유하므로 파일 이름만으로는 구분되지 않음)
+result_img_cache = LRUCache(settings.RESULT_IMG_CACHE_MAX_BYTES)
+
+
+def detection_key(data, **options):
+    """
+    업로드 바이트 + 요청 옵션(crop, watermark, ...) + 검출 엔진 설정(DETECTION_OPTIONS)으로 만든 캐시 키
+    - 설정이 바뀌면 이전 설정으로 저장된 결과(LRU, Image.digest)를 재사용하지 않음
+    """
+    return make_key(data, detector=format_detector.options_key, **options)
+
+
+def find_cached(data, crop=True, watermark=False):
+    """
+    동일한 이미지 + 옵션으로 처리된 Image 조회
+
+    Returns:
+        (digest, Image or None)
+    """
+    digest = detection_key(data, crop=crop, watermark=watermark)
+    return digest, detection_cache.get(digest)
+
+
+def save_detection(digest, detection_result):
+    """
+    Detection.detect 결과(DetectionResult)를 Image 로 저장하고 캐시에 등록
+    - 직접 인코딩한 이미지이므로 serializer 의 이미지 검증(PIL 디코딩, 복사) 없이 저장
+    """
+    with timer("db_save"):
+        image = Image.objects.create(digest=digest, **detection_result.to_data())
+    detection_cache.set(digest, image)
+    return image
+
+
+def run_detection(data, crop=True, watermark=False):
+    """
+    업로드 이미지의 표 영역 검출 후 Image 저장
+    - 동일한 이미지 + 옵션으로 처리된 결과가 캐시에 있으면 재사용
+
+    Keyword arguments:
+        data -- uploaded image bytes
+        crop -- ROI 영역 분리 여부
+        watermark -- 워터마크 제거 여부
+
+    Returns:
+        (Image, created)
+    """
+    digest, cached = find_cached(data, crop=crop, watermark=watermark)
+    if cached is not None:
+        return cached, False
+
+    detection_result = format_detector.detect(data, crop=crop, watermark=watermark)
+    return save_detection(digest, detection_result), True
+
+
+def render_result(image):
+    """
+    Image 의 결과 이미지(셀 테두리를 그린 이미지) 반환
+    - 저장된 result_img 가 없으면 original_img 와 셀 좌표로 생성 후 캐시
+
+    Returns:
+        (image bytes, content type)
+    """
+    if image.result_img:
+        with image.result_img.open("rb") as f:
+            content_type = mimetypes.guess_type(image.result_img.name)[0]
+            return f.read(), content_type or "application/octet-stream"
+
+    key = (image.original_img.name, image.digest)
+    result_img = result_img_cache.get(key)
+    if result_img is None:
+        with image.original_img.open("rb") as f:
+            img = cv2.imdecode(np.frombuffer(f.read(), np.uint8), cv2.IMREAD_COLOR)
+        result_img = format_detector.draw_frame(img, image.boxes)
+        result_img_cache.set(key, result_img, len(result_img))
+    return result_img, format_detector.encoder.content_type
+
+
+def run_atlas_recognition(data, url, key, crop=True, watermark=False):
+    """
+    셀 atlas 문자 인식
+    1. 표 영역 검출 후 Image 저장(캐시된 결과가 있으면 재사용)
+    2. 검출된 셀만 하나의 atlas 이미지로 합쳐 OCR 엔진에 전송
+    3. 인식 결과를 셀 단위로 분류
+
+    Keyword arguments:
+        data -- uploaded image bytes
+        url -- OCR engine url
+        key -- OCR engine secret key
+        crop -- ROI 영역 분리 여부
+        watermark -- 워터마크 제거 여부
+
+    Returns:
+        (Image, created, cells)
+    """
+    digest, image = find_cached(data, crop=crop, watermark=watermark)
+    created = image is None
+    if created:
+        detection_result = format_detector.detect(
+            data, crop=crop, watermark=watermark, keep_roi=True
+        )
+        image = save_detection(digest, detection_result)
+        roi_img, scale = detection_result.roi_img, detection_result.scale
+    else:
+        # 캐시된 결과는 저장된 이미지(detection 이미지)에서 셀을 잘라냄
+        with image.original_img.open("rb") as f:
+            roi_img = cv2.imdecode(np.frombuffer(f.read(), np.uint8), cv2.IMREAD_COLOR)
+        scale = 1.0
+
+    shape = (roi_img.shape[0] * scale, roi_img.shape[1] * scale)
+    atlas = CellAtlas(roi_img, select_cells(image.boxes, shape), scale=scale)
+    fields = None
+    if url and atlas.cells:
+        fields = send(atlas.encode(), "atlas.jpg", "image/jpeg", url, key)
+    return image, created, atlas.map_fields(fields)
+
+
+def cells_table(image, cells):
+    """
+    셀 단위 인식 결과(cells)를 표 형태로 변환
+    - grid_engine="projection" 으로 검출한 Image 는 저장된 격자(행, 열, 병합 크기) 사용
+    """
+    if "grid" not in image.detection_info:
+        return make_table(cells)
+    bounding_boxes = image.get_bounding_boxes()
+    return make_table(cells, (bounding_boxes["grid"], bounding_boxes["boxes"]))
+
+
+def recognition_table(image, fields):
+    """
+    업로드 이미지 전체의 OCR 결과(fields)를 검출된 셀에 대응시켜 표 형태로 변환
+    1. field 좌표를 업로드 이미지 기준에서 original_img 기준으로 변환(detection_info["transform"])
+    2. 셀 좌표 공간 색인(BoxIndex)으로 field 중심 좌표가 포함된 셀 검색
+
+    Keyword arguments:
+        image -- Image
+        fields -- OCR 엔진 응답의 fields
+
+    Returns:
+        make_table 결과(fields 가 없거나 변환 행렬이 없는 이전 결과인 경우 None)
+    """
+    transform = image.detection_info.get("transform")
+    if fields is None or transform is None:
+        return None
+    boxes = image.boxes
+    # 셀 좌표 전체 범위를 이미지 크기로 사용(표 전체, 바깥 영역 제외)
+    shape = (
+        max((y + h for x, y, w, h in boxes), default=0),
+        max((x + w for x, y, w, h in boxes), default=0),
+    )
+    cells = assign_fields(fields, select_cells(boxes, shape), transform)
+    return cells_table(image, cells)
+
+
+def run_batch_detection(files, crop=True, watermark=False):
+    """
+    여러 업로드 이미지의 표 영역 검출 후 Image 일괄 저장
+    1. 캐시에 없는 이미지를 프로세스 풀에서 병렬 처리(동일한 이미지는 한 번만 처리)
+    2. 처리 중인 이미지가 BATCH_IMAGES_IN_FLIGHT 개가 되면 하나가 끝날 때까지 다음 파일을 읽지 않음
+       (메모리는 요청 전체 크기가 아닌 처리 중인 이미지 수에 비례)
+    3. 처리 결과를 BATCH_IMAGES_IN_FLIGHT 개씩 bulk_create 로 저장
+
+    Keyword arguments:
+        files -- uploaded image files
+        crop -- ROI 영역 분리 여부
+        watermark -- 워터마크 제거 여부
+
+    Returns:
+        업로드 순서대로 (Image, created, error) 목록
+    """
+    pool = get_pool(settings.BATCH_WORKERS)
+    limit = settings.BATCH_IMAGES_IN_FLIGHT
+    results = [None] * len(files)
+    # 처리 중인 future -> digest, digest -> Image or Exception(처리 중: None)
+    pending = {}
+    images = {}
+    unsaved = []
+
+    def flush():
+        with timer("db_save"):
+            Image.objects.bulk_create(unsaved)
+            # Django 4.0 미만은 SQLite 에서 bulk_create 후 pk 를 설정하지 않으므로 digest 로 조회
+            # (결과 URL, detection_cache 에 pk 사용)
+            missing = {image.digest: image for image in unsaved if image.pk is None}
+            if missing:
+                rows = Image.objects.filter(digest__in=missing).order_by("pk")
+                for pk, digest in rows.values_list("pk", "digest"):
+                    missing[digest].pk = pk
+        unsaved.clear()
+
+    def collect(done):
+        for future in done:
+            digest = pending.pop(future)
+            try:
+                detection_result = future.result()
+            except Exception as ex:
+                images[digest] = ex
+                continue
+            images[digest] = Image(digest=digest, **detection_result.to_data())
+            unsaved.append(images[digest])
+        if len(unsaved) >= limit:
+            flush()
+
+    for index, img in enumerate(files):
+        try:
+            # 파일을 읽기 전에 크기부터 확인
+            if img.size is not None:
+                check_bytes(img.size)
+            # 프로세스 풀로 전달(pickle)하므로 bytes 로 읽음
+            data = img.read()
+            check_image(data)
+        except UploadError as ex:
+            results[index] = (None, False, str(ex))
+            continue
+        digest = detection_key(data, crop=crop, watermark=watermark)
+        cached = detection_cache.get(digest)
+        if cached is not None:
+            results[index] = (cached, False, None)
+            continue
+        if digest not in images:
+            images[digest] = None
+            future = pool.submit(detect_bytes, data, crop, watermark, settings.DETECTION_OPTIONS)
+            pending[future] = digest
+            del data
+            if len(pending) >= limit:
+                collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+        results[index] = digest
+    while pending:
+        collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+    flush()
+
+    saved = set()
+    for index, result in enumerate(results):
+        if isinstance(result, tuple):
+            continue
+        image = images[result]
+        if isinstance(image, Exception):
+            results[index] = (None, False, str(image) or type(image).__name__)
+        else:
+            # 같은 요청 안의 중복 이미지는 처음 한 번만 created
+            results[index] = (image, result not in saved, None)
+            if result not in saved:
+                saved.add(result)
+                detection_cache.set(result, image)
+    return results
+
+
+def store_files(image):
+    """
+    Image 의 파일 필드(original_img, result_img)를 storage 에 저장(행은 저장하지 않음)
+    - 저장 후 파일 필드는 파일 이름만 참조하므로 인코딩된 이미지를 메모리에 유지하지 않음
+    """
+    for field in image._meta.get_fields():
+        if isinstance(field, models.FileField):
+            field.pre_save(image, add=True)
+
+
+def run_document_detection(data, name="", crop=True, watermark=False):
+    """
+    여러 페이지 문서(PDF, TIFF)의 페이지별 표 영역 검출 후 Document, 페이지별 Image 저장
+    1. 페이지를 한 장씩 디코딩해서 프로세스 풀에서 병렬 처리
+    2. 처리 중인 페이지가 DOCUMENT_PAGES_IN_FLIGHT 개가 되면 하나가 끝날 때까지 다음 페이지를 디코딩하지 않음
+       (메모리는 문서 크기가 아닌 처리 중인 페이지 수에 비례, 처리된 페이지는 파일만 먼저 저장)
+    3. 모든 페이지를 처리한 뒤 Document, 페이지별 Image 를 하나의 트랜잭션으로 저장
+       (검출하는 동안 데이터베이스 쓰기 잠금을 잡지 않음)
+    - 동일한 문서 + 옵션으로 처리된 결과가 있으면 재사용
+    - 페이지 검출에 실패하면 UploadError(문서를 저장하지 않음)
+
+    Keyword arguments:
+        data -- uploaded document buffer(bytes, memoryview, mmap)
+        name -- 문서 파일 이름
+        crop -- ROI 영역 분리 여부
+        watermark -- 워터마크 제거 여부
+
+    Returns:
+        (Document, created)
+    """
+    digest = detection_key(data, crop=crop, watermark=watermark, document=True)
+    document = Document.objects.filter(digest=digest).first()
+    if document is not None:
+        return document, False
+
+    reader = PageReader(data, settings.DOCUMENT_MAX_PAGES, settings.UPLOAD_MAX_PIXELS)
+    pool = get_pool(settings.BATCH_WORKERS)
+    # ROI 영역을 분리하는 경우 Detection 과 같이 결과 크기의 crop_headroom 배 해상도로 디코딩
+    target_size = format_detector.max_size * (format_detector.crop_headroom if crop else 1)
+    pending = {}
+    pages = []
+
+    def collect(done):
+        for future in done:
+            page = pending.pop(future)
+            try:
+                detection_result = future.result()
+            except Exception as ex:
+                raise UploadError(
+                    "{} 페이지를 처리할 수 없습니다.({})".format(page, str(ex) or type(ex).__name__)
+                ) from ex
+            # 페이지 키는 문서 digest 에서 생성(페이지마다 문서 전체를 다시 해싱하지 않음)
+            image = Image(
+                page=page, digest=make_key(digest.encode(), page=page), **detection_result.to_data()
+            )
+            store_files(image)
+            pages.append(image)
+
+    try:
+        for page, img in reader.pages(target_size):
+            future = pool.submit(detect_bytes, img, crop, watermark, settings.DETECTION_OPTIONS)
+            pending[future] = page
+            del img
+            if len(pending) >= settings.DOCUMENT_PAGES_IN_FLIGHT:
+                collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+        while pending:
+            collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+    finally:
+        for future in pending:
+            future.cancel()
+
+    with timer("db_save"), transaction.atomic():
+        document = Document.objects.create(name=name, page_count=reader.count, digest=digest)
+        for image in pages:
+            image.document = document
+        Image.objects.bulk_create(pages)
+    return document, True
@@ -1,10 +1,14 @@
-from .models import Image
+from django.urls import reverse
 from rest_framework import serializers
 
+from .models import Document, Image, Job
+
 
 class ImageUploadSerializer(serializers.HyperlinkedModelSerializer):
     original_img = serializers.ImageField(use_url=True)
-    result_img = serializers.ImageField(use_url=True)
+    result_img = serializers.ImageField(use_url=True, required=False)
+    # 저장된 셀 좌표 배열(box_data)과 검출 정보(detection_info)로 응답 시 생성
+    bounding_boxes = serializers.SerializerMethodField()
 
     class Meta:
         model = Image
@@ -14,3 +18,73 @@ class ImageUploadSerializer(serializers.HyperlinkedModelSerializer):
             "bounding_boxes",
         ]
 
+    def get_bounding_boxes(self, instance):
+        return instance.get_bounding_boxes()
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if "result_img" in data and not instance.result_img:
+            # 저장된 결과 이미지가 없으면 요청 시 생성하는 주소 반환
+            url = reverse("image-result", args=[instance.pk])
+            request = self.context.get("request")
+            data["result_img"] = request.build_absolute_uri(url) if request else url
+        return data
+
+
+class ImageSerializer(ImageUploadSerializer):
+    """
+    검출 결과 조회(GET /api/image/)
+
+    Keyword arguments:
+        fields -- 응답에 포함할 필드 이름 목록(None: 전체)
+    """
+
+    document = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta(ImageUploadSerializer.Meta):
+        fields = ["id", "document", "page"] + ImageUploadSerializer.Meta.fields + [
+            "created_at",
+            "updated_at",
+        ]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class DocumentPageSerializer(ImageUploadSerializer):
+    class Meta(ImageUploadSerializer.Meta):
+        fields = ["page"] + ImageUploadSerializer.Meta.fields
+
+
+class DocumentSerializer(serializers.ModelSerializer):
+    # 페이지 순서로 조회(Prefetch("pages", queryset=Image.objects.order_by("page")))
+    pages = DocumentPageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Document
+        fields = [
+            "id",
+            "name",
+            "page_count",
+            "pages",
+            "created_at",
+        ]
+
+
+class JobSerializer(serializers.ModelSerializer):
+    result = ImageUploadSerializer(source="image", read_only=True)
+
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "status",
+            "result",
+            "recognition",
+            "error",
+            "created_at",
+            "updated_at",
+        ]
@@ -0,0 +1,214 @@
+from collections import Counter
+import hashlib
+import os
+import tempfile
+import time
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    내용(sha256 digest) 기준 파일 저장소
+    - 저장 이름: {upload_to}/{digest[:2]}/{digest[2:4]}/{digest}{확장자}
+      (디렉토리마다 파일 수가 고르게 나뉘므로 날짜 디렉토리처럼 한 디렉토리가 커지지 않음)
+    - 같은 내용은 한 번만 저장, 이미 있으면 수정 시간만 갱신(sweep_media 의 유예 기간 기준)
+    - 임시 파일에 쓴 뒤 이름을 바꾸므로 같은 내용을 동시에 저장해도 안전
+    - 여러 Image 가 같은 파일을 참조하므로 파일은 FieldFile.delete 대신 sweep_media 로 삭제
+    """
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        name = "/".join(
+            part
+            for part in (directory, digest[:2], digest[2:4], digest + os.path.splitext(filename)[1])
+            if part
+        )
+
+        path = self.path(name)
+        try:
+            # 같은 내용의 파일이 있으면 수정 시간만 갱신
+            # (sweep_media 가 삭제하기 위해 옮긴 경우 FileNotFoundError, 다시 저장)
+            os.utime(path)
+            return name
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                content.seek(0)
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return name
+
+
+content_storage = ContentAddressedStorage()
+
+# reference_counts 의 한 번의 조회(IN 조건)에 포함하는 이름 수
+# - 이전 버전 SQLite 의 최대 bound parameter 수(999) 이하
+REFERENCE_CHUNK_SIZE = 900
+
+
+def file_fields():
+    """ api 앱 모델의 파일 필드 목록 [(model, field name), ...] """
+    return [
+        (model, field.name)
+        for model in apps.get_app_config("api").get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.FileField)
+    ]
+
+
+def reference_counts(names):
+    """
+    파일 이름별 참조 수(파일 필드로 참조하는 모델 행의 수)
+
+    Keyword arguments:
+        names -- storage 기준 파일 이름 목록
+
+    Returns:
+        Counter({name: 참조 수}), 참조가 없는 이름은 0
+    """
+    counts = Counter()
+    names = list(names)
+    for start in range(0, len(names), REFERENCE_CHUNK_SIZE):
+        chunk = names[start : start + REFERENCE_CHUNK_SIZE]
+        for model, field in file_fields():
+            counts.update(
+                model.objects.filter(**{field + "__in": chunk}).values_list(field, flat=True)
+            )
+    return counts
+
+
+def delete_expired(before, batch_size=1000, dry_run=False):
+    """
+    보존 기간이 지난(created_at 이 before 이전인) Job, Document, Image 행을 batch_size 개씩 삭제
+    - 한 번의 삭제(트랜잭션)가 짧도록 pk 를 batch_size 개씩 조회해서 삭제
+    - 파일은 삭제하지 않음(참조가 없어진 파일은 sweep_batch 로 삭제)
+
+    Keyword arguments:
+        before -- 기준 시각(datetime)
+        batch_size -- 한 번에 삭제하는 행 수
+        dry_run -- 삭제하지 않고 대상 행 수만 반환
+
+    Returns:
+        Counter({model label: 삭제한 행 수}), 연결된 행(Document 의 페이지 Image 등) 포함
+    """
+    deleted = Counter()
+    for name in ["Job", "Document", "Image"]:
+        model = apps.get_model("api", name)
+        expired = model.objects.filter(created_at__lt=before)
+        if dry_run:
+            deleted[model._meta.label] += expired.count()
+            continue
+        while True:
+            pks = list(expired.order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            deleted.update(model.objects.filter(pk__in=pks).delete()[1])
+    return +deleted
+
+
+def iter_files(root, after=""):
+    """
+    root 아래 파일의 상대 경로("/" 구분)를 디렉토리 순회 순서(이름순)로 반환
+
+    Keyword arguments:
+        root -- 디렉토리 경로
+        after -- 이 경로 다음 파일부터 반환(이전 sweep 의 cursor, "": 처음부터)
+    """
+    cursor = after.split("/") if after else []
+
+    def walk(directory, parts):
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            path = parts + [entry.name]
+            if entry.is_dir(follow_symlinks=False):
+                # cursor 이전 디렉토리는 읽지 않음
+                if path >= cursor[: len(path)]:
+                    yield from walk(entry.path, path)
+            elif entry.is_file(follow_symlinks=False) and path > cursor:
+                yield "/".join(path), entry
+
+    return walk(root, [])
+
+
+def remove_unused(storage, name, expired):
+    """
+    참조가 없고 expired(timestamp) 이전에 수정된 파일 삭제
+    - 같은 내용을 저장(ContentAddressedStorage.save)하는 요청과 경쟁하지 않도록
+      다른 이름(.del-*)으로 옮긴 뒤 수정 시간, 참조 수를 다시 확인하고 삭제
+      (옮긴 뒤에 저장하는 요청은 파일을 새로 쓰고, 옮기기 전에 수정 시간을 갱신한 경우 되돌림)
+
+    Returns:
+        삭제한 파일 크기(bytes), 삭제하지 않은 경우 None
+    """
+    path = storage.path(name)
+    removed = os.path.join(os.path.dirname(path), ".del-" + os.path.basename(path))
+    try:
+        os.rename(path, removed)
+    except FileNotFoundError:
+        return None
+    stat = os.stat(removed)
+    if stat.st_mtime > expired or reference_counts([name])[name]:
+        os.replace(removed, path)
+        return None
+    os.unlink(removed)
+    return stat.st_size
+
+
+def sweep_batch(storage, after="", batch_size=1000, grace=0, dry_run=False):
+    """
+    cursor(after) 다음 파일부터 batch_size 개를 확인해 참조가 없는 파일 삭제
+    - 수정 시간이 grace(seconds) 이내인 파일은 유지
+      (파일은 Image 행보다 먼저 저장되고, 같은 내용을 다시 저장하면 수정 시간이 갱신됨)
+    - 저장 중인 임시 파일(.tmp-*), 삭제 중 중단된 파일(.del-*)도 유예 기간이 지나면 삭제
+
+    Returns:
+        (다음 cursor(None: 끝까지 확인), 확인한 파일 수, 삭제한 파일 목록, 삭제한 bytes)
+    """
+    batch = []
+    for name, entry in iter_files(storage.location, after):
+        batch.append((name, entry))
+        if len(batch) >= batch_size:
+            break
+    if not batch:
+        return None, 0, [], 0
+
+    counts = reference_counts(name for name, _ in batch)
+    expired = time.time() - grace
+    deleted, freed = [], 0
+    for name, entry in batch:
+        if counts[name]:
+            continue
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime > expired:
+            continue
+        size = stat.st_size if dry_run else remove_unused(storage, name, expired)
+        if size is not None:
+            deleted.append(name)
+            freed += size
+    cursor = batch[-1][0] if len(batch) >= batch_size else None
+    return cursor, len(batch), deleted, freed
@@ -1,3 +1,1312 @@
-from django.test import TestCase
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import httpx
+import numpy as np
+import requests
+from PIL import Image as PILImage
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from api.cache import detection_cache
+from api.jobs import job_runner
+from api.models import Document, Image, Job
+from api.pipeline import cells_table, result_img_cache, run_batch_detection
+from api.storage import content_storage, reference_counts, remove_unused
+from plugins import timing
+from plugins.atlas import CellAtlas, select_cells
+from plugins.detector import FULL_DECODE_FLAG, Detection
+from plugins.encoding import ImageEncoder
+from plugins.cache import make_key
+from plugins.engines import MicroBatcher, OCRClient, retry_delay
+from plugins.ingest import open_buffer, open_upload
+from plugins.pages import PageReader
+from plugins.spatial import BoxIndex, assign_fields
+from plugins.stub import StubOCRServer
+from plugins.synthetic import encode, make_table_image as make_synthetic_table
+from plugins.templates import get_registry
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_table_image(rows=4, cols=3, cell=80, margin=40):
+    """ 테스트용 표 이미지(jpg bytes) 생성 """
+    height, width = rows * cell + 2 * margin, cols * cell + 2 * margin
+    img = np.full((height, width, 3), 255, np.uint8)
+    for r in range(rows + 1):
+        y = margin + r * cell
+        cv2.line(img, (margin, y), (width - margin, y), (0, 0, 0), 2)
+    for c in range(cols + 1):
+        x = margin + c * cell
+        cv2.line(img, (x, margin), (x, height - margin), (0, 0, 0), 2)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+# make_table_photo 의 표 꼭지점 위치(top-left, top-right, bottom-right, bottom-left)
+PHOTO_CORNERS = np.float32([[250, 300], [2750, 380], [2700, 3700], [300, 3650]])
+
+
+def make_table_photo(rows=20, cols=8, width=2400, height=3200):
+    """ 테스트용 촬영 이미지(회색 배경 위에 원근 왜곡된 표, 3000x4000) 생성 """
+    table = np.full((height, width, 3), 255, np.uint8)
+    for r in range(rows + 1):
+        y = r * (height - 1) // rows
+        cv2.line(table, (0, y), (width - 1, y), (0, 0, 0), 6)
+    for c in range(cols + 1):
+        x = c * (width - 1) // cols
+        cv2.line(table, (x, 0), (x, height - 1), (0, 0, 0), 6)
+    src = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(src, PHOTO_CORNERS)
+    return cv2.warpPerspective(table, matrix, (3000, 4000), borderValue=(120, 120, 120))
+
+
+def make_upload(data, name="table.jpg"):
+    return SimpleUploadedFile(name, data, content_type="image/jpeg")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MediaTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+
+class ImageUploadCacheTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+        patcher = mock.patch("api.views.image_views.send", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, data, **extra):
+        return self.client.post("/api/upload/", {"file": make_upload(data), **extra})
+
+    def test_repeated_upload_hits_cache(self):
+        data = make_table_image()
+        first = self.upload(data)
+        self.assertEqual(first.status_code, 201)
+
+        with mock.patch("plugins.detector.Detection.detect") as detect:
+            second = self.upload(data)
+        detect.assert_not_called()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_persistent_tier_survives_memory_eviction(self):
+        data = make_table_image()
+        first = self.upload(data)
+        detection_cache.clear()
+
+        with mock.patch("plugins.detector.Detection.detect") as detect:
+            second = self.upload(data)
+        detect.assert_not_called()
+        self.assertEqual(second.json(), first.json())
+
+    def test_memory_tier_returns_fresh_instances(self):
+        self.upload(make_table_image())
+        image = Image.objects.get()
+        detection_cache.set(image.digest, image)
+
+        first, second = detection_cache.get(image.digest), detection_cache.get(image.digest)
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.original_img, second.original_img)
+        self.assertEqual(first.pk, image.pk)
+        self.assertEqual(first.original_img.name, image.original_img.name)
+        self.assertEqual(first.boxes, image.boxes)
+        first.detection_info["changed"] = True
+        self.assertNotIn("changed", second.detection_info)
+
+        # 삭제된 행은 메모리 캐시에 남아 있어도 반환하지 않음
+        Image.objects.filter(pk=image.pk).delete()
+        self.assertIsNone(detection_cache.get(image.digest))
+
+    def test_detector_options_are_part_of_key(self):
+        key = Detection().options_key
+        self.assertEqual(Detection().options_key, key)
+        self.assertNotEqual(Detection(grid_engine="projection").options_key, key)
+        self.assertNotEqual(Detection(max_size=2048).options_key, key)
+
+        data = make_table_image()
+        self.upload(data)
+        detector = Detection(**dict(settings.DETECTION_OPTIONS, grid_engine="projection"))
+        with mock.patch("api.pipeline.format_detector", detector), mock.patch(
+            "api.views.image_views.format_detector", detector
+        ):
+            response = self.upload(data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Image.objects.count(), 2)
+
+    def test_ocr_failure_keeps_detection(self):
+        data = make_table_image()
+        error = requests.ConnectionError("engine down")
+        with mock.patch("api.views.image_views.send", side_effect=error):
+            response = self.client.post(
+                "/api/upload/",
+                {"file": make_upload(data)},
+                HTTP_URL="http://ocr.local/",
+                HTTP_API_KEY="key",
+            )
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("engine down", response.json()["detail"])
+        self.assertTrue(response.json()["bounding_boxes"]["boxes"])
+        self.assertEqual(Image.objects.count(), 1)
+
+        with mock.patch("plugins.detector.Detection.detect") as detect:
+            self.assertEqual(self.upload(data).status_code, 200)
+        detect.assert_not_called()
+
+    def test_options_are_part_of_key(self):
+        data = make_table_image()
+        self.upload(data)
+        response = self.upload(data, watermark="true")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Image.objects.count(), 2)
+
+
+class ResultImageTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+        result_img_cache.clear()
+        patcher = mock.patch("api.views.image_views.send", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rendered_on_first_request(self):
+        response = self.client.post("/api/upload/", {"file": make_upload(make_table_image())})
+        image = Image.objects.get()
+        self.assertFalse(image.result_img)
+        url = response.json()["result_img"]
+        self.assertTrue(url.endswith("/api/images/{}/result/".format(image.pk)))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        result = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+        with image.original_img.open("rb") as f:
+            original = cv2.imdecode(np.frombuffer(f.read(), np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(result.shape, original.shape)
+
+        # 두 번째 요청은 캐시에서 반환
+        with mock.patch("plugins.detector.Detection.draw_frame") as draw_frame:
+            second = self.client.get(url)
+        draw_frame.assert_not_called()
+        self.assertEqual(second.content, response.content)
+
+    def test_missing_image(self):
+        self.assertEqual(self.client.get("/api/images/1/result/").status_code, 404)
+
+
+class ImageReadTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+        patcher = mock.patch("api.views.image_views.send", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for rows in range(2, 7):
+            self.client.post("/api/upload/", {"file": make_upload(make_table_image(rows=rows))})
+
+    def test_cursor_pagination(self):
+        ids = list(Image.objects.order_by("-created_at").values_list("id", flat=True))
+        response = self.client.get("/api/image/", {"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        seen = []
+        while True:
+            data = response.json()
+            seen += [item["id"] for item in data["results"]]
+            if not data["next"]:
+                break
+            response = self.client.get(data["next"])
+        self.assertEqual(seen, ids)
+
+    def test_retrieve_matches_upload(self):
+        image = Image.objects.latest("created_at")
+        data = self.client.get("/api/image/{}/".format(image.pk)).json()
+        self.assertEqual(data["id"], image.pk)
+        self.assertEqual(data["bounding_boxes"], image.get_bounding_boxes())
+        self.assertEqual(self.client.get("/api/image/0/").status_code, 404)
+
+    def test_sparse_fields(self):
+        response = self.client.get("/api/image/", {"fields": "id,created_at"})
+        for item in response.json()["results"]:
+            self.assertEqual(set(item), {"id", "created_at"})
+        # bounding_boxes 를 제외하면 셀 좌표를 읽지 않음
+        with mock.patch.object(Image, "get_bounding_boxes") as get_bounding_boxes:
+            self.client.get("/api/image/", {"fields": "id,original_img"})
+        get_bounding_boxes.assert_not_called()
+        response = self.client.get("/api/image/", {"fields": "id,unknown"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        image = Image.objects.latest("created_at")
+        for url in ["/api/image/", "/api/image/{}/".format(image.pk)]:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            # 변경이 없으면 id, updated_at 만 조회하고 304 응답
+            with mock.patch.object(Image, "get_bounding_boxes") as get_bounding_boxes:
+                with self.assertNumQueries(1):
+                    second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+            get_bounding_boxes.assert_not_called()
+            self.assertEqual(second.status_code, 304)
+            self.assertEqual(second["ETag"], first["ETag"])
+
+        # Last-Modified 는 상세 조회에서만 사용
+        url = "/api/image/{}/".format(image.pk)
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("Last-Modified", self.client.get("/api/image/"))
+
+        etag = self.client.get("/api/image/")["ETag"]
+        image.save()
+        response = self.client.get("/api/image/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_changes_when_row_deleted(self):
+        # 가장 최근 항목이 아닌 행이 삭제되어도 목록의 ETag 는 바뀜
+        etag = self.client.get("/api/image/")["ETag"]
+        Image.objects.earliest("created_at").delete()
+        response = self.client.get("/api/image/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 4)
+
+
+class BoxDataTest(MediaTestCase):
+    def test_stores_filtered_boxes(self):
+        result = Detection(render_result=False).detect(make_table_image(), crop=False)
+        image = Image.objects.create(digest="boxes", **result.to_data())
+        image.refresh_from_db()
+        boxes = image.get_bounding_boxes()["boxes"]
+        self.assertEqual(boxes, [list(box) for box in result.bounding_boxes["boxes"]])
+        self.assertTrue(all(w > 30 or h > 30 for x, y, w, h in boxes))
+        # header 8 bytes + 셀당 uint16 4개
+        self.assertEqual(len(image.box_data), 8 + 8 * len(boxes))
+        self.assertNotIn("boxes", image.detection_info)
+
+    def test_grid_round_trip(self):
+        data = encode(make_synthetic_table(rows=4, cols=3, merges=[(0, 0, 1, 3)]))
+        result = Detection(roi_preview_size=800, grid_engine="projection").detect(data)
+        image = Image.objects.create(digest="grid", **result.to_data())
+        image.refresh_from_db()
+        self.assertEqual(
+            image.get_bounding_boxes(), json.loads(json.dumps(result.bounding_boxes))
+        )
+
+
+class BoxDataMigrationTest(TransactionTestCase):
+    def test_migration(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("api", "0005_document")])
+        OldImage = executor.loader.project_state([("api", "0005_document")]).apps.get_model(
+            "api", "Image"
+        )
+        boxes = [[0, 0, 400, 300], [10, 10, 80, 40], [12, 12, 5, 9]]
+        grid = {"rows": 1, "cols": 2, "cells": [[0, 0, 1, 1], [0, 1, 1, 1]]}
+        contours = OldImage.objects.create(original_img="a.jpg", bounding_boxes={"boxes": boxes})
+        cells = OldImage.objects.create(
+            original_img="b.jpg",
+            bounding_boxes={"boxes": boxes[:2], "grid": grid, "transform": [1.0] * 9},
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([("api", "0006_image_box_data")])
+        image = Image.objects.get(pk=contours.pk)
+        self.assertEqual(image.get_bounding_boxes(), {"boxes": boxes[:2]})
+        image = Image.objects.get(pk=cells.pk)
+        self.assertEqual(
+            image.get_bounding_boxes(),
+            {"boxes": boxes[:2], "grid": grid, "transform": [1.0] * 9},
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([("api", "0005_document")])
+        OldImage = executor.loader.project_state([("api", "0005_document")]).apps.get_model(
+            "api", "Image"
+        )
+        self.assertEqual(OldImage.objects.get(pk=contours.pk).bounding_boxes, {"boxes": boxes[:2]})
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class ContentStorageTest(MediaTestCase):
+    def test_identical_files_stored_once(self):
+        data = make_table_image()
+        first = Image.objects.create(original_img=ContentFile(data, name="a.jpg"))
+        second = Image.objects.create(original_img=ContentFile(data, name="b.jpg"))
+        other = Image.objects.create(
+            original_img=ContentFile(make_table_image(rows=5), name="c.jpg")
+        )
+
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(
+            first.original_img.name, "objects/{}/{}/{}.jpg".format(digest[:2], digest[2:4], digest)
+        )
+        self.assertEqual(second.original_img.name, first.original_img.name)
+        self.assertNotEqual(other.original_img.name, first.original_img.name)
+        with second.original_img.open("rb") as f:
+            self.assertEqual(f.read(), data)
+        files = os.listdir(os.path.dirname(first.original_img.path))
+        self.assertEqual(files, [digest + ".jpg"])
+
+    def test_sweep_media(self):
+        image = Image.objects.create(original_img=ContentFile(make_table_image(), name="a.jpg"))
+        orphan = content_storage.save("objects/b.jpg", ContentFile(make_table_image(rows=5)))
+        # 이전 저장 경로(user_directory_path)의 파일
+        legacy = "images/2020/8/19/2020-08-19-158859.jpg"
+        os.makedirs(os.path.dirname(content_storage.path(legacy)))
+        with open(content_storage.path(legacy), "wb") as f:
+            f.write(b"legacy")
+        recent = content_storage.save("objects/d.jpg", ContentFile(make_table_image(rows=6)))
+        # 유예 기간이 지난 파일
+        expired = time.time() - 3600
+        for name in [image.original_img.name, orphan, legacy]:
+            os.utime(content_storage.path(name), (expired, expired))
+        Image.objects.create(original_img=ContentFile(make_table_image(), name="e.jpg"))
+
+        # batch 크기 1: cursor 로 이어서 실행
+        out = io.StringIO()
+        call_command("sweep_media", batch_size=1, grace=60, max_batches=2, stdout=out)
+        cursor = re.search(r"cursor: (.+)", out.getvalue()).group(1)
+        call_command("sweep_media", batch_size=1, grace=60, cursor=cursor, stdout=out)
+
+        self.assertTrue(content_storage.exists(image.original_img.name))
+        self.assertTrue(content_storage.exists(recent))
+        self.assertFalse(content_storage.exists(orphan))
+        self.assertFalse(content_storage.exists(legacy))
+        self.assertEqual(out.getvalue().count("deleted "), 2)
+
+
+    def test_sweep_expired_rows(self):
+        keep = Image.objects.create(original_img=ContentFile(make_table_image(), name="a.jpg"))
+        old = Image.objects.create(original_img=ContentFile(make_table_image(rows=5), name="b.jpg"))
+        document = Document.objects.create(page_count=1)
+        page = Image.objects.create(
+            document=document, page=1, original_img=ContentFile(make_table_image(rows=6), "c.jpg")
+        )
+        job = Job(status=Job.DONE, image=old)
+        job.upload.save("table.jpg", ContentFile(make_table_image(rows=7)))
+        created = timezone.now() - timedelta(days=31)
+        Image.objects.exclude(pk=keep.pk).update(created_at=created)
+        Document.objects.update(created_at=created)
+        Job.objects.update(created_at=created)
+        # 파일 수정 시간도 유예 기간 이전
+        expired = time.time() - 3600
+        for name in [old.original_img.name, page.original_img.name, job.upload.name]:
+            os.utime(content_storage.path(name), (expired, expired))
+
+        out = io.StringIO()
+        call_command("sweep_media", batch_size=1, grace=60, dry_run=True, stdout=out)
+        self.assertIn("api.Image 2개\n", out.getvalue())
+        self.assertEqual(Image.objects.count(), 3)
+
+        out = io.StringIO()
+        call_command("sweep_media", batch_size=1, grace=60, stdout=out)
+        self.assertIn("api.Image 2개 삭제", out.getvalue())
+        self.assertEqual(list(Image.objects.all()), [keep])
+        self.assertFalse(Document.objects.exists() or Job.objects.exists())
+        self.assertTrue(content_storage.exists(keep.original_img.name))
+        for name in [old.original_img.name, page.original_img.name, job.upload.name]:
+            self.assertFalse(content_storage.exists(name))
+
+        # 보존 기간 0: 행을 삭제하지 않음
+        Image.objects.update(created_at=created)
+        call_command("sweep_media", retention_days=0, grace=60, stdout=io.StringIO())
+        self.assertEqual(list(Image.objects.all()), [keep])
+
+class SweepRaceTest(MediaTestCase):
+    def setUp(self):
+        self.data = make_table_image()
+        self.name = content_storage.save("objects/a.jpg", ContentFile(self.data))
+        expired = time.time() - 3600
+        os.utime(content_storage.path(self.name), (expired, expired))
+
+    def test_reference_added_while_removing(self):
+        # 파일을 옮긴 뒤, 다시 확인하기 전에 같은 내용의 Image 가 저장된 경우
+        def save_reference(names):
+            Image.objects.create(original_img=ContentFile(self.data, name="b.jpg"))
+            return reference_counts(names)
+
+        with mock.patch("api.storage.reference_counts", side_effect=save_reference):
+            self.assertIsNone(remove_unused(content_storage, self.name, time.time() - 60))
+        with content_storage.open(self.name, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_save_while_removing(self):
+        # sweep_media 가 삭제하기 위해 옮긴 파일과 같은 내용을 저장하면 새로 씀
+        path = content_storage.path(self.name)
+        os.rename(path, os.path.join(os.path.dirname(path), ".del-removed"))
+        image = Image.objects.create(original_img=ContentFile(self.data, name="b.jpg"))
+        self.assertEqual(image.original_img.name, self.name)
+        self.assertTrue(content_storage.exists(self.name))
+
+    def test_reference_counts_in_chunks(self):
+        Image.objects.create(original_img=self.name)
+        names = ["objects/{}.jpg".format(i) for i in range(1000)] + [self.name]
+        # 파일 필드(Image 2개, Job 1개) x 2 chunks
+        with self.assertNumQueries(6):
+            counts = reference_counts(names)
+        self.assertEqual(counts[self.name], 1)
+        self.assertEqual(sum(counts.values()), 1)
+
+
+class EncodingTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+
+    def test_formats(self):
+        img = make_synthetic_table(512)
+        for options, ext in [
+            ({"image_format": "jpeg", "quality": 80}, ".jpg"),
+            ({"image_format": "webp", "quality": 80}, ".webp"),
+            ({"image_format": "png"}, ".png"),
+            ({"image_format": "jpeg", "lossless": True}, ".png"),
+            ({"image_format": "webp", "lossless": True}, ".webp"),
+        ]:
+            encoder = ImageEncoder(**options)
+            self.assertEqual(encoder.ext, ext)
+            decoded = cv2.imdecode(np.frombuffer(encoder.encode(img), np.uint8), cv2.IMREAD_COLOR)
+            self.assertEqual(decoded.shape, img.shape)
+            if options.get("lossless") or options["image_format"] == "png":
+                self.assertTrue(np.array_equal(decoded, img))
+        with self.assertRaises(ValueError):
+            ImageEncoder("gif")
+
+    def test_stored_with_format_extension(self):
+        detector = Detection(image_format="webp", image_quality=80)
+        with mock.patch("api.pipeline.format_detector", detector), mock.patch(
+            "api.views.image_views.format_detector", detector
+        ), mock.patch("api.views.image_views.send", return_value=None):
+            response = self.client.post("/api/upload/", {"file": make_upload(make_table_image())})
+            self.assertEqual(response.status_code, 201)
+            image = Image.objects.get()
+            self.assertTrue(image.original_img.name.endswith(".webp"))
+            response = self.client.get("/api/images/{}/result/".format(image.pk))
+        self.assertEqual(response["Content-Type"], "image/webp")
+
+
+class JobTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+        # 작업 스레드 대신 현재 스레드에서 즉시 실행
+        patcher = mock.patch.object(
+            job_runner, "submit", side_effect=lambda job, url, key: job_runner.run(job.pk) or True
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_submit_and_poll(self):
+        response = self.client.post("/api/jobs/", {"file": make_upload(make_table_image())})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["id"]
+
+        response = self.client.get("/api/jobs/{}/".format(job_id))
+        self.assertEqual(response.json()["status"], Job.DONE)
+        self.assertTrue(response.json()["result"]["bounding_boxes"]["boxes"])
+        self.assertEqual(Image.objects.count(), 1)
+        self.assertFalse(Job.objects.get(pk=job_id).upload)
+
+    def test_failed_job_records_error(self):
+        with mock.patch("plugins.detector.Detection.detect", side_effect=ValueError("broken")):
+            response = self.client.post("/api/jobs/", {"file": make_upload(make_table_image())})
+        job = Job.objects.get(pk=response.json()["id"])
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.error, "broken")
+
+    def test_recover_interrupted_jobs(self):
+        queued = Job(callback="http://callback.local/")
+        queued.upload.save("table.jpg", ContentFile(make_table_image()))
+        running = Job.objects.create(status=Job.RUNNING)
+        done = Job.objects.create(status=Job.DONE)
+
+        with mock.patch("api.jobs.requests.post") as post:
+            self.assertEqual(job_runner.recover(), 2)
+        for job in [queued, running]:
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.FAILED)
+            self.assertTrue(job.error)
+        self.assertFalse(queued.upload)
+        done.refresh_from_db()
+        self.assertEqual(done.status, Job.DONE)
+        self.assertEqual(post.call_args[0][0], "http://callback.local/")
+        self.assertEqual(post.call_args[1]["json"]["status"], Job.FAILED)
+
+    def test_start_recovers_when_enabled(self):
+        with mock.patch.object(job_runner, "executor") as executor:
+            # 기본값(False): 여러 worker 프로세스에서 서로의 작업을 실패로 기록하지 않음
+            job_runner.start()
+            executor.submit.assert_not_called()
+            with override_settings(JOB_RECOVER_ON_STARTUP=True):
+                job_runner.start()
+        executor.submit.assert_called_once_with(job_runner._work, job_runner.recover)
+
+    def test_queue_full(self):
+        with mock.patch.object(job_runner, "submit", return_value=False):
+            response = self.client.post("/api/jobs/", {"file": make_upload(make_table_image())})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(Job.objects.count(), 0)
+
+
+class UploadLimitTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+        patcher = mock.patch("api.views.image_views.send", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, data, path="/api/upload/"):
+        return self.client.post(path, {"file": make_upload(data)})
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_spooled_upload_is_memory_mapped(self):
+        data = make_table_image()
+        with mock.patch("api.views.image_views.open_upload", wraps=open_upload) as opened:
+            response = self.upload(data)
+        self.assertEqual(response.status_code, 201)
+        self.assertIsInstance(opened.call_args[0][0], TemporaryUploadedFile)
+
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            f.seek(0)
+            with open_buffer(File(f)) as view:
+                self.assertIsInstance(view.obj, mmap.mmap)
+                self.assertEqual(make_key(view), make_key(data))
+                boxes = Detection().detect(view).bounding_boxes
+        self.assertEqual(boxes, Detection().detect(data).bounding_boxes)
+
+    @override_settings(UPLOAD_MAX_PIXELS=100 * 100)
+    def test_pixel_limit_checked_before_decode(self):
+        # 픽셀 수가 큰 단색 PNG 는 파일 크기가 작음(decompression bomb)
+        bomb = cv2.imencode(".png", np.zeros((4000, 4000), np.uint8))[1].tobytes()
+        self.assertLess(len(bomb), 100 * 1024)
+        with mock.patch("plugins.detector.Detection.detect") as detect:
+            for path in ["/api/upload/", "/api/jobs/"]:
+                response = self.upload(bomb, path)
+                self.assertEqual(response.status_code, 413)
+                self.assertIn("4000x4000", response.json()["detail"])
+        detect.assert_not_called()
+
+    @override_settings(UPLOAD_MAX_BYTES=1024)
+    def test_size_limit(self):
+        self.assertEqual(self.upload(make_table_image()).status_code, 413)
+
+    def test_unreadable_image(self):
+        self.assertEqual(self.upload(b"not an image").status_code, 400)
+
+    def test_undecodable_format(self):
+        # PIL 은 헤더를 인식하지만 OpenCV 는 디코딩하지 못하는 형식
+        buf = io.BytesIO()
+        PILImage.new("RGB", (64, 64)).save(buf, "GIF")
+        response = self.upload(buf.getvalue())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("디코딩", response.json()["detail"])
+
+        response = self.client.post("/api/upload/batch/", {"files": [make_upload(buf.getvalue())]})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("디코딩", response.json()[0]["error"])
+
+
+class BatchUploadTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+
+    def test_results_in_order_with_errors(self):
+        table = make_table_image()
+        files = [
+            make_upload(table, "a.jpg"),
+            make_upload(b"not an image", "b.jpg"),
+            make_upload(make_table_image(rows=2), "c.jpg"),
+            make_upload(table, "d.jpg"),
+        ]
+        response = self.client.post("/api/upload/batch/", {"files": files})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+
+        self.assertEqual([r["name"] for r in results], ["a.jpg", "b.jpg", "c.jpg", "d.jpg"])
+        self.assertIn("error", results[1])
+        self.assertEqual([r.get("created") for r in results], [True, None, True, False])
+        self.assertEqual(results[0]["result"], results[3]["result"])
+        self.assertEqual(Image.objects.count(), 2)
+
+    def test_pks_without_bulk_create_returning(self):
+        # Django 4.0 미만(SQLite)의 bulk_create 는 pk 를 설정하지 않음
+        bulk_create = QuerySet.bulk_create
+
+        def without_pks(queryset, objs, *args, **kwargs):
+            objs = bulk_create(queryset, objs, *args, **kwargs)
+            for obj in objs:
+                obj.pk = None
+            return objs
+
+        files = [make_upload(make_table_image(rows=rows)) for rows in (2, 3)]
+        with mock.patch.object(QuerySet, "bulk_create", without_pks):
+            results = run_batch_detection(files)
+        saved = Image.objects.order_by("pk")
+        self.assertEqual([image.pk for image, _, _ in results], [image.pk for image in saved])
+        self.assertEqual(detection_cache.get(saved[0].digest).pk, saved[0].pk)
+
+    @override_settings(UPLOAD_MAX_BYTES=1000)
+    def test_size_checked_before_read(self):
+        upload = make_upload(make_table_image())
+        with mock.patch.object(SimpleUploadedFile, "read", new_callable=mock.PropertyMock) as read:
+            ((image, created, error),) = run_batch_detection([upload])
+        read.assert_not_called()
+        self.assertIsNone(image)
+        self.assertIn("최대 크기", error)
+
+    @override_settings(BATCH_IMAGES_IN_FLIGHT=2)
+    def test_in_flight_limit(self):
+        sizes = []
+
+        def counted_wait(futures, **kwargs):
+            sizes.append(len(futures))
+            return wait(futures, **kwargs)
+
+        files = [
+            make_upload(make_table_image(rows=rows), "{}.jpg".format(rows)) for rows in range(2, 7)
+        ]
+        with mock.patch("api.pipeline.wait", side_effect=counted_wait):
+            results = run_batch_detection(files)
+        self.assertEqual(max(sizes), 2)
+        self.assertEqual([created for _, created, _ in results], [True] * 5)
+        self.assertEqual(Image.objects.count(), 5)
+
+
+class DocumentTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+
+    def make_document(self, pages, fmt="TIFF"):
+        frames = [PILImage.fromarray(cv2.cvtColor(page, cv2.COLOR_BGR2RGB)) for page in pages]
+        buf = io.BytesIO()
+        frames[0].save(buf, fmt, save_all=True, append_images=frames[1:])
+        return make_upload(buf.getvalue(), "document.{}".format(fmt.lower()))
+
+    # 양식(template) 재사용 없이 페이지별 결과 비교
+    @override_settings(DETECTION_OPTIONS=dict(settings.DETECTION_OPTIONS, template_capacity=0))
+    def test_tiff_pages(self):
+        pages = [make_synthetic_table(1024, rows=rows, seed=rows) for rows in (10, 15, 20)]
+        response = self.client.post("/api/documents/", {"file": self.make_document(pages)})
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data["page_count"], 3)
+        self.assertEqual([page["page"] for page in data["pages"]], [1, 2, 3])
+        self.assertEqual(Image.objects.filter(document_id=data["id"]).count(), 3)
+
+        # 페이지별 결과는 페이지 이미지를 한 장씩 업로드한 결과와 같음
+        detector = Detection(**settings.DETECTION_OPTIONS)
+        for page, result in zip(pages, data["pages"]):
+            expected = detector.detect(page).bounding_boxes
+            self.assertEqual(result["bounding_boxes"], json.loads(json.dumps(expected)))
+
+        again = self.client.post("/api/documents/", {"file": self.make_document(pages)})
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()["id"], data["id"])
+        detail = self.client.get("/api/documents/{}/".format(data["id"]))
+        self.assertEqual(detail.json(), data)
+
+    def test_pdf_pages(self):
+        pages = [make_synthetic_table(1024, seed=seed) for seed in range(2)]
+        response = self.client.post("/api/documents/", {"file": self.make_document(pages, "PDF")})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([page["page"] for page in response.json()["pages"]], [1, 2])
+        for page in response.json()["pages"]:
+            self.assertTrue(page["bounding_boxes"]["boxes"])
+
+    @override_settings(DOCUMENT_PAGES_IN_FLIGHT=2)
+    def test_pages_in_flight_are_bounded(self):
+        lock = threading.Lock()
+        state = {"active": 0, "max_active": 0, "decoded": 0, "done": 0, "max_ahead": 0}
+        pages = PageReader.pages
+
+        def counting_pages(reader, target_size):
+            for page in pages(reader, target_size):
+                with lock:
+                    state["decoded"] += 1
+                    # 디코딩했지만 검출이 끝나지 않은 페이지 수
+                    state["max_ahead"] = max(state["max_ahead"], state["decoded"] - state["done"])
+                yield page
+
+        def slow_detect(data, *args):
+            with lock:
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+            time.sleep(0.05)
+            result = Detection().detect(data, crop=False)
+            with lock:
+                state["active"] -= 1
+                state["done"] += 1
+            return result
+
+        pool = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(pool.shutdown)
+        pages_doc = [make_synthetic_table(512, seed=seed) for seed in range(6)]
+        with mock.patch("api.pipeline.get_pool", return_value=pool), mock.patch(
+            "api.pipeline.detect_bytes", side_effect=slow_detect
+        ), mock.patch.object(PageReader, "pages", counting_pages):
+            response = self.client.post("/api/documents/", {"file": self.make_document(pages_doc)})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["pages"]), 6)
+        self.assertEqual(state["decoded"], 6)
+        self.assertEqual(state["max_active"], 2)
+        self.assertLessEqual(state["max_ahead"], 2)
+
+    def test_page_error(self):
+        pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(pool.shutdown)
+        pages = [make_synthetic_table(256, seed=seed) for seed in range(3)]
+        with mock.patch("api.pipeline.get_pool", return_value=pool), mock.patch(
+            "api.pipeline.detect_bytes", side_effect=RuntimeError("broken page")
+        ):
+            response = self.client.post("/api/documents/", {"file": self.make_document(pages)})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("broken page", response.json()["detail"])
+        self.assertEqual(Document.objects.count(), 0)
+        self.assertEqual(Image.objects.count(), 0)
+
+    @override_settings(DOCUMENT_MAX_PAGES=2)
+    def test_page_limit(self):
+        pages = [make_synthetic_table(256, seed=seed) for seed in range(3)]
+        response = self.client.post("/api/documents/", {"file": self.make_document(pages)})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(Document.objects.count(), 0)
+
+
+class ConcurrentUploadTest(MediaTestCase):
+    DELAY = 0.3
+
+    def setUp(self):
+        detection_cache.clear()
+
+    def test_detection_overlaps_recognition(self):
+        data = make_table_image()
+        detect = Detection.detect
+
+        def slow_detect(*args, **kwargs):
+            time.sleep(self.DELAY)
+            return detect(*args, **kwargs)
+
+        with StubOCRServer(delay=self.DELAY) as server, mock.patch.object(
+            Detection, "detect", autospec=True, side_effect=slow_detect
+        ):
+            started = time.perf_counter()
+            response = self.client.post(
+                "/api/upload/", {"file": make_upload(data)}, HTTP_URL=server.url, HTTP_API_KEY="key"
+            )
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(response.status_code, 201)
+        # 순차 실행(DELAY * 2)보다 충분히 짧아야 함
+        self.assertLess(elapsed, self.DELAY * 1.6)
+        # 엔진에는 업로드된 이미지 바이트가 그대로 전송됨
+        self.assertEqual(len(server.requests), 1)
+        self.assertIn(data, server.requests[0])
+
+
+class AsyncUploadTest(MediaTestCase):
+    DELAY = 0.5
+
+    def setUp(self):
+        detection_cache.clear()
+
+    async def test_recognition_calls_stay_in_flight(self):
+        uploads = [make_table_image(rows=rows) for rows in (2, 3, 4, 5)]
+        with StubOCRServer(delay=self.DELAY) as server:
+            started = time.perf_counter()
+            responses = await asyncio.gather(
+                *[
+                    self.async_client.post(
+                        "/api/upload/async/",
+                        {"file": make_upload(data)},
+                        url=server.url,
+                        api_key="key",
+                    )
+                    for data in uploads
+                ]
+            )
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual([response.status_code for response in responses], [201] * 4)
+        self.assertEqual(server.max_active, 4)
+        # 순차 실행(DELAY * 4)보다 충분히 짧아야 함
+        self.assertLess(elapsed, self.DELAY * 2.5)
+
+    async def test_matches_sync_view(self):
+        data = make_table_image()
+        first = await self.async_client.post("/api/upload/async/", {"file": make_upload(data)})
+        self.assertEqual(first.status_code, 201)
+        second = await sync_to_async(self.client.post)("/api/upload/", {"file": make_upload(data)})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+
+    async def test_ocr_failure_keeps_detection(self):
+        error = httpx.ConnectError("engine down")
+        with mock.patch("api.views.image_views.asend", side_effect=error):
+            response = await self.async_client.post(
+                "/api/upload/async/",
+                {"file": make_upload(make_table_image())},
+                url="http://ocr.local/",
+                api_key="key",
+            )
+        self.assertEqual(response.status_code, 502)
+        self.assertTrue(response.json()["bounding_boxes"]["boxes"])
+        self.assertEqual(await sync_to_async(Image.objects.count)(), 1)
+
+
+class OCRClientTest(TestCase):
+    def recognize(self, client, server):
+        return client.recognize(b"data", "table.jpg", "image/jpeg", server.url, "key")
+
+    def test_retries_with_backoff(self):
+        client = OCRClient(retries=2, backoff=0.01)
+        with StubOCRServer(statuses=[503, 429]) as server:
+            fields = self.recognize(client, server)
+        self.assertEqual(fields, server.fields)
+        self.assertEqual(len(server.requests), 3)
+        stats = client.stats.snapshot()
+        self.assertEqual((stats["count"], stats["errors"], stats["retries"]), (1, 0, 2))
+
+    def test_retry_delay_is_capped(self):
+        response = requests.Response()
+        response.headers["Retry-After"] = "86400"
+        self.assertEqual(retry_delay(0, response, backoff=0.5, max_delay=10), 10)
+        response.headers["Retry-After"] = "3"
+        self.assertEqual(retry_delay(0, response, backoff=0.5, max_delay=10), 3)
+        self.assertEqual(retry_delay(2, None, backoff=0.5, max_delay=10), 2)
+        self.assertEqual(retry_delay(10, None, backoff=0.5, max_delay=10), 10)
+
+    def test_gives_up_after_retries(self):
+        client = OCRClient(retries=1, backoff=0.01)
+        with StubOCRServer(statuses=[500, 500, 500]) as server:
+            with self.assertRaises(requests.HTTPError):
+                self.recognize(client, server)
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(client.stats.snapshot()["errors"], 1)
+
+    def test_read_timeout(self):
+        client = OCRClient(timeout=(1, 0.1), retries=0)
+        with StubOCRServer(delay=0.5) as server:
+            with self.assertRaises(requests.Timeout):
+                self.recognize(client, server)
+
+    def test_limits_requests_in_flight(self):
+        client = OCRClient(max_in_flight=2)
+        with StubOCRServer(delay=0.1) as server:
+            threads = [
+                threading.Thread(target=self.recognize, args=(client, server)) for _ in range(6)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(server.requests), 6)
+        self.assertEqual(server.max_active, 2)
+        self.assertGreaterEqual(client.stats.snapshot()["p50"], 0.1)
+
+
+class MicroBatcherTest(TestCase):
+    def test_concurrent_requests_share_one_call(self):
+        batcher = MicroBatcher(OCRClient(), window=0.2, max_batch=8)
+        self.addCleanup(batcher.close)
+        with StubOCRServer() as server:
+            server.fields_for = lambda image: [{"inferText": image["name"]}]
+            futures = [
+                batcher.submit(b"data", "page{}.jpg".format(i), "image/jpeg", server.url, "key")
+                for i in range(5)
+            ]
+            results = [future.result(timeout=5) for future in futures]
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(
+            [fields[0]["inferText"] for fields in results], ["{}_page{}".format(i, i) for i in range(5)]
+        )
+
+    def test_max_batch_splits_calls(self):
+        batcher = MicroBatcher(OCRClient(), window=0.2, max_batch=2)
+        self.addCleanup(batcher.close)
+        with StubOCRServer() as server:
+            futures = [
+                batcher.submit(b"data", "page.jpg", "image/jpeg", server.url, "key") for _ in range(5)
+            ]
+            for future in futures:
+                self.assertEqual(future.result(timeout=5), server.fields)
+        self.assertEqual(len(server.requests), 3)
+
+
+class CellAtlasTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+
+    def test_fields_map_back_to_cells(self):
+        img = cv2.imdecode(np.frombuffer(make_table_image(), np.uint8), cv2.IMREAD_COLOR)
+        result = Detection().detect(make_table_image(), crop=False)
+        cells = select_cells(result.bounding_boxes["boxes"], img.shape[:2])
+        self.assertEqual(len(cells), 12)
+
+        atlas = CellAtlas(img, cells)
+        self.assertLess(atlas.size[0] * atlas.size[1], img.shape[0] * img.shape[1])
+        (_, _, w, h), (ax, ay) = atlas.placements[5]
+        field = {
+            "inferText": "5",
+            "boundingPoly": {
+                "vertices": [{"x": ax + 2, "y": ay + 2}, {"x": ax + w - 2, "y": ay + h - 2}]
+            },
+        }
+        result = atlas.map_fields([field])
+
+        self.assertEqual(result[5]["text"], "5")
+        x, y, w, h = cells[5]
+        vertex = result[5]["fields"][0]["boundingPoly"]["vertices"][0]
+        self.assertEqual((vertex["x"], vertex["y"]), (x + 2, y + 2))
+        self.assertFalse(any(cell["fields"] for i, cell in enumerate(result) if i != 5))
+
+    def test_atlas_upload(self):
+        with StubOCRServer() as server:
+            response = self.client.post(
+                "/api/upload/",
+                {"file": make_upload(make_table_image()), "mode": "atlas", "crop": "false"},
+                HTTP_URL=server.url,
+                HTTP_API_KEY="key",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["cells"]), 12)
+        self.assertEqual(len(server.requests), 1)
+        self.assertIn(b'filename="atlas.jpg"', server.requests[0])
+
+
+class RecognitionTableTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+
+    def test_box_index_matches_scan(self):
+        rng = np.random.default_rng(0)
+        boxes = [(c * 20, r * 10, 20, 10) for r in range(100) for c in range(50)]
+        # 표 전체 영역(모든 셀을 포함), 겹치는 작은 상자
+        boxes += [(0, 0, 1000, 1000), (105, 52, 6, 4)]
+        points = rng.uniform(-50, 1100, (2000, 2))
+        expected = []
+        for px, py in points:
+            hits = [
+                i for i, (x, y, w, h) in enumerate(boxes) if x <= px < x + w and y <= py < y + h
+            ]
+            expected.append(min(hits, key=lambda i: boxes[i][2] * boxes[i][3]) if hits else -1)
+        np.testing.assert_array_equal(BoxIndex(boxes).query(points), expected)
+        self.assertEqual(BoxIndex(boxes).query([(107, 53)])[0], len(boxes) - 1)
+        self.assertEqual(BoxIndex([]).query([(1, 1)])[0], -1)
+
+    def test_fields_map_to_cells(self):
+        rows, cols, width, height = 5, 4, 2400, 3200
+        data = cv2.imencode(".jpg", make_table_photo(rows, cols, width, height))[1].tobytes()
+        # 셀 중심에 있는 글자의 업로드 이미지 좌표
+        src = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+        matrix = cv2.getPerspectiveTransform(src, PHOTO_CORNERS)
+        fields = []
+        for r in range(rows):
+            for c in range(cols):
+                center = np.float32([[[(c + 0.5) * width / cols, (r + 0.5) * height / rows]]])
+                x, y = cv2.perspectiveTransform(center, matrix)[0, 0].tolist()
+                vertices = [{"x": x - 20, "y": y - 10}, {"x": x + 20, "y": y + 10}]
+                fields.append(
+                    {"inferText": "{}-{}".format(r, c), "boundingPoly": {"vertices": vertices}}
+                )
+
+        with StubOCRServer(fields=fields) as server:
+            response = self.client.post(
+                "/api/upload/", {"file": make_upload(data)}, HTTP_URL=server.url, HTTP_API_KEY="key"
+            )
+        self.assertEqual(response.status_code, 201)
+        table = response.json()["table"]
+        self.assertEqual((table["rows"], table["cols"]), (rows, cols))
+        self.assertEqual(
+            table["grid"], [["{}-{}".format(r, c) for c in range(cols)] for r in range(rows)]
+        )
+
+    def test_projection_grid_table(self):
+        merges = [(0, 0, 1, 3), (1, 1, 2, 1)]
+        data = encode(make_synthetic_table(rows=4, cols=3, merges=merges))
+        result = Detection(roi_preview_size=800, grid_engine="projection").detect(data)
+        image = Image.objects.create(digest="grid", **result.to_data())
+        boxes = result.bounding_boxes["boxes"]
+        fields = [
+            {"inferText": text, "boundingPoly": {"vertices": [{"x": x + 5, "y": y + 5}]}}
+            for text, (x, y, w, h) in zip(["header", "first", "merged"], boxes)
+        ]
+        table = cells_table(image, assign_fields(fields, boxes))
+        self.assertEqual((table["rows"], table["cols"]), (4, 3))
+        spans = [
+            (cell["row"], cell["col"], cell["rowspan"], cell["colspan"]) for cell in table["cells"]
+        ]
+        self.assertEqual(spans[:3], [(0, 0, 1, 3), (1, 0, 1, 1), (1, 1, 2, 1)])
+        # 병합 셀은 첫 번째 칸에만 표시
+        self.assertEqual(table["grid"][0], ["header", None, None])
+        self.assertEqual(table["grid"][1][:2], ["first", "merged"])
+        self.assertIsNone(table["grid"][2][1])
+
+
+class CropRoiTest(TestCase):
+    def test_preview_roi_matches_full_resolution(self):
+        data = cv2.imencode(".jpg", make_table_photo())[1].tobytes()
+        full = Detection().detect(data)
+        fast = Detection(roi_preview_size=800).detect(data)
+
+        full_img = cv2.imdecode(np.frombuffer(full.original_img, np.uint8), cv2.IMREAD_COLOR)
+        fast_img = cv2.imdecode(np.frombuffer(fast.original_img, np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(max(fast_img.shape[:2]), Detection.max_size)
+        np.testing.assert_allclose(fast_img.shape, full_img.shape, atol=5)
+        self.assertEqual(len(fast.bounding_boxes["boxes"]), len(full.bounding_boxes["boxes"]))
+
+
+class ReducedDecodeTest(TestCase):
+    def test_decode_flag(self):
+        data = cv2.imencode(".jpg", make_table_photo())[1].tobytes()
+        format_detector = Detection(reduced_decode=True)
+        reduced_2 = cv2.IMREAD_REDUCED_COLOR_2 | cv2.IMREAD_IGNORE_ORIENTATION
+        self.assertEqual(format_detector.decode_flag(data, 1024), reduced_2)
+        self.assertEqual(format_detector.decode_flag(data, 1536), reduced_2)
+        self.assertEqual(format_detector.decode_flag(data, 3000), FULL_DECODE_FLAG)
+        self.assertEqual(format_detector.decode_flag(b"not an image", 1024), FULL_DECODE_FLAG)
+
+    def test_exif_orientation_ignored(self):
+        # EXIF orientation 6(90도 회전) 촬영 이미지
+        exif = PILImage.Exif()
+        exif[0x0112] = 6
+        buffer = io.BytesIO()
+        photo = cv2.cvtColor(make_table_photo(), cv2.COLOR_BGR2RGB)
+        PILImage.fromarray(photo).save(buffer, "JPEG", exif=exif)
+        data = buffer.getvalue()
+
+        full = cv2.imdecode(np.frombuffer(data, np.uint8), FULL_DECODE_FLAG)
+        flag = Detection(reduced_decode=True).decode_flag(data, 1024)
+        reduced = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        self.assertEqual(full.shape[:2], (4000, 3000))
+        self.assertEqual(reduced.shape[:2], (2000, 1500))
+
+        full = Detection(roi_preview_size=800).detect(data)
+        reduced = Detection(roi_preview_size=800, reduced_decode=True).detect(data)
+        self.assertEqual(
+            len(reduced.bounding_boxes["boxes"]), len(full.bounding_boxes["boxes"])
+        )
+        np.testing.assert_allclose(
+            reduced.bounding_boxes["transform"][:2], full.bounding_boxes["transform"][:2], atol=0.05
+        )
+
+    def test_small_grayscale_and_16bit_images(self):
+        # 축소하지 않는 작은 이미지도 축소 디코딩과 같이 8-bit BGR 로 디코딩
+        table = cv2.imdecode(np.frombuffer(make_table_image(), np.uint8), cv2.IMREAD_GRAYSCALE)
+        results = [
+            Detection(reduced_decode=True).detect(cv2.imencode(".png", img)[1].tobytes())
+            for img in (table, table.astype(np.uint16) * 257)
+        ]
+        self.assertTrue(results[0].bounding_boxes["boxes"])
+        self.assertEqual(results[1].bounding_boxes, results[0].bounding_boxes)
+
+    def test_reduced_decode_keeps_result(self):
+        data = cv2.imencode(".jpg", make_table_photo())[1].tobytes()
+        for crop in (True, False):
+            full = Detection().detect(data, crop=crop)
+            reduced = Detection(reduced_decode=True).detect(data, crop=crop)
+            self.assertEqual(
+                len(reduced.bounding_boxes["boxes"]), len(full.bounding_boxes["boxes"])
+            )
+
+
+class SharedDetectionTest(TestCase):
+    def test_concurrent_detect_matches_sequential(self):
+        format_detector = Detection(roi_preview_size=800, reduced_decode=True)
+        images = [
+            encode(make_synthetic_table(1600, rows=rows, cols=cols, seed=rows, watermark=rows % 2))
+            for rows, cols in [(20, 8), (15, 6), (10, 4), (7, 3)]
+        ]
+        expected = [format_detector.detect(data, watermark=True) for data in images]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(
+                executor.map(lambda data: format_detector.detect(data, watermark=True), images * 3)
+            )
+        for index, result in enumerate(results):
+            self.assertEqual(result.bounding_boxes, expected[index % len(images)].bounding_boxes)
+            self.assertEqual(result.original_img, expected[index % len(images)].original_img)
+
+
+class TiledFrameTest(TestCase):
+    def test_tiled_matches_untiled(self):
+        img = cv2.cvtColor(make_synthetic_table(3000, rows=30, cols=10), cv2.COLOR_BGR2GRAY)
+        boxes = Detection().get_frame(img)
+        tiled = Detection(tile_size=256, tile_threads=3).get_frame(img)
+        self.assertEqual(tiled, boxes)
+        # 띠 경계를 지나는 셀 포함
+        self.assertTrue(any(y // 256 != (y + h) // 256 for x, y, w, h in boxes if h > 30))
+
+    def test_detect_without_size_cap(self):
+        data = encode(make_synthetic_table(3000, rows=30, cols=10))
+        result = Detection(max_size=3000, tile_size=512).detect(data)
+        self.assertEqual(
+            result.bounding_boxes, Detection(max_size=3000).detect(data).bounding_boxes
+        )
+        img = cv2.imdecode(np.frombuffer(result.original_img, np.uint8), cv2.IMREAD_COLOR)
+        self.assertGreater(max(img.shape[:2]), 1024)
+
+
+def remove_wm_reference(img):
+    """ 기존 remove_wm 구현(np.where 좌표로 어두운 부분을 모으고 다시 씀) """
+    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    wm_img = gray_img.copy()
+    for i in range(5):
+        img_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * i + 1, 2 * i + 1))
+        wm_img = cv2.morphologyEx(wm_img, cv2.MORPH_CLOSE, img_kernel)
+        wm_img = cv2.morphologyEx(wm_img, cv2.MORPH_OPEN, img_kernel)
+    dif_img = cv2.subtract(wm_img, gray_img)
+    bw_img = cv2.threshold(dif_img, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    dark = cv2.threshold(wm_img, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    dark_pix = gray_img[np.where(dark > 0)]
+    dark_pix = cv2.threshold(dark_pix, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    bw_img[np.where(dark > 0)] = dark_pix.T
+    return bw_img
+
+
+class RemoveWatermarkTest(TestCase):
+    def test_matches_reference(self):
+        format_detector = Detection()
+        for size, seed in [(1024, 0), (2048, 1), (3000, 2)]:
+            img = format_detector.resize_image(
+                make_synthetic_table(size, watermark=True, seed=seed)
+            )
+            bw_img = format_detector.remove_wm(img)
+            np.testing.assert_array_equal(bw_img, remove_wm_reference(img))
+
+    def test_without_dark_area(self):
+        # 어두운 부분이 없는 이미지(임계값 계산에서 제외)
+        img = np.full((64, 64, 3), 255, np.uint8)
+        self.assertEqual(Detection().remove_wm(img).shape, (64, 64))
+
+
+class GridTest(TestCase):
+    merges = [(0, 0, 1, 5), (2, 1, 2, 2), (5, 0, 3, 1)]
+
+    def detect(self, **options):
+        data = encode(make_synthetic_table(rows=8, cols=5, merges=self.merges))
+        return Detection(roi_preview_size=800, render_result=False, **options).detect(data)
+
+    def test_merged_cells(self):
+        result = self.detect(grid_engine="projection")
+        grid = result.bounding_boxes["grid"]
+        self.assertEqual((grid["rows"], grid["cols"]), (8, 5))
+        # 병합되지 않은 칸 8 * 5 - 병합으로 줄어든 칸(4 + 3 + 2)
+        self.assertEqual(len(grid["cells"]), 31)
+        self.assertEqual(len(result.bounding_boxes["boxes"]), len(grid["cells"]))
+        for merge in self.merges:
+            self.assertIn(merge, grid["cells"])
+        # 위에서 아래, 왼쪽에서 오른쪽 순서
+        self.assertEqual(grid["cells"], sorted(grid["cells"]))
+
+    def test_matches_contours(self):
+        boxes = self.detect(grid_engine="projection").bounding_boxes["boxes"]
+        result = self.detect()
+        img = cv2.imdecode(np.frombuffer(result.original_img, np.uint8), cv2.IMREAD_COLOR)
+        expected = np.array(select_cells(result.bounding_boxes["boxes"], img.shape[:2]))
+        self.assertEqual(len(boxes), len(expected))
+        # 컨투어 좌표와의 차이는 선 두께, 침식(erode) 정도
+        for box in boxes:
+            self.assertLessEqual(np.abs(expected - box).max(axis=1).min(), 6)
+
+    def test_labels(self):
+        # ROI 영역 분리 후 이미지(original_img)
+        result = self.detect()
+        img = cv2.imdecode(np.frombuffer(result.original_img, np.uint8), cv2.IMREAD_GRAYSCALE)
+        grid = Detection(grid_engine="projection").get_grid(img)
+        self.assertEqual(grid.shape, (8, 5))
+        self.assertTrue((grid.labels[0] == 0).all())
+        self.assertTrue((grid.labels[2:4, 1:3] == grid.labels[2, 1]).all())
+        cell = grid.cells[grid.labels[2, 1]]
+        self.assertEqual((cell["rowspan"], cell["colspan"]), (2, 2))
+        self.assertEqual(Detection(grid_engine="projection").get_frame(img), grid.boxes())
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            Detection(grid_engine="hough")
+
+
+class TemplateRegistryTest(TestCase):
+    def setUp(self):
+        get_registry(2).clear()
+
+    def get_frame(self, rows=20, cols=8, seed=0, capacity=2):
+        img = Detection().resize_image(make_synthetic_table(1024, rows, cols, skew=0, seed=seed))
+        boxes = Detection(template_capacity=capacity).get_frame(img)
+        return img, select_cells(boxes, img.shape[:2])
+
+    def test_same_layout_reuses_cells(self):
+        registry = get_registry(2)
+        self.get_frame(seed=0)
+        img, boxes = self.get_frame(seed=1)
+        self.assertEqual((registry.hits, registry.misses), (1, 1))
+
+        expected = np.array(select_cells(Detection().get_frame(img), img.shape[:2]))
+        self.assertEqual(len(boxes), len(expected))
+        for box in boxes:
+            self.assertLessEqual(np.abs(expected - box).max(axis=1).min(), 6)
+
+    def test_different_layout_and_eviction(self):
+        registry = get_registry(2)
+        self.get_frame(rows=20, cols=8)
+        self.get_frame(rows=19, cols=8)
+        self.get_frame(rows=10, cols=4)
+        self.assertEqual((registry.hits, registry.misses), (0, 3))
+        self.assertEqual(len(registry), 2)
+
+        # 가장 오래된 양식(20x8)은 삭제됨
+        self.get_frame(rows=20, cols=8, seed=1)
+        self.assertEqual(registry.hits, 0)
+        self.get_frame(rows=10, cols=4, seed=1)
+        self.assertEqual(registry.hits, 1)
+
+
+class TimingTest(MediaTestCase):
+    def setUp(self):
+        detection_cache.clear()
+
+    def test_disabled_by_default(self):
+        response = self.client.post("/api/upload/", {"file": make_upload(make_table_image())})
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    def test_server_timing_and_metrics(self):
+        timing.configure(True)
+        self.addCleanup(timing.configure, False)
+
+        with StubOCRServer() as server:
+            response = self.client.post(
+                "/api/upload/",
+                {"file": make_upload(make_table_image())},
+                HTTP_URL=server.url,
+                HTTP_API_KEY="key",
+            )
+        stages = [item.split(";")[0] for item in response["Server-Timing"].split(", ")]
+        for stage in ["decode", "crop_roi", "get_frame", "ocr", "db_save", "total"]:
+            self.assertIn(stage, stages)
+
+        metrics = self.client.get("/metrics").content.decode()
+        self.assertIn('ocr_api_stage_seconds_count{stage="get_frame"}', metrics)
+        self.assertIn('ocr_api_stage_seconds_bucket{stage="ocr",le="+Inf"}', metrics)
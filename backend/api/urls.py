@@ -6,11 +6,11 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
-from api.views import image_views
+from api.views import document_views, image_views, job_views
 
-# # Viewset의 methods를 자동으로 Routing
-# router = DefaultRouter()
-# router.register("image", image_views.ImageViewSet)
+# Viewset의 methods를 자동으로 Routing
+router = DefaultRouter()
+router.register("image", image_views.ImageViewSet)
 
 # swagger 정보 설정
 schema_view = get_schema_view(
@@ -27,8 +27,15 @@ schema_view = get_schema_view(
 )
 
 urlpatterns = [
-    # path("", include(router.urls)),
+    path("", include(router.urls)),
     path("upload/", image_views.ImageUploadView.as_view()),
+    path("upload/async/", image_views.async_upload),
+    path("upload/batch/", image_views.BatchUploadView.as_view()),
+    path("images/<int:pk>/result/", image_views.ResultImageView.as_view(), name="image-result"),
+    path("documents/", document_views.DocumentView.as_view()),
+    path("documents/<int:pk>/", document_views.DocumentDetailView.as_view()),
+    path("jobs/", job_views.JobView.as_view()),
+    path("jobs/<uuid:pk>/", job_views.JobDetailView.as_view()),
 ]
 
 # swagger관련 End Point 추가 (DEBUG Mode에서만 노출)
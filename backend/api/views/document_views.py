@@ -0,0 +1,53 @@
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from api.models import Document, Image
+from api.pipeline import run_document_detection
+from api.serializers import DocumentSerializer
+from api.views.image_views import as_bool, upload_error
+from plugins.ingest import UploadError, check_bytes, open_buffer
+
+
+def documents():
+    """ 페이지(Image)를 페이지 순서로 함께 조회하는 Document queryset """
+    return Document.objects.prefetch_related(
+        Prefetch("pages", queryset=Image.objects.order_by("page"))
+    )
+
+
+class DocumentView(APIView):
+    def post(self, request):
+        """
+        여러 페이지 문서(PDF, TIFF) 업로드
+        - 페이지별 표 영역 검출 결과를 페이지 순서대로 반환
+        """
+        doc = request.data.get("file")
+        if doc is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        crop = as_bool(request.data.get("crop"), default=True)
+        watermark = as_bool(request.data.get("watermark"), default=False)
+
+        # 문서 전체의 픽셀 수 대신 페이지별 픽셀 수, 페이지 수를 PageReader 에서 확인
+        try:
+            check_bytes(doc.size)
+            with open_buffer(doc) as data:
+                document, created = run_document_detection(
+                    data, doc.name, crop=crop, watermark=watermark
+                )
+        except UploadError as ex:
+            return Response(*upload_error(ex))
+
+        serializer = DocumentSerializer(documents().get(pk=document.pk), context={"request": request})
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+
+class DocumentDetailView(APIView):
+    def get(self, request, pk):
+        document = get_object_or_404(documents(), pk=pk)
+        serializer = DocumentSerializer(document, context={"request": request})
+        return Response(serializer.data)
@@ -1,32 +1,145 @@
-# from rest_framework.viewsets import ModelViewSet
+import asyncio
+import functools
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-# from api.models import Image
-from api.serializers import ImageUploadSerializer
-from plugins.detector import Detection
-from plugins.engines import send
+from api.models import Image
+from api.pagination import ImageCursorPagination
+from api.pipeline import (
+    cells_table,
+    detection_executor,
+    find_cached,
+    format_detector,
+    recognition_table,
+    render_result,
+    run_atlas_recognition,
+    run_batch_detection,
+    save_detection,
+)
+from api.serializers import ImageSerializer, ImageUploadSerializer
+from plugins import timing
+from plugins.engines import asend, send
+from plugins.ingest import UploadError, UploadTooLarge, open_upload
+
+
+def as_bool(value, default=False):
+    """ form/query 값("true", "1", "false", "0" ...)을 bool 로 변환 """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def upload_error(ex):
+    """ UploadError 응답 데이터, 상태 코드(크기 제한 초과: 413, 그 외: 400) """
+    if isinstance(ex, UploadTooLarge):
+        return {"detail": str(ex)}, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    return {"detail": str(ex)}, status.HTTP_400_BAD_REQUEST
+
+
+def recognition_failed(data, ex):
+    """ 문자 인식(OCR) 요청 실패 응답 데이터(저장된 검출 결과 포함), 상태 코드(502) """
+    detail = "문자 인식(OCR) 요청에 실패했습니다: {}".format(ex or type(ex).__name__)
+    return dict(data, detail=detail), status.HTTP_502_BAD_GATEWAY
+
+
+class ImageViewSet(ReadOnlyModelViewSet):
+    """
+    저장된 검출 결과 조회
+    - GET /api/image/ : 최근 결과부터 cursor pagination(?cursor=, ?page_size=)
+    - GET /api/image/{id}/
+    - ?fields=id,original_img,... : 응답에 포함할 필드
+      (bounding_boxes 를 제외하면 셀 좌표(box_data)를 읽지 않음)
+    - 응답의 id, updated_at 으로 만든 ETag 로 조건부 요청(If-None-Match) 처리,
+      변경이 없으면 id, updated_at 만 조회하고 304 응답
+      (Last-Modified(If-Modified-Since)는 상세 조회에서만 사용)
+    """
+
+    queryset = Image.objects.all()
+    serializer_class = ImageSerializer
+    pagination_class = ImageCursorPagination
+
+    def get_fields(self):
+        """ ?fields= 로 지정한 필드 이름 목록(None: 전체) """
+        value = self.request.query_params.get("fields")
+        if not value:
+            return None
+        fields = [name for name in value.split(",") if name]
+        unknown = sorted(set(fields) - set(ImageSerializer.Meta.fields))
+        if unknown:
+            raise ValidationError({"fields": ["Unknown field: {}".format(", ".join(unknown))]})
+        return fields
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_fields()
+        if fields is not None and "bounding_boxes" not in fields:
+            queryset = queryset.defer("box_data", "detection_info")
+        return queryset
 
-# class ImageViewSet(ModelViewSet):
-#     queryset = Image.objects.all()
-#     serializer_class = ImageSerializer
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, fields=self.get_fields(), **kwargs)
 
-#     def post(self, request, *args, **kwargs):
-#         img = request.data.get("file")
-#         print(request.data)
-#         if img is None:
-#             return Response(status=status.HTTP_400_BAD_REQUEST)
+    def list(self, request, *args, **kwargs):
+        # 페이지의 id, updated_at 만 먼저 조회(cursor 는 created_at 으로 생성)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset.only("id", "created_at", "updated_at"))
 
-#         format_detector = Detection()
-#         data = format_detector.detect(img)
-#         print(data)
-#         serializer = self.get_serializer(data=data)
-#         serializer.is_valid(raise_exception=True)
-#         self.perform_create(serializer)
-#         headers = self.get_success_headers(serializer.data)
-#         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        def build():
+            images = queryset.in_bulk([image.pk for image in page])
+            serializer = self.get_serializer([images[image.pk] for image in page], many=True)
+            return self.get_paginated_response(serializer.data)
+
+        # 목록은 행이 삭제되거나 페이지 범위에 들어와도 가장 최근 updated_at 이 바뀌지 않을 수 있으므로
+        # 항목(id, updated_at) 목록으로 만든 ETag 로만 비교
+        return self.conditional_response(request, page, build, last_modified=False)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        image = get_object_or_404(self.get_queryset().only("id", "updated_at"), **lookup)
+
+        def build():
+            return Response(self.get_serializer(self.get_object()).data)
+
+        return self.conditional_response(request, [image], build)
+
+    def conditional_response(self, request, images, build, last_modified=True):
+        """
+        images 의 (id, updated_at) 로 조건부 요청 처리
+
+        Keyword arguments:
+            images -- 응답에 포함되는 Image 목록(id, updated_at)
+            build -- 변경된 경우 응답을 생성하는 함수
+            last_modified -- Last-Modified(If-Modified-Since) 사용 여부
+        """
+        # 같은 주소라도 응답 형식(json, api)에 따라 내용이 다름
+        digest = hashlib.sha1(request.accepted_renderer.format.encode())
+        for image in images:
+            digest.update("{}:{};".format(image.pk, image.updated_at.isoformat()).encode())
+        etag = '"{}"'.format(digest.hexdigest())
+        updated_at = max((image.updated_at for image in images), default=None)
+        last_modified = int(updated_at.timestamp()) if updated_at and last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = build()
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        # 캐시에 저장하되 사용할 때마다 ETag 로 재검증
+        patch_cache_control(response, no_cache=True)
+        return response
 
 
 class ImageUploadView(APIView):
@@ -36,13 +149,154 @@ class ImageUploadView(APIView):
         key = request.META.get("HTTP_API_KEY")
         if img is None:
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        format_detector = Detection()
-        detection_result = format_detector.detect(img)
-        recognition_result = send(img, url, key)
-        print(recognition_result)
-
-        serializer = ImageUploadSerializer(data=detection_result, context={"request": request})
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        crop = as_bool(request.data.get("crop"), default=True)
+        watermark = as_bool(request.data.get("watermark"), default=False)
+
+        # 업로드 이미지는 복사하지 않고(임시 파일은 mmap) 표 영역 검출과 문자 인식에 함께 사용
+        try:
+            with open_upload(img) as data:
+                return self.recognize(request, img, data, url, key, crop, watermark)
+        except UploadError as ex:
+            return Response(*upload_error(ex))
+
+    def recognize(self, request, img, data, url, key, crop, watermark):
+        if request.data.get("mode") == "atlas":
+            # 검출된 셀만 OCR 엔진에 전송하고 셀 단위 인식 결과 반환
+            image, created, cells = run_atlas_recognition(
+                data, url, key, crop=crop, watermark=watermark
+            )
+            data = dict(ImageUploadSerializer(image, context={"request": request}).data)
+            data["cells"] = cells
+            data["table"] = cells_table(image, cells)
+            return Response(
+                data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            )
+
+        digest, image = find_cached(data, crop=crop, watermark=watermark)
+        created = image is None
+        if created:
+            # 문자 인식(OCR) 요청을 기다리는 동안 다른 스레드에서 표 영역 검출
+            detection = detection_executor.submit(
+                timing.bind(format_detector.detect), data, crop=crop, watermark=watermark
+            )
+
+        recognition_result, recognition_error = None, None
+        try:
+            recognition_result = send(data, img.name, img.content_type, url, key) if url else None
+        except Exception as ex:
+            # 문자 인식에 실패해도 검출 결과는 저장(다시 요청하면 캐시에서 반환)
+            recognition_error = ex
+
+        if created:
+            image = save_detection(digest, detection.result())
+
+        data = ImageUploadSerializer(image, context={"request": request}).data
+        if recognition_error is not None:
+            return Response(*recognition_failed(data, recognition_error))
+        if recognition_result is not None:
+            # 인식 결과를 셀 단위로 분류한 표
+            data = dict(data, table=recognition_table(image, recognition_result))
+        return Response(data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+async def async_upload(request):
+    """
+    ImageUploadView 의 async 버전(ASGI 서버에서 사용)
+    - 표 영역 검출은 detection_executor 에서 실행하고 OCR 엔진 응답은 event loop 에서 대기
+      (요청마다 스레드를 점유하지 않으므로 worker 하나로 많은 OCR 요청을 동시에 처리)
+    - DB 조회, 저장은 sync_to_async 로 실행
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    img = request.FILES.get("file")
+    url = request.META.get("HTTP_URL")
+    key = request.META.get("HTTP_API_KEY")
+    if img is None:
+        return HttpResponseBadRequest()
+    crop = as_bool(request.POST.get("crop"), default=True)
+    watermark = as_bool(request.POST.get("watermark"), default=False)
+
+    try:
+        with open_upload(img) as data:
+            return await async_recognize(request, img, data, url, key, crop, watermark)
+    except UploadError as ex:
+        data, code = upload_error(ex)
+        return JsonResponse(data, status=code)
+
+
+async def async_recognize(request, img, data, url, key, crop, watermark):
+    if request.POST.get("mode") == "atlas":
+        image, created, cells = await sync_to_async(run_atlas_recognition)(
+            data, url, key, crop=crop, watermark=watermark
+        )
+        data = dict(ImageUploadSerializer(image, context={"request": request}).data)
+        data["cells"] = cells
+        data["table"] = cells_table(image, cells)
+        return JsonResponse(data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    digest, image = await sync_to_async(find_cached)(data, crop=crop, watermark=watermark)
+    created = image is None
+    if created:
+        detect = functools.partial(format_detector.detect, data, crop=crop, watermark=watermark)
+        detection = asyncio.get_running_loop().run_in_executor(
+            detection_executor, timing.bind(detect)
+        )
+
+    recognition_result, recognition_error = None, None
+    try:
+        recognition_result = (
+            await asend(data, img.name, img.content_type, url, key) if url else None
+        )
+    except Exception as ex:
+        recognition_error = ex
+
+    if created:
+        image = await sync_to_async(save_detection)(digest, await detection)
+
+    data = ImageUploadSerializer(image, context={"request": request}).data
+    if recognition_error is not None:
+        data, code = recognition_failed(data, recognition_error)
+        return JsonResponse(data, status=code)
+    if recognition_result is not None:
+        data = dict(data, table=recognition_table(image, recognition_result))
+    return JsonResponse(data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+# DRF APIView 와 같이 CSRF 검사 제외
+# - csrf_exempt decorator 는 async view 를 sync view 로 감싸므로 속성만 설정
+async_upload.csrf_exempt = True
+
+
+class ResultImageView(APIView):
+    def get(self, request, pk):
+        """
+        셀 테두리를 그린 결과 이미지
+        - 업로드 시 생성하지 않은 경우 처음 요청될 때 생성 후 캐시
+        """
+        image = get_object_or_404(Image, pk=pk)
+        data, content_type = render_result(image)
+        return HttpResponse(data, content_type=content_type)
+
+
+class BatchUploadView(APIView):
+    def post(self, request):
+        """
+        여러 이미지 일괄 업로드
+        - 업로드 순서대로 이미지별 결과(result) 또는 오류(error) 반환
+        """
+        files = request.FILES.getlist("files")
+        if not files:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        crop = as_bool(request.data.get("crop"), default=True)
+        watermark = as_bool(request.data.get("watermark"), default=False)
+
+        results = []
+        for img, (image, created, error) in zip(
+            files, run_batch_detection(files, crop=crop, watermark=watermark)
+        ):
+            if error is not None:
+                results.append({"name": img.name, "error": error})
+            else:
+                serializer = ImageUploadSerializer(image, context={"request": request})
+                results.append({"name": img.name, "created": created, "result": serializer.data})
+        return Response(results, status=status.HTTP_200_OK)
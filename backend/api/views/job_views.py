@@ -0,0 +1,58 @@
+from django.core.exceptions import ValidationError
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from api.jobs import job_runner
+from api.models import Job
+from api.serializers import JobSerializer
+from api.views.image_views import as_bool, upload_error
+from plugins.ingest import UploadError, open_upload
+
+
+class JobView(APIView):
+    def post(self, request):
+        """
+        비동기 작업 등록
+        - 작업 id 를 즉시 반환(202), 처리 결과는 GET /api/jobs/{id}/ 로 조회
+        - callback 주소가 주어지면 작업 완료 후 결과를 POST 로 전송
+        """
+        img = request.data.get("file")
+        url = request.META.get("HTTP_URL")
+        key = request.META.get("HTTP_API_KEY")
+        if img is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        job = Job(
+            content_type=img.content_type or "",
+            crop=as_bool(request.data.get("crop"), default=True),
+            watermark=as_bool(request.data.get("watermark"), default=False),
+            callback=request.data.get("callback", ""),
+        )
+        try:
+            job.full_clean(exclude=["upload"])
+        except ValidationError as ex:
+            return Response(ex.message_dict, status=status.HTTP_400_BAD_REQUEST)
+        # 크기, 픽셀 수 제한은 작업 등록 전에 확인
+        try:
+            with open_upload(img):
+                pass
+        except UploadError as ex:
+            return Response(*upload_error(ex))
+        job.upload.save(img.name, img)
+
+        if not job_runner.submit(job, url, key):
+            job.upload.delete(save=False)
+            job.delete()
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        serializer = JobSerializer(job, context={"request": request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class JobDetailView(APIView):
+    def get(self, request, pk):
+        job = get_object_or_404(Job.objects.select_related("image"), pk=pk)
+        serializer = JobSerializer(job, context={"request": request})
+        return Response(serializer.data)
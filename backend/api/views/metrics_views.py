@@ -0,0 +1,10 @@
+from django.http import Http404, HttpResponse
+
+from plugins import timing
+
+
+def metrics(request):
+    """ 단계별 실행 시간 histogram(Prometheus text format) """
+    if not timing.enabled:
+        raise Http404
+    return HttpResponse(timing.prometheus(), content_type="text/plain; version=0.0.4")
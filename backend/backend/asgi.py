@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# 이전 프로세스에서 중단된 비동기 작업 정리
+from api.jobs import job_runner  # noqa: E402
+
+job_runner.start()
@@ -44,7 +44,7 @@ INSTALLED_APPS = [
     # drf_yasg
     "drf_yasg",
     # apps
-    "api",
+    "api.apps.ApiConfig",
 ]
 
 # REST_FRAMEWORK = {
@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 # }
 
 MIDDLEWARE = [
+    # 단계별 실행 시간(Server-Timing) 측정
+    "api.middleware.server_timing_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -149,3 +151,122 @@ STATIC_URL = "/static/"
 MEDIA_URL = "/media/"
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Uploads
+
+# 업로드 파일이 이 크기(bytes)를 넘으면 메모리 대신 임시 파일에 저장(mmap 으로 읽어서 디코딩)
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2 * 1024 * 1024
+# 업로드 이미지 파일의 최대 크기(bytes, 초과 시 413 응답)
+UPLOAD_MAX_BYTES = 50 * 1024 * 1024
+# 업로드 이미지의 최대 픽셀 수(width * height, 디코딩 전 헤더로 확인, 초과 시 413 응답)
+# - 디코딩 메모리 = 픽셀 수 * 3 bytes(BGR), 50MP: 약 150MB
+UPLOAD_MAX_PIXELS = 50 * 1000 * 1000
+
+# Detection
+
+# Detection 생성 옵션
+# - roi_preview_size: ROI 테두리를 찾을 축소 이미지의 최대 크기(px, 0: 원본 크기에서 탐색)
+# - reduced_decode: 결과 이미지 크기(1024px)가 허용하는 만큼 축소해서 디코딩
+DETECTION_OPTIONS = {
+    "roi_preview_size": 800,
+    "reduced_decode": True,
+    # 양식(template) 셀 좌표 재사용: 기본값 0(사용 안 함)
+    # - 재사용한 셀 좌표는 근사값(수 px 차이)이고 프로세스가 이전에 처리한 양식에 따라 결과가 달라짐
+    #   (같은 입력의 결과가 항상 같아야 하면 사용하지 않음)
+    "template_capacity": 0,
+    # 결과 이미지(result_img)는 업로드 시 만들지 않고 처음 요청될 때 생성
+    "render_result": False,
+    # 저장 형식(python manage.py bench_encoding 으로 형식별 크기, 속도 비교)
+    # - jpeg q90: q95 대비 약 22% 작고 인코딩 속도는 같음(PSNR 44dB 이상)
+    # - 무손실 ROI 이미지만 저장: "lossless": True (+ "render_result": False)
+    "image_format": "jpeg",
+    "image_quality": 90,
+    # 결과 이미지 크기(max_size, 기본값 1024px)보다 큰 이미지의 get_frame 은 가로 띠로 나눠 병렬 처리
+    # - 도면, 넓은 장부 등은 "max_size": 8000 처럼 설정(셀 좌표는 나누지 않은 경우와 같음)
+    "tile_size": 1024,
+    "tile_threads": 4,
+    # 셀 추출 방식("projection": 투영 프로파일 격자, 셀이 많은 표에서 빠르고 병합 셀의 행/열 정보 포함)
+    "grid_engine": "contours",
+}
+# Detection 결과 캐시(프로세스 내부 LRU)의 최대 크기(bytes)
+DETECTION_CACHE_MAX_BYTES = 16 * 1024 * 1024
+# 요청 시 생성한 결과 이미지 캐시(프로세스 내부 LRU)의 최대 크기(bytes)
+RESULT_IMG_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# 업로드 요청에서 문자 인식(OCR)과 동시에 표 영역 검출을 수행하는 스레드 수
+DETECTION_THREADS = 4
+
+# Jobs
+
+# 비동기 작업을 처리하는 스레드 수
+JOB_WORKERS = 2
+# 처리를 기다리는 작업의 최대 개수(초과 시 503 응답)
+JOB_QUEUE_SIZE = 32
+# 작업 완료 콜백 요청 timeout(seconds)
+JOB_CALLBACK_TIMEOUT = 10
+# 서버 시작 시 이전 프로세스에서 대기/실행 중이던 작업(queued, running)을 실패로 기록
+# - 대기열은 프로세스 메모리에 있고 작업을 실행하는 프로세스는 기록하지 않으므로
+#   서버를 하나의 프로세스로 실행하는 경우에만 True 로 설정
+#   (여러 worker 프로세스로 실행하면 다른 프로세스에서 실행 중인 작업까지 실패로 기록됨)
+JOB_RECOVER_ON_STARTUP = False
+
+# Batch upload
+
+# 일괄 업로드 이미지를 처리하는 프로세스 수(None: CPU 코어 수)
+BATCH_WORKERS = None
+# 한 번의 요청으로 업로드할 수 있는 최대 파일 수
+DATA_UPLOAD_MAX_NUMBER_FILES = 1000
+# 동시에 처리하는(읽은 후 검출을 기다리거나 실행 중인) 최대 이미지 수
+# - 일괄 업로드 요청이 사용하는 메모리는 파일 수가 아닌 이 값에 비례
+BATCH_IMAGES_IN_FLIGHT = (os.cpu_count() or 1) * 2
+
+# Documents
+
+# 여러 페이지 문서(PDF, TIFF)의 최대 페이지 수(초과 시 413 응답)
+DOCUMENT_MAX_PAGES = 200
+# 동시에 처리하는(디코딩 후 검출을 기다리거나 실행 중인) 최대 페이지 수
+# - 문서 하나가 사용하는 메모리는 페이지 수가 아닌 이 값에 비례
+DOCUMENT_PAGES_IN_FLIGHT = (os.cpu_count() or 1) * 2
+
+# Media
+
+# sweep_media 에서 참조가 없어도 삭제하지 않는 기간(seconds, 파일 수정 시간 기준)
+# - 파일은 Image 행보다 먼저 저장되므로 저장 중인 요청의 파일을 지우지 않도록 충분히 길게 설정
+MEDIA_SWEEP_GRACE = 24 * 60 * 60
+# sweep_media 한 번의 batch 에서 확인하는 파일 수
+MEDIA_SWEEP_BATCH_SIZE = 1000
+# 결과(Image, Document, Job 행) 보존 기간(days, 0: 삭제하지 않음)
+# - sweep_media 가 생성 후 보존 기간이 지난 행을 먼저 삭제하고, 참조가 없어진 파일을 삭제
+MEDIA_RETENTION_DAYS = 30
+
+# Read API
+
+# 검출 결과 목록(GET /api/image/)의 기본 페이지 크기, ?page_size= 로 지정할 수 있는 최대 크기
+IMAGE_PAGE_SIZE = 50
+IMAGE_MAX_PAGE_SIZE = 500
+
+# OCR engine
+
+# OCR 엔진 요청 timeout(connect, read seconds)
+OCR_TIMEOUT = (3.05, 30)
+# 429/5xx 응답, 연결 실패 시 최대 재시도 횟수
+OCR_RETRIES = 3
+# 재시도 대기 시간 기준값(seconds), OCR_BACKOFF * 2^n 만큼 대기
+OCR_BACKOFF = 0.5
+# 최대 재시도 대기 시간(seconds), 429 응답의 Retry-After 가 더 길어도 이 시간만 대기
+OCR_MAX_RETRY_DELAY = 10
+# 프로세스에서 동시에 전송할 수 있는 OCR 요청 수
+OCR_MAX_IN_FLIGHT = 8
+# 호스트별 keep-alive 연결 수
+OCR_POOL_SIZE = 10
+# async view(ASGI)에서 event loop 별로 동시에 전송할 수 있는 OCR 요청 수
+# - 응답을 기다리는 동안 스레드를 점유하지 않으므로 OCR_MAX_IN_FLIGHT 보다 크게 설정
+OCR_ASYNC_MAX_IN_FLIGHT = 64
+# 동시에 들어온 OCR 요청을 모으는 시간(seconds, 0: 요청마다 바로 전송)
+OCR_BATCH_WINDOW = 0
+# 한 번의 OCR 요청으로 전송할 최대 이미지 수
+OCR_BATCH_SIZE = 8
+
+# Metrics
+
+# 단계별 실행 시간 측정(Server-Timing 헤더, /metrics) 사용 여부
+METRICS_ENABLED = False
@@ -0,0 +1,126 @@
+import cv2
+import numpy as np
+
+from plugins.spatial import BoxIndex, field_centers
+
+
+def select_cells(boxes, shape, min_size=30, max_ratio=0.5):
+    """
+    OCR 대상 셀 선택
+    - draw_frame 과 같은 기준(w > min_size or h > min_size)으로 작은 컨투어 제외
+    - 표 전체/바깥 영역처럼 이미지 면적의 max_ratio 이상을 차지하는 영역 제외
+
+    Keyword arguments:
+        boxes -- (x, y, w, h) 목록
+        shape -- 이미지 크기(height, width)
+    """
+    area = shape[0] * shape[1]
+    return [
+        tuple(box)
+        for box in boxes
+        if (box[2] > min_size or box[3] > min_size) and box[2] * box[3] < area * max_ratio
+    ]
+
+
+class CellAtlas:
+    """
+    표 셀 이미지를 하나의 atlas 이미지로 합쳐 OCR 엔진으로 전송
+    1. 셀 영역을 ROI 이미지에서 잘라내 높이 순으로 정렬 후 행(shelf) 단위로 배치
+    2. OCR 결과(fields)의 좌표를 atlas 좌표에서 원래 셀 좌표로 변환
+
+    Keyword arguments:
+        img -- 셀을 잘라낼 이미지(ROI 영역 이미지)
+        boxes -- 셀 좌표(x, y, w, h) 목록, detection 이미지 기준
+        scale -- detection 이미지 크기 / img 크기
+        padding -- atlas 안에서 셀 사이 간격(px)
+    """
+
+    def __init__(self, img, boxes, scale=1.0, padding=10):
+        self.img = img
+        self.scale = scale
+        self.padding = padding
+        self.cells = [tuple(box) for box in boxes]
+        # 셀별 (img 기준 잘라낼 영역(x, y, w, h), atlas 위치(x, y))
+        self.placements = []
+        self.size = (0, 0)
+        self._index = None
+        self.pack()
+
+    def crop_rect(self, box):
+        x, y, w, h = (int(round(v / self.scale)) for v in box)
+        height, width = self.img.shape[:2]
+        x, y = min(max(x, 0), width - 1), min(max(y, 0), height - 1)
+        return x, y, max(1, min(w, width - x)), max(1, min(h, height - y))
+
+    def pack(self):
+        rects = [self.crop_rect(box) for box in self.cells]
+        max_width = max([self.img.shape[1]] + [w + 2 * self.padding for _, _, w, _ in rects])
+
+        placements = [None] * len(rects)
+        x = y = shelf_height = 0
+        for index in sorted(range(len(rects)), key=lambda i: rects[i][3], reverse=True):
+            w, h = rects[index][2] + self.padding, rects[index][3] + self.padding
+            if x + w + self.padding > max_width:
+                x, y, shelf_height = 0, y + shelf_height, 0
+            placements[index] = (rects[index], (x + self.padding, y + self.padding))
+            x += w
+            shelf_height = max(shelf_height, h)
+
+        self.placements = placements
+        self._index = None
+        self.size = (y + shelf_height + self.padding, max_width)
+
+    def render(self):
+        """ atlas 이미지 생성(흰 배경) """
+        atlas = np.full(self.size + self.img.shape[2:], 255, np.uint8)
+        for (x, y, w, h), (ax, ay) in self.placements:
+            atlas[ay : ay + h, ax : ax + w] = self.img[y : y + h, x : x + w]
+        return atlas
+
+    def encode(self, ext=".jpg"):
+        return cv2.imencode(ext, self.render())[1].tobytes()
+
+    @property
+    def index(self):
+        """ atlas 안의 셀 위치(x, y, w, h) 공간 색인(BoxIndex) """
+        if self._index is None:
+            self._index = BoxIndex([(ax, ay, w, h) for (_, _, w, h), (ax, ay) in self.placements])
+        return self._index
+
+    def locate(self, px, py):
+        """ atlas 좌표(px, py)가 포함된 셀 index """
+        index = int(self.index.query([(px, py)])[0])
+        return index if index >= 0 else None
+
+    def map_fields(self, fields):
+        """
+        OCR 결과 fields 를 셀 단위로 분류하고 좌표를 detection 이미지 기준으로 변환
+        - fields 중심 좌표가 포함된 셀은 공간 색인(BoxIndex)으로 한 번에 검색
+
+        Returns:
+            [{"box": [x, y, w, h], "text": "...", "fields": [...]}, ...]
+        """
+        cells = [{"box": list(box), "text": "", "fields": []} for box in self.cells]
+        fields = list(fields or [])
+        located = self.index.query(field_centers(fields)) if fields and cells else []
+        for field, index in zip(fields, located):
+            if index < 0:
+                continue
+
+            vertices = field["boundingPoly"]["vertices"]
+            (x, y, _, _), (ax, ay) = self.placements[index]
+            mapped = dict(field)
+            mapped["boundingPoly"] = {
+                "vertices": [
+                    {
+                        "x": (v.get("x", 0) - ax + x) * self.scale,
+                        "y": (v.get("y", 0) - ay + y) * self.scale,
+                    }
+                    for v in vertices
+                ]
+            }
+            cells[index]["fields"].append(mapped)
+
+        for cell in cells:
+            cell["text"] = " ".join(field.get("inferText", "") for field in cell["fields"])
+        return cells
@@ -0,0 +1,49 @@
+import numpy as np
+
+# 셀로 판단할 최소 크기(px, draw_frame, select_cells 와 같은 기준: w > 30 or h > 30)
+MIN_BOX_SIZE = 30
+
+# 저장 형식: int32 header(셀당 값의 개수, 값의 bytes) + little-endian 값 배열
+# - 셀당 값: 4(x, y, w, h) or 8(+ row, col, rowspan, colspan)
+# - 모든 값이 65535 이하이면 uint16, 아니면 int32
+HEADER_DTYPE = np.dtype("<i4")
+VALUE_DTYPES = {2: np.dtype("<u2"), 4: np.dtype("<i4")}
+
+
+def filter_boxes(boxes, min_size=MIN_BOX_SIZE):
+    """ 글자, 잡음 등 작은 컨투어를 제외한 셀 좌표 목록 """
+    return [box for box in boxes if box[2] > min_size or box[3] > min_size]
+
+
+def pack_boxes(boxes, spans=None):
+    """
+    셀 좌표(와 격자 위치)를 정수 배열 bytes 로 변환
+
+    Keyword arguments:
+        boxes -- 셀 좌표(x, y, w, h) 목록
+        spans -- boxes 와 같은 순서의 (row, col, rowspan, colspan) 목록(Grid.to_data()["cells"])
+
+    Returns:
+        bytes(header 8 bytes + 셀 하나당 8 bytes(uint16), spans 포함 16 bytes)
+    """
+    array = np.asarray(boxes, np.int64).reshape(-1, 4)
+    if spans is not None:
+        array = np.hstack((array, np.asarray(spans, np.int64).reshape(-1, 4)))
+    small = not array.size or (array.min() >= 0 and array.max() <= np.iinfo(np.uint16).max)
+    dtype = VALUE_DTYPES[2 if small else 4]
+    header = np.array([array.shape[1], dtype.itemsize], HEADER_DTYPE)
+    return header.tobytes() + array.astype(dtype).tobytes()
+
+
+def unpack_boxes(data):
+    """
+    pack_boxes 결과를 (셀 수, 4 or 8) 정수 배열로 변환(복사하지 않음, 읽기 전용)
+
+    Keyword arguments:
+        data -- bytes, memoryview(BinaryField 값)
+    """
+    if not data:
+        return np.zeros((0, 4), VALUE_DTYPES[4])
+    columns, itemsize = np.frombuffer(data, HEADER_DTYPE, count=2).tolist()
+    array = np.frombuffer(data, VALUE_DTYPES[itemsize], offset=HEADER_DTYPE.itemsize * 2)
+    return array.reshape(-1, columns)
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
+
+def make_key(data, **options):
+    """
+    업로드 바이트와 처리 옵션으로 캐시 키(sha256 digest) 생성
+    e.g)
+        make_key(data, crop=True, watermark=False)
+
+    Keyword arguments:
+        data -- uploaded image bytes
+        options -- detection options(crop, watermark, ...)
+    """
+    digest = hashlib.sha256(data)
+    for name in sorted(options):
+        digest.update("|{}={}".format(name, options[name]).encode())
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    바이트 예산(max_bytes) 기반 LRU 캐시
+    - 저장된 항목 크기의 합이 max_bytes 를 넘으면 가장 오래 사용되지 않은 항목부터 제거
+    - 여러 스레드에서 공유 가능
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._items[key]
+            except KeyError:
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        # 예산보다 큰 항목은 저장하지 않음
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_size
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self.current_bytes -= item[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
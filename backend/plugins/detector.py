@@ -1,26 +1,189 @@
 # import required libraries
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
 import numpy as np
 import cv2
 import imutils
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.base import ContentFile
+
+from plugins.boxes import MIN_BOX_SIZE, filter_boxes, pack_boxes
+from plugins.cache import make_key
+from plugins.encoding import ImageEncoder
+from plugins.grid import Grid
+from plugins.ingest import UploadError, image_size
+from plugins.kernels import get_kernel
+from plugins.templates import Layout, get_registry
+from plugins.timing import timed, timer
+
+# 원본 크기 OpenCV 디코딩 flag
+# - 축소 디코딩(IMREAD_REDUCED_COLOR_*)과 같이 8-bit BGR 로 디코딩(회색조, 16-bit, alpha 채널 이미지 포함)
+# - IMREAD_IGNORE_ORIENTATION: EXIF 방향 정보로 회전하지 않음(헤더 기준 방향)
+FULL_DECODE_FLAG = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+
+# 축소 배율별 OpenCV 디코딩 flag (JPEG 은 DCT 단계에서 축소되어 디코딩 비용, 메모리 모두 감소)
+# - 원본 크기 디코딩(FULL_DECODE_FLAG)과 같은 방향, 채널로 디코딩
+REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8 | cv2.IMREAD_IGNORE_ORIENTATION),
+    (4, cv2.IMREAD_REDUCED_COLOR_4 | cv2.IMREAD_IGNORE_ORIENTATION),
+    (2, cv2.IMREAD_REDUCED_COLOR_2 | cv2.IMREAD_IGNORE_ORIENTATION),
+]
+
+# get_frame 셀 추출 방식
+GRID_ENGINES = ("contours", "projection")
+
+# 축소 이미지에서 끊어진 테두리 경계선을 연결하는 커널
+EDGE_KERNEL = np.ones((3, 3), np.uint8)
+
+
+_tile_executors = {}
+_tile_executors_lock = threading.Lock()
+
+
+def get_tile_executor(threads):
+    """
+    get_frame 타일(strip) 처리용 공용 스레드 풀(스레드 수별로 하나)
+    - OpenCV 연산은 GIL 을 해제하므로 타일을 여러 코어에서 동시에 처리
+    """
+    with _tile_executors_lock:
+        if threads not in _tile_executors:
+            _tile_executors[threads] = ThreadPoolExecutor(
+                max_workers=threads, thread_name_prefix="get_frame"
+            )
+        return _tile_executors[threads]
+
+
+class DetectionResult:
+    """
+    Detection.detect 결과
+
+    Keyword arguments:
+        original_img -- ROI 분리, 크기 조정 후 이미지(encoded bytes)
+        result_img -- 셀 테두리를 그린 이미지(encoded bytes, render_result=False 인 경우 None)
+        bounding_boxes -- {"boxes": 셀 좌표(x, y, w, h) 목록(MIN_BOX_SIZE 이하의 컨투어 제외)}
+                          (grid_engine="projection": "grid" 에 Grid.to_data() 추가,
+                           "transform": 업로드 이미지 좌표 -> original_img 좌표 3x3 변환 행렬)
+        roi_img -- 해상도 축소 전 ROI 영역 이미지(keep_roi=True)
+        scale -- 축소 비율(original_img 크기 / roi_img 크기)
+        ext -- original_img, result_img 의 확장자(".jpg", ".webp", ".png")
+    """
+
+    def __init__(
+        self, original_img, result_img, bounding_boxes, roi_img=None, scale=1.0, ext=".jpg"
+    ):
+        self.original_img = original_img
+        self.result_img = result_img
+        self.bounding_boxes = bounding_boxes
+        self.roi_img = roi_img
+        self.scale = scale
+        self.ext = ext
+
+    def to_data(self):
+        """
+        Image 생성 데이터
+        - 인코딩된 bytes 를 복사하지 않고 ContentFile 로 감싸서 storage 에 전달
+        """
+        # 셀 좌표(와 격자 위치)는 정수 배열로, 나머지 검출 정보만 JSON 으로 저장
+        info = {key: value for key, value in self.bounding_boxes.items() if key != "boxes"}
+        grid = info.get("grid")
+        if grid is not None:
+            info["grid"] = {"rows": grid["rows"], "cols": grid["cols"]}
+        data = {
+            "original_img": ContentFile(self.original_img, name="original_img" + self.ext),
+            "detection_info": info,
+            "box_data": pack_boxes(
+                self.bounding_boxes["boxes"], grid["cells"] if grid is not None else None
+            ),
+        }
+        if self.result_img is not None:
+            data["result_img"] = ContentFile(self.result_img, name="result_img" + self.ext)
+        return data
 
 
 class Detection:
-    def __init__(self):
-        self.original_img = None
-        self.result_img = None
-        self.bounding_boxes = {}
-
-    def crop_roi(self, img, orig):
+    """
+    표 영역 검출 엔진
+    - 처리 중인 이미지, 결과를 인스턴스에 저장하지 않으므로(설정값만 보관)
+      하나의 인스턴스를 여러 요청, 스레드에서 동시에 사용 가능
+    """
+
+    # 결과 이미지의 최대 크기(px)
+    max_size = 1024
+
+    def __init__(
+        self,
+        roi_preview_size=0,
+        reduced_decode=False,
+        crop_headroom=1.5,
+        template_capacity=0,
+        render_result=True,
+        image_format="jpeg",
+        image_quality=95,
+        png_compression=3,
+        lossless=False,
+        max_size=None,
+        tile_size=0,
+        tile_threads=4,
+        grid_engine="contours",
+    ):
+        """
+        Keyword arguments:
+            roi_preview_size -- ROI 테두리를 찾을 축소 이미지의 최대 크기(px, 0: 원본 크기에서 탐색)
+            reduced_decode -- 결과 이미지 크기(max_size)가 허용하는 만큼 축소해서 디코딩
+            crop_headroom -- ROI 영역을 분리하는 경우 디코딩 이미지가 max_size 의 몇 배 이상이어야 하는지
+                             (ROI 영역이 원본보다 작아도 max_size 이상의 해상도를 유지하기 위함)
+            template_capacity -- 셀 좌표를 재사용할 양식(template)의 최대 개수(0: 사용 안 함)
+            render_result -- 결과 이미지(result_img) 생성 여부(False: bounding_boxes 만 추출)
+            image_format -- original_img, result_img 저장 형식("jpeg", "webp", "png")
+            image_quality -- JPEG/WebP 품질(1~100)
+            png_compression -- PNG 압축 레벨(0~9)
+            lossless -- 무손실 저장(render_result=False 와 함께 사용하면 무손실 ROI 이미지만 저장)
+            max_size -- 결과 이미지의 최대 크기(px, 기본값: 1024)
+                        (도면, 넓은 장부 등 큰 표는 크게 설정하고 tile_size 와 함께 사용)
+            tile_size -- get_frame 을 이 높이(px)의 가로 띠(strip)로 나눠 병렬 처리(0: 나누지 않음)
+            tile_threads -- 타일을 처리하는 스레드 수
+            grid_engine -- 셀 추출 방식
+                           ("contours": 컨투어 추적, "projection": 투영 프로파일 격자(get_grid))
+        """
+        options = {name: value for name, value in locals().items() if name != "self"}
+        self.roi_preview_size = roi_preview_size
+        self.reduced_decode = reduced_decode
+        self.crop_headroom = crop_headroom
+        self.template_capacity = template_capacity
+        self.render_result = render_result
+        self.encoder = ImageEncoder(image_format, image_quality, png_compression, lossless)
+        if max_size:
+            self.max_size = max_size
+        self.tile_size = tile_size
+        self.tile_threads = tile_threads
+        if grid_engine not in GRID_ENGINES:
+            raise ValueError("지원하지 않는 grid_engine: {}".format(grid_engine))
+        self.grid_engine = grid_engine
+        # 생성 옵션의 digest(검출 결과 캐시 키에 포함, 옵션이 바뀌면 이전 결과를 재사용하지 않음)
+        options["max_size"] = self.max_size
+        self.options_key = make_key(b"", **options)
+
+    @timed("crop_roi")
+    def crop_roi(self, img, orig, target_size=None, reduced=False, return_matrix=False):
         """
         이미지에서 ROI(Region of Interest)영역 추출
         1. 원본 이미지 파일에서 표의 겉 테두리 윤곽선 추출
+           (roi_preview_size 가 설정된 경우 축소 이미지에서 추출 후 꼭지점 좌표를 원본 크기로 변환)
         2. 겉 테두리 윤곽선의 꼭지점 좌표 추출
         3. 꼭지점 좌표를 바탕으로 이미지 원근 변환을 통해 ROI영역 분리
 
         Keyword arguments:
             img -- image(.jpg/.png)
+            target_size -- ROI 영역의 최대 크기(px), 원근 변환과 동시에 크기 축소
+            reduced -- 축소 디코딩된 이미지 여부
+            return_matrix -- (ROI 이미지, orig 좌표를 ROI 좌표로 변환하는 3x3 행렬) 반환
+                             (표 테두리를 찾지 못한 경우 행렬은 None)
         """
+        ratio = 1.0
+        if self.roi_preview_size and self.roi_preview_size < max(img.shape[:2]):
+            ratio = self.roi_preview_size / max(img.shape[:2])
+            img = cv2.resize(img, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+
         # 이미지 그레이 스케일 변환
         # - 이미지 내의 색깔에 따른 노이즈를 제거
         gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
@@ -29,23 +192,26 @@ class Detection:
         gray_img_blur = cv2.GaussianBlur(gray_img, (5, 5), 1)
         # 캐니 엣지 추출법을 통해 이미지 경계선(윤곽선)을 추출
         edged_img = cv2.Canny(gray_img_blur, 50, 300, 3)
+        if ratio < 1.0 or reduced:
+            # 축소 이미지에서 끊어진 테두리 경계선 연결
+            edged_img = cv2.dilate(edged_img, EDGE_KERNEL)
 
         # 경계선 이미지에서 컨투어 추출
         all_contours = cv2.findContours(edged_img.copy(), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
         all_contours = imutils.grab_contours(all_contours)
-        # 컨투어 영역 크기 순으로 내림차순하여 표의 겉테두리 프레임 영역(면적이 가장 큰 컨투어) 추출
-        all_contours = sorted(all_contours, key=cv2.contourArea, reverse=True)[:1]
 
         try:
+            # 표의 겉테두리 프레임 영역(면적이 가장 큰 컨투어) 추출
+            frame_contour = max(all_contours, key=cv2.contourArea)
             # 컨투어 추정을 통한 표 테두리 영역 추출
             # - Douglas-Peucker 알고리즘을 이용해 컨투어 포인트를 줄임으로써 표 테두리 부분을 추정
-            perimeter = cv2.arcLength(all_contours[0], True)
-            roi_dimensions = cv2.approxPolyDP(all_contours[0], 0.05 * perimeter, True)
-            roi_dimensions = roi_dimensions.reshape(4, 2)
+            perimeter = cv2.arcLength(frame_contour, True)
+            roi_dimensions = cv2.approxPolyDP(frame_contour, 0.05 * perimeter, True)
+            roi_dimensions = roi_dimensions.reshape(4, 2) / ratio
         except Exception as ex:
             # 표의 테두리 부분(사각형 형태의 컨투어)를 추청하지 못하는 경우
             print("표 테두리를 발견하지 못했습니다.", ex)
-            return img
+            return (orig, None) if return_matrix else orig
 
         # 표 테두리의 좌표값 변환
         rect = np.zeros((4, 2), dtype="float32")
@@ -69,6 +235,12 @@ class Detection:
         height_b = np.sqrt((tr[0] - br[0]) ** 2 + (tr[1] - br[1]) ** 2)
         max_height = max(int(height_a), int(height_b))
 
+        # 원근 변환 결과를 바로 target_size 로 축소
+        if target_size and target_size < max(max_width, max_height):
+            size_ratio = target_size / max(max_width, max_height)
+            max_width = max(1, int(max_width * size_ratio))
+            max_height = max(1, int(max_height * size_ratio))
+
         # Set of destinations points for "birds eye view"
         # dimension of the new image
         dst = np.array(
@@ -81,8 +253,29 @@ class Detection:
         transform_matrix = cv2.getPerspectiveTransform(rect, dst)
 
         # ROI 영역 원근변환
-        return cv2.warpPerspective(orig, transform_matrix, (max_width, max_height))
+        roi_img = cv2.warpPerspective(orig, transform_matrix, (max_width, max_height))
+        return (roi_img, transform_matrix) if return_matrix else roi_img
+
+    def decode_flag(self, data, min_size):
+        """
+        이미지 헤더의 크기 정보로 디코딩 flag 선택
+        - 축소 후에도 가장 긴 변이 min_size 이상인 가장 큰 배율의 IMREAD_REDUCED_* 사용
 
+        Keyword arguments:
+            data -- image buffer(bytes, memoryview, mmap)
+            min_size -- 디코딩 이미지의 가장 긴 변의 최소 크기(px)
+        """
+        try:
+            # 헤더만 읽고 픽셀 데이터는 디코딩하지 않음(buffer 를 복사하지 않음)
+            longest = max(image_size(data))
+        except Exception:
+            return FULL_DECODE_FLAG
+        for factor, flag in REDUCED_DECODE_FLAGS:
+            if longest / factor >= min_size:
+                return flag
+        return FULL_DECODE_FLAG
+
+    @timed("resize_image")
     def resize_image(self, img):
         """
         이미지에서 크기 조정
@@ -92,11 +285,12 @@ class Detection:
             img -- image(.jpg/.png)
         """
         height, width, _ = img.shape
-        if 1024 < height or 1024 < width:
-            ratio = float(1024) / max(height, width)
+        if self.max_size < height or self.max_size < width:
+            ratio = float(self.max_size) / max(height, width)
             return cv2.resize(img, None, fx=ratio, fy=ratio)
         return img
 
+    @timed("remove_wm")
     def remove_wm(self, img):
         """
         이미지에서 워터마크 제거
@@ -109,14 +303,13 @@ class Detection:
         """
         # 이미지 그레이 스케일 변환
         gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # 그레이 스케일 이미지 복사
-        # - 워터마크 영역의 필요한 부분을 분리하기 위함
-        wm_img = gray_img.copy()
+        wm_img = gray_img
 
         # 형태학적 변환(morphological transformations)을 반복함으로써 워터마크 영역 판별
-        for i in range(5):
+        # - 1x1 커널(i=0)의 클로징/오프닝은 원본과 같으므로 3x3 커널부터 적용
+        for i in range(1, 5):
             # 이미지 필터링을 통한 형태학적 변환 적용
-            img_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * i + 1, 2 * i + 1))
+            img_kernel = get_kernel(cv2.MORPH_ELLIPSE, (2 * i + 1, 2 * i + 1))
             # 클로징(팽창기법 -> 침식기법 적용)을 통한 워터마크 윤곽 파악
             wm_img = cv2.morphologyEx(wm_img, cv2.MORPH_CLOSE, img_kernel)
             # 오프닝(침식기법 -> 팽창기법 적용)을 통한 노이즈 제거
@@ -130,16 +323,19 @@ class Detection:
         bw_img = cv2.threshold(dif_img, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
         dark = cv2.threshold(wm_img, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
 
-        # 이진화된 워터마크 이미지에서 어두운 부분 추출
-        dark_pix = gray_img[np.where(dark > 0)]
-
-        # 더 어두운 부분을 추출하기 위해 임계처리(thresholding) 진행
-        dark_pix = cv2.threshold(dark_pix, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+        # 이진화된 워터마크 이미지의 어두운 부분에서 더 어두운 부분을 추출하는 임계값(Otsu)
+        # - 임계값 계산에만 어두운 부분의 픽셀을 모으고, 이진화와 결합은 이미지 전체에 대한
+        #   OpenCV 연산과 mask 복사로 처리(np.where 좌표 배열, fancy indexing 생략)
+        dark_pix = gray_img[dark > 0]
+        if dark_pix.size:
+            thresh = cv2.threshold(dark_pix, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[0]
+            dark_img = cv2.threshold(gray_img, thresh, 255, cv2.THRESH_BINARY)[1]
 
-        # 이진화된 원본이미지에 워터마크 영역의 내용 추가
-        bw_img[np.where(dark > 0)] = dark_pix.T
+            # 이진화된 원본이미지에 워터마크 영역의 내용 추가
+            cv2.copyTo(dark_img, dark, bw_img)
         return bw_img
 
+    @timed("get_frame")
     def get_frame(self, img):
         """
         표 이미지에서 모든 셀의 테두리 영역 추출
@@ -147,89 +343,261 @@ class Detection:
         2. 가로선과 세로선을 결합한 이미지 생성
         3. 선으로만 이루어진 이미지에서 모든 컨투어 추출
         4. 기준 크기 이상의 모든 컨투어를 좌표(x, y, w, h) 변환
+        - template_capacity 가 설정된 경우 등록된 양식과 레이아웃이 같으면 1~4 대신 양식의 셀 좌표 사용
+        - grid_engine="projection" 인 경우 get_grid 의 셀 좌표(격자 순서) 반환
 
         Keyword arguments:
             img -- grayscale image(.jpg/.png)
+
+        Returns:
+            위에서 아래 순서로 정렬된 셀 좌표(x, y, w, h) 목록
         """
 
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # 이미지 흑백 변환(검은색 <-> 흰색)
-        inv_img = 255 - img
+        if self.grid_engine == "projection":
+            return self.get_grid(img).boxes()
+
+        # 워터마크 제거(remove_wm) 결과는 이미 단일 채널 이미지
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+        layout = None
+        if self.template_capacity:
+            registry = get_registry(self.template_capacity)
+            with timer("template_match"):
+                layout = Layout(img)
+                boxes = registry.match(layout)
+            if boxes is not None:
+                return boxes
 
         # 커널의 크기 설정(전체 이미지 너비/50)
         kernel_len = np.array(img).shape[1] // 50
+        if self.tile_size and img.shape[0] > self.tile_size:
+            vh_img = self.line_mask_tiled(img, kernel_len)
+        else:
+            vh_img = self.line_mask(img, kernel_len)
+        # 평균 이미지 명도를 기준으로 이미지 이진화(평균 이상 1, 평균 이하 0)
+        frame_img = vh_img // int(np.mean(vh_img))
+
+        # 컨투어 추출을 통해 사각형 영역 검출
+        contours, hierarchy = cv2.findContours(frame_img, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)
+
+        # 모든 컨투어 영역을 위에서 아래로 순서대로 정렬.
+        bounding_boxes = [cv2.boundingRect(c) for c in contours]
+        contours, bounding_boxes = zip(
+            *sorted(zip(contours, bounding_boxes), key=lambda b: (b[1][1], b[1][0]), reverse=False)
+        )
+        if layout is not None:
+            registry.add(layout, bounding_boxes)
+        return bounding_boxes
+
+    def line_mask(self, img, kernel_len, rows=None):
+        """
+        표 이미지의 가로선, 세로선 영역(선: 어두운 영역)
+
+        Keyword arguments:
+            img -- grayscale image
+            kernel_len -- 선으로 판단할 최소 길이(px, 전체 이미지 너비/50)
+            rows -- 결과를 계산할 행 범위(start, end), 세로선은 img 전체에서 추출 후 잘라냄
+        """
+        vertical_lines, horizontal_lines = self.line_images(img, kernel_len, rows)
+        # 정사각형 커널(2x2 사이즈) 정의
+        kernel = get_kernel(cv2.MORPH_RECT, (2, 2))
+
+        # 가로선과 세로선을 결합한 새로운 이미지 생성(가로와 세로에 같은 가중치를 부여)
+        vh_img = cv2.addWeighted(vertical_lines, 1, horizontal_lines, 1, 0.0)
+        # 커널 영역 팽창
+        return cv2.erode(~vh_img, kernel, iterations=2)
+
+    def line_images(self, img, kernel_len, rows=None):
+        """
+        표 이미지의 세로선, 가로선 이미지(선: 밝은 영역, 글자 등 kernel_len 보다 짧은 영역 제거)
+
+        Keyword arguments:
+            img -- grayscale image
+            kernel_len -- 선으로 판단할 최소 길이(px, 전체 이미지 너비/50)
+            rows -- 결과를 계산할 행 범위(start, end), 세로선은 img 전체에서 추출 후 잘라냄
+
+        Returns:
+            (vertical_lines, horizontal_lines)
+        """
+        # 이미지 흑백 변환(검은색 <-> 흰색)
+        inv_img = 255 - img
+
         # 모든 세로선을 추출하기 위해 세로 커널 정의
-        ver_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, kernel_len))
+        ver_kernel = get_kernel(cv2.MORPH_RECT, (1, kernel_len))
         # 모든 가로선을 추출하기 위해 가로 커널 정의
-        hor_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_len, 1))
-        # 정사각형 커널(2x2 사이즈) 정의
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+        hor_kernel = get_kernel(cv2.MORPH_RECT, (kernel_len, 1))
 
         # 오프닝을 반복해 노이즈가 제거된 세로선 추출
         vertical_lines = cv2.morphologyEx(inv_img, cv2.MORPH_OPEN, ver_kernel, iterations=3)
+        if rows is not None:
+            # 가로선 추출은 위아래 행을 참조하지 않으므로 필요한 행만 처리
+            vertical_lines = vertical_lines[rows[0]:rows[1]]
+            inv_img = inv_img[rows[0]:rows[1]]
 
         # 오프닝을 반복해 노이즈가 제거된 가로선 추출
         horizontal_lines = cv2.morphologyEx(inv_img, cv2.MORPH_OPEN, hor_kernel, iterations=3)
+        return vertical_lines, horizontal_lines
 
-        # 가로선과 세로선을 결합한 새로운 이미지 생성(가로와 세로에 같은 가중치를 부여)
-        vh_img = cv2.addWeighted(vertical_lines, 1, horizontal_lines, 1, 0.0)
-        # 커널 영역 팽창
-        vh_img = cv2.erode(~vh_img, kernel, iterations=2)
-        # 평균 이미지 명도를 기준으로 이미지 이진화(평균 이상 1, 평균 이하 0)
-        frame_img = vh_img // int(np.mean(vh_img))
+    @timed("get_grid")
+    def get_grid(self, img):
+        """
+        표 이미지에서 행 x 열 격자와 셀(병합 셀 포함) 추출(grid_engine="projection")
+        1. 표의 모든 가로선, 세로선 추출(get_frame 과 같은 방식)
+        2. 선 이미지의 행/열별 투영 프로파일에서 행, 열 구분선 검출
+        3. 인접한 격자 칸 사이에 구분선이 없는 칸들을 병합 셀로 묶음
+        - 컨투어를 추적하지 않으므로 셀이 많은 표에서 get_frame 보다 빠르고,
+          셀 좌표 대신 (행, 열, 병합 크기)가 있는 격자를 반환
+        - 양식(template) 재사용, 타일 분할은 사용하지 않음
 
-        # 컨투어 추출을 통해 사각형 영역 검출
-        contours, hierarchy = cv2.findContours(frame_img, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)
+        Keyword arguments:
+            img -- grayscale image(.jpg/.png)
 
-        # 모든 컨투어 영역을 위에서 아래로 순서대로 정렬.
-        bounding_boxes = [cv2.boundingRect(c) for c in contours]
-        contours, bounding_boxes = zip(
-            *sorted(zip(contours, bounding_boxes), key=lambda b: (b[1][1], b[1][0]), reverse=False)
+        Returns:
+            Grid
+        """
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        kernel_len = img.shape[1] // 50
+        vertical_lines, horizontal_lines = self.line_images(img, kernel_len)
+        # 선 영역 이진화(0/1), 임계값은 배경과 선을 나누는 Otsu 임계값(4x4 간격 표본으로 계산)
+        sample = cv2.max(vertical_lines[::4, ::4], horizontal_lines[::4, ::4])
+        thresh = cv2.threshold(sample, 0, 1, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[0]
+        return Grid(
+            cv2.threshold(vertical_lines, thresh, 1, cv2.THRESH_BINARY)[1],
+            cv2.threshold(horizontal_lines, thresh, 1, cv2.THRESH_BINARY)[1],
+            kernel_len,
         )
-        self.bounding_boxes = {"boxes": bounding_boxes}
 
-    def draw_frame(self, img):
-        boxes = self.bounding_boxes.get("boxes")
+    def line_mask_tiled(self, img, kernel_len):
+        """
+        line_mask 를 tile_size 높이의 가로 띠(strip)로 나눠 스레드 풀에서 처리한 후 합침
+        - 세로선은 위아래로 halo 만큼 겹치게 잘라서 추출하고 겹치는 부분을 버림
+          (세로 오프닝(침식 3회 + 팽창 3회)이 참조하는 범위는 위아래 3 * kernel_len 이내)
+        - 가로선은 위아래 행을 참조하지 않고, 2x2 침식 2회는 위쪽 2행만 참조하므로
+          띠 위쪽 2행만 더해서 처리
+        - 따라서 결과는 나누지 않은 경우와 같고, 띠를 합친 후 컨투어는 한 번만 추출하므로
+          띠 경계를 지나는 셀도 하나의 셀로 검출
+        """
+        height = img.shape[0]
+        halo = 3 * kernel_len + 2
+        vh_img = np.empty_like(img)
+
+        def work(top):
+            bottom = min(top + self.tile_size, height)
+            inner = max(0, top - 2)
+            start, end = max(0, inner - halo), min(height, bottom + halo)
+            strip = self.line_mask(img[start:end], kernel_len, rows=(inner - start, bottom - start))
+            vh_img[top:bottom] = strip[top - inner:]
+
+        executor = get_tile_executor(self.tile_threads)
+        for future in [executor.submit(work, top) for top in range(0, height, self.tile_size)]:
+            future.result()
+        return vh_img
+
+    @timed("draw_frame")
+    def draw_frame(self, img, boxes):
+        """
+        이미지에 셀 테두리를 그린 결과 이미지(encoded bytes) 생성
+        - img 에 직접 그리므로 원본이 필요한 경우 복사본 전달
+
+        Keyword arguments:
+            img -- image(.jpg/.png)
+            boxes -- 셀 좌표(x, y, w, h) 목록
+        """
         for x, y, w, h in boxes:
-            if w > 30 or h > 30:
+            if w > MIN_BOX_SIZE or h > MIN_BOX_SIZE:
                 box = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], np.int32)
                 cv2.polylines(img, [box], True, (0, 255, 0), 2)
         # for box in boxes:
         #     img = cv2.polylines(
         #         img, np.array(box, np.int32).reshape((-1, 1, 2)), True, (0, 255, 0), 2
         #     )
-        return cv2.imencode(".jpg", img)[1].tostring()
+        return self.encoder.encode(img)
 
-    def detect(self, img_path, crop=True, watermark=False):
+    def detect(self, img_path, crop=True, watermark=False, keep_roi=False):
+        """
+        표 이미지에서 ROI 영역 분리, 워터마크 제거, 셀 테두리 영역 추출
 
+        Keyword arguments:
+            img_path -- image file object, buffer(bytes, memoryview, mmap)
+                        or decoded image(BGR ndarray, e.g. PDF/TIFF page)
+            crop -- ROI 영역 분리 여부
+            watermark -- 워터마크 제거 여부
+            keep_roi -- 해상도 축소 전 ROI 영역 이미지(roi_img) 보관 여부
+
+        Returns:
+            DetectionResult
+        """
         # 이미지 불러오기
-        orig = cv2.imdecode(np.fromstring(img_path.read(), np.uint8), cv2.IMREAD_UNCHANGED)
-        img = orig.copy()
+        flag = FULL_DECODE_FLAG
+        if isinstance(img_path, np.ndarray):
+            orig = img_path
+        else:
+            data = img_path.read() if hasattr(img_path, "read") else img_path
+            if self.reduced_decode and not keep_roi:
+                flag = self.decode_flag(data, self.max_size * (self.crop_headroom if crop else 1))
+            with timer("decode"):
+                orig = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+            if orig is None:
+                # 헤더는 인식되지만 OpenCV 가 디코딩하지 못하는 형식(GIF, ICO 등)
+                raise UploadError("이미지를 디코딩할 수 없습니다.")
+        # crop_roi, resize_image 는 새 이미지를 반환하고 원본(orig)을 수정하지 않으므로 복사하지 않음
+        img = orig
+        # 업로드 이미지 좌표 -> 결과 이미지(original_img) 좌표 변환 행렬(축소 디코딩 -> ROI -> 축소)
+        factor = {reduced: factor for factor, reduced in REDUCED_DECODE_FLAGS}.get(flag, 1)
+        transform = np.diag([1 / factor, 1 / factor, 1.0])
 
         if crop:
             # 이미지에서 ROI 영역 분리
-            img = self.crop_roi(img, orig)
-
+            # - 축소 이미지에서 ROI 를 찾는 경우 원근 변환과 크기 축소를 한 번에 수행
+            target_size = self.max_size if self.roi_preview_size and not keep_roi else None
+            img, matrix = self.crop_roi(
+                img,
+                orig,
+                target_size=target_size,
+                reduced=flag != FULL_DECODE_FLAG,
+                return_matrix=True,
+            )
+            if matrix is not None:
+                transform = matrix @ transform
+
+        roi_img = img
         # 이미지 해상도 축소 (image => 1024px)
         img = self.resize_image(img)
+        scale = img.shape[1] / roi_img.shape[1]
+        transform = np.diag([scale, img.shape[0] / roi_img.shape[0], 1.0]) @ transform
+        if keep_roi:
+            # 축소되지 않은 경우 draw_frame 에서 그려지는 테두리가 남지 않도록 복사
+            roi_img = roi_img.copy() if roi_img is img and self.render_result else roi_img
+        else:
+            roi_img = None
 
-        self.original_img = cv2.imencode(".jpg", img)[1].tostring()
+        with timer("encode"):
+            original_img = self.encoder.encode(img)
 
+        frame_input = img
         if watermark:
             # 워터마크 삭제
-            img_wm = self.remove_wm(img)
+            frame_input = self.remove_wm(img)
 
-            # 이미지에서 표 프레임 영역 및 좌표값(x, y, w, h) 추출
-            self.get_frame(img_wm)
+        # 이미지에서 표 프레임 영역 및 좌표값(x, y, w, h) 추출
+        if self.grid_engine == "projection":
+            grid = self.get_grid(frame_input)
+            boxes = grid.boxes()
+            bounding_boxes = {"boxes": boxes, "grid": grid.to_data()}
         else:
-            self.get_frame(img)
-
-        self.result_img = self.draw_frame(img)
-
-        result = {
-            "original_img": SimpleUploadedFile("original_img.png", self.original_img),
-            "result_img": SimpleUploadedFile("result_img.png", self.result_img),
-            "bounding_boxes": self.bounding_boxes,
-        }
-        return result
+            # 글자, 잡음 등 작은 컨투어는 결과 이미지, OCR 에서 사용하지 않으므로 저장하지 않음
+            boxes = filter_boxes(self.get_frame(frame_input))
+            bounding_boxes = {"boxes": boxes}
+        # 업로드 이미지 기준 OCR 결과를 셀에 대응시킬 때 사용
+        bounding_boxes["transform"] = transform.ravel().tolist()
+
+        result_img = None
+        if self.render_result:
+            # 입력 이미지(ndarray)를 그대로 사용한 경우(분리, 축소 없음) 호출자의 이미지에 그리지 않도록 복사
+            result_img = self.draw_frame(img.copy() if img is img_path else img, boxes)
+        return DetectionResult(
+            original_img, result_img, bounding_boxes, roi_img, scale, self.encoder.ext
+        )
 
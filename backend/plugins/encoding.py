@@ -0,0 +1,53 @@
+import cv2
+
+# 저장 형식별 (확장자, content type)
+FORMATS = {
+    "jpeg": (".jpg", "image/jpeg"),
+    "webp": (".webp", "image/webp"),
+    "png": (".png", "image/png"),
+}
+
+
+class ImageEncoder:
+    """
+    Detection 결과 이미지(original_img, result_img) 인코더
+    - 형식, 압축 옵션을 생성 시 한 번만 계산하고 모든 요청, 스레드에서 공유
+
+    Keyword arguments:
+        image_format -- 저장 형식("jpeg", "webp", "png")
+        quality -- JPEG/WebP 품질(1~100)
+        png_compression -- PNG 압축 레벨(0~9, 높을수록 작고 느림)
+        lossless -- 무손실 저장(jpeg, png: PNG, webp: lossless WebP)
+    """
+
+    def __init__(self, image_format="jpeg", quality=95, png_compression=3, lossless=False):
+        if image_format not in FORMATS:
+            raise ValueError("지원하지 않는 이미지 형식: {}".format(image_format))
+        if lossless and image_format == "jpeg":
+            image_format = "png"
+        self.format = image_format
+        self.ext, self.content_type = FORMATS[image_format]
+
+        if image_format == "jpeg":
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        elif image_format == "webp":
+            # OpenCV 는 품질 100 초과를 lossless WebP 로 처리
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, 101 if lossless else quality]
+        else:
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+
+    def encode(self, img):
+        """
+        이미지 인코딩
+
+        Returns:
+            image bytes
+        """
+        ok, buf = cv2.imencode(self.ext, img, self.params)
+        if not ok:
+            raise ValueError("이미지 인코딩 실패({})".format(self.format))
+        # ndarray -> bytes 복사는 여기서 한 번만 수행(ContentFile 은 bytes 를 복사하지 않고 참조)
+        return buf.tobytes()
+
+    def filename(self, name):
+        return name + self.ext
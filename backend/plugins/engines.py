@@ -1,29 +1,476 @@
-import requests
+import asyncio
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import json
+import os
+import queue
+import threading
 import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from plugins.ingest import BufferReader
+from plugins.timing import timed, timer
+
+# 재시도 대상 응답 코드(요청 제한, 서버 오류)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 재시도 대상 연결 오류(requests.ConnectionError 에 대응)
+ASYNC_RETRY_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.ReadError,
+    httpx.RemoteProtocolError,
+)
+
+
+def retry_delay(attempt, response=None, backoff=0.5, max_delay=10):
+    """
+    재시도 전 대기 시간(seconds)
+    - 응답의 Retry-After(seconds) 우선 적용, 없으면 backoff * 2^attempt
+    - 어느 경우든 max_delay 이하(Retry-After 가 커도 요청 스레드를 오래 막지 않음)
+
+    Keyword arguments:
+        attempt -- 재시도 횟수(0~)
+        response -- 재시도 대상 응답(requests.Response, httpx.Response, 연결 실패: None)
+    """
+    delay = backoff * 2 ** attempt
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = int(retry_after)
+    return min(delay, max_delay)
+
+
+class LatencyStats:
+    """
+    OCR 엔진 호출 지연 시간 통계
+    - 최근 max_samples 개의 호출 시간(seconds)으로 백분위수 계산
+    """
+
+    def __init__(self, max_samples=1000):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, error=False):
+        with self._lock:
+            self.samples.append(elapsed)
+            self.count += 1
+            if error:
+                self.errors += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = sorted(self.samples)
+            result = {"count": self.count, "errors": self.errors, "retries": self.retries}
+        if not samples:
+            return result
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+        result.update(
+            mean=sum(samples) / len(samples),
+            p50=percentile(50),
+            p95=percentile(95),
+            p99=percentile(99),
+            max=samples[-1],
+        )
+        return result
+
+
+def build_request(images, SECRET_KEY):
+    """
+    OCR 엔진(CLOVA OCR V2) 요청 생성
+    - V2 메시지의 images 배열에 이미지별 이름을 붙임(여러 이미지는 순번을 붙여 구분)
+
+    Keyword arguments:
+        images -- (data, filename, content_type) 목록
+        SECRET_KEY -- OCR engine secret key
+
+    Returns:
+        (이미지 이름 목록, headers, payload, files)
+    """
+    timestamp = time.time()
+    requestId = f'{images[0][2].split("/")[0]}_{timestamp}'
+    # 요청 안에서 이미지 이름이 겹치지 않도록 순번을 붙임
+    names = [
+        name if len(images) == 1 else f"{index}_{name}"
+        for index, name in enumerate(os.path.splitext(image[1])[0] for image in images)
+    ]
+
+    message = {
+        "requestId": requestId,
+        "version": "V2",
+        "images": [{
+            "name": name,
+            "format": content_type.split("/")[1]
+        } for name, (_, _, content_type) in zip(names, images)],
+        "timestamp": str(timestamp)
+    }
+
+    payload = {"message": json.dumps(message)}
+
+    # multipart boundary 는 HTTP 클라이언트가 Content-Type 에 설정
+    headers = {"X-OCR-SECRET": SECRET_KEY}
+
+    files = [
+        ("file", (filename, data, content_type)) for data, filename, content_type in images
+    ]
+    return names, headers, payload, files
+
+
+def match_fields(body, names):
+    """ OCR 엔진 응답(json)에서 이미지 이름 순서대로 fields 추출 """
+    results = body.get("images") or []
+    by_name = {result.get("name"): result for result in results}
+    fields = []
+    for index, name in enumerate(names):
+        result = by_name.get(name) or (results[index] if index < len(results) else None)
+        fields.append(result.get("fields") if result else None)
+    return fields
+
+
+class OCRClient:
+    """
+    OCR 엔진(CLOVA OCR V2) 클라이언트
+    - keep-alive 연결 재사용(connection pool)
+    - connect/read timeout 설정
+    - 429/5xx 응답, 연결 실패 시 지수 백오프로 재시도
+    - 동시에 전송 중인 요청 수 제한(semaphore)
+
+    Keyword arguments:
+        timeout -- (connect, read) timeout(seconds)
+        retries -- 최대 재시도 횟수
+        backoff -- 재시도 대기 시간 기준값(seconds), backoff * 2^n 만큼 대기
+        max_delay -- 최대 재시도 대기 시간(seconds, Retry-After 포함)
+        max_in_flight -- 동시에 전송할 수 있는 요청 수
+        pool_size -- 호스트별 keep-alive 연결 수
+    """
+
+    def __init__(
+        self,
+        timeout=(3.05, 30),
+        retries=3,
+        backoff=0.5,
+        max_delay=10,
+        max_in_flight=8,
+        pool_size=10,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.semaphore = threading.BoundedSemaphore(max_in_flight)
+        self.stats = LatencyStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def recognize(self, data, filename, content_type, URL, SECRET_KEY):
+        """
+        이미지 문자 인식 요청
+
+        Keyword arguments:
+            data -- image bytes or buffer(memoryview, mmap)
+            filename -- image file name
+            content_type -- image mime type(e.g. image/jpeg)
+            URL -- OCR engine url
+            SECRET_KEY -- OCR engine secret key
+
+        Returns:
+            인식된 fields 목록
+        """
+        return self.recognize_many([(data, filename, content_type)], URL, SECRET_KEY)[0]
+
+    def recognize_many(self, images, URL, SECRET_KEY):
+        """
+        여러 이미지를 한 번의 요청으로 문자 인식
+        - V2 메시지의 images 배열에 이미지별 이름을 붙여 전송하고, 응답을 이름으로 매칭
+
+        Keyword arguments:
+            images -- (data, filename, content_type) 목록
+            URL -- OCR engine url
+            SECRET_KEY -- OCR engine secret key
+
+        Returns:
+            images 순서대로 인식된 fields 목록
+        """
+        names, headers, payload, files = build_request(images, SECRET_KEY)
+        response = self.post(URL, headers, payload, files)
+        return match_fields(response.json(), names)
+
+    def post(self, URL, headers, payload, files):
+        """ 재시도, 동시 요청 수 제한, 지연 시간 기록을 적용한 POST 요청 """
+        started = time.perf_counter()
+        try:
+            for attempt in range(self.retries + 1):
+                response, error = None, None
+                with self.semaphore:
+                    try:
+                        response = self.session.post(
+                            URL, headers=headers, data=payload, files=files, timeout=self.timeout
+                        )
+                    except requests.ConnectionError as ex:
+                        error = ex
+
+                if error is None and response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    self.stats.record(time.perf_counter() - started)
+                    return response
+                if attempt == self.retries:
+                    if error is not None:
+                        raise error
+                    response.raise_for_status()
+
+                self.stats.record_retry()
+                time.sleep(retry_delay(attempt, response, self.backoff, self.max_delay))
+        except Exception:
+            self.stats.record(time.perf_counter() - started, error=True)
+            raise
+
+
+class AsyncOCRClient:
+    """
+    OCR 엔진 async 클라이언트(ASGI 의 async view 에서 사용)
+    - OCRClient 와 같은 재시도, 동시 요청 수 제한을 적용하고 응답을 기다리는 동안 event loop 를 막지 않음
+    - httpx 연결과 semaphore 는 event loop 에 묶이므로 event loop 별로 생성(get_async_client)
+
+    Keyword arguments:
+        timeout -- (connect, read) timeout(seconds)
+        retries -- 최대 재시도 횟수
+        backoff -- 재시도 대기 시간 기준값(seconds), backoff * 2^n 만큼 대기
+        max_delay -- 최대 재시도 대기 시간(seconds, Retry-After 포함)
+        max_in_flight -- 동시에 전송할 수 있는 요청 수
+        pool_size -- keep-alive 연결 수
+    """
+
+    def __init__(
+        self,
+        timeout=(3.05, 30),
+        retries=3,
+        backoff=0.5,
+        max_delay=10,
+        max_in_flight=64,
+        pool_size=64,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.stats = LatencyStats()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+            limits=httpx.Limits(
+                max_connections=max_in_flight, max_keepalive_connections=pool_size
+            ),
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def recognize(self, data, filename, content_type, URL, SECRET_KEY):
+        """ OCRClient.recognize 의 async 버전 """
+        return (await self.recognize_many([(data, filename, content_type)], URL, SECRET_KEY))[0]
+
+    async def recognize_many(self, images, URL, SECRET_KEY):
+        """ OCRClient.recognize_many 의 async 버전 """
+        # httpx 는 bytes 가 아닌 buffer(memoryview, mmap)를 file object 로 받아 나눠서 전송
+        images = [
+            (data if isinstance(data, bytes) else BufferReader(data), filename, content_type)
+            for data, filename, content_type in images
+        ]
+        names, headers, payload, files = build_request(images, SECRET_KEY)
+        response = await self.post(URL, headers, payload, files)
+        return match_fields(response.json(), names)
+
+    async def post(self, URL, headers, payload, files):
+        """ 재시도, 동시 요청 수 제한, 지연 시간 기록을 적용한 POST 요청 """
+        started = time.perf_counter()
+        try:
+            for attempt in range(self.retries + 1):
+                response, error = None, None
+                async with self.semaphore:
+                    try:
+                        response = await self.client.post(
+                            URL, headers=headers, data=payload, files=files
+                        )
+                    except ASYNC_RETRY_ERRORS as ex:
+                        error = ex
+
+                if error is None and response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    self.stats.record(time.perf_counter() - started)
+                    return response
+                if attempt == self.retries:
+                    if error is not None:
+                        raise error
+                    response.raise_for_status()
+
+                self.stats.record_retry()
+                await asyncio.sleep(retry_delay(attempt, response, self.backoff, self.max_delay))
+        except Exception:
+            self.stats.record(time.perf_counter() - started, error=True)
+            raise
+
+
+class MicroBatcher:
+    """
+    동시에 들어온 문자 인식 요청을 모아서 한 번의 엔진 호출로 전송
+    - 첫 요청 후 window 초 동안, 또는 max_batch 개가 모일 때까지 대기
+    - 같은 엔진(URL, SECRET_KEY)으로 가는 요청끼리 묶어 recognize_many 호출
+    - 결과 fields 는 요청별 Future 로 전달
+
+    Keyword arguments:
+        client -- OCRClient
+        window -- 요청을 모으는 시간(seconds)
+        max_batch -- 한 번에 전송할 최대 이미지 수
+        max_workers -- 동시에 전송할 수 있는 batch 수
+    """
+
+    def __init__(self, client, window=0.02, max_batch=8, max_workers=8):
+        self.client = client
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-batch")
+        self.queue = queue.Queue()
+        self.collector = threading.Thread(target=self.collect, daemon=True, name="ocr-batcher")
+        self.collector.start()
+
+    def submit(self, data, filename, content_type, URL, SECRET_KEY):
+        future = Future()
+        self.queue.put(((data, filename, content_type), URL, SECRET_KEY, future))
+        return future
+
+    def recognize(self, data, filename, content_type, URL, SECRET_KEY):
+        return self.submit(data, filename, content_type, URL, SECRET_KEY).result()
+
+    def close(self):
+        self.queue.put(None)
+        self.collector.join()
+        self.executor.shutdown()
+
+    def collect(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    # close() 호출, 모은 요청을 전송한 뒤 종료
+                    self.queue.put(None)
+                    break
+                batch.append(item)
+
+            groups = {}
+            for item in batch:
+                groups.setdefault((item[1], item[2]), []).append(item)
+            for (URL, SECRET_KEY), items in groups.items():
+                self.executor.submit(self.dispatch, items, URL, SECRET_KEY)
+
+    def dispatch(self, items, URL, SECRET_KEY):
+        try:
+            results = self.client.recognize_many([item[0] for item in items], URL, SECRET_KEY)
+        except Exception as ex:
+            for item in items:
+                item[3].set_exception(ex)
+            return
+        for item, fields in zip(items, results):
+            item[3].set_result(fields)
+
+
+_client = None
+_batcher = None
+_client_lock = threading.Lock()
+# event loop 별 AsyncOCRClient
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """ settings 의 OCR_* 설정으로 생성한 공용 OCRClient """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OCRClient(
+                timeout=settings.OCR_TIMEOUT,
+                retries=settings.OCR_RETRIES,
+                backoff=settings.OCR_BACKOFF,
+                max_delay=settings.OCR_MAX_RETRY_DELAY,
+                max_in_flight=settings.OCR_MAX_IN_FLIGHT,
+                pool_size=settings.OCR_POOL_SIZE,
+            )
+        return _client
+
 
+def get_batcher():
+    """ OCR_BATCH_WINDOW 가 0보다 큰 경우 사용하는 공용 MicroBatcher """
+    global _batcher
+    client = get_client()
+    with _client_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(
+                client,
+                window=settings.OCR_BATCH_WINDOW,
+                max_batch=settings.OCR_BATCH_SIZE,
+                max_workers=settings.OCR_MAX_IN_FLIGHT,
+            )
+        return _batcher
 
-def send(file, URL, SECRET_KEY):
-	name = file.name.split(".")[0]
-	timestamp = time.time()
-	requestId = f'{file.content_type.split("/")[0]}_{timestamp}'
 
-	message = {
-		"requestId": requestId,
-		"version": "V2",
-		"images": [{
-			"name": name,
-			"format": file.content_type.split("/")[1]
-		}],
-		"timestamp": str(timestamp)
-	}
+@timed("ocr")
+def send(data, filename, content_type, URL, SECRET_KEY):
+    if settings.OCR_BATCH_WINDOW > 0:
+        return get_batcher().recognize(data, filename, content_type, URL, SECRET_KEY)
+    return get_client().recognize(data, filename, content_type, URL, SECRET_KEY)
 
-    payload = {"message": str(message)}
 
-    headers = {"Content-Type": "multipart/form-data", "X-OCR-SECRET": SECRET_KEY}
+def get_async_client():
+    """ 현재 event loop 에서 사용하는 공용 AsyncOCRClient """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncOCRClient(
+            timeout=settings.OCR_TIMEOUT,
+            retries=settings.OCR_RETRIES,
+            backoff=settings.OCR_BACKOFF,
+            max_delay=settings.OCR_MAX_RETRY_DELAY,
+            max_in_flight=settings.OCR_ASYNC_MAX_IN_FLIGHT,
+            pool_size=settings.OCR_ASYNC_MAX_IN_FLIGHT,
+        )
+    return client
 
-    response = requests.request("POST", URL, headers=headers, data=payload, files=[file])
 
-    image = response.json().get("image")
-    if image:
-        return image.values[0].get("fields")
-    return None
+async def asend(data, filename, content_type, URL, SECRET_KEY):
+    """
+    send 의 async 버전
+    - OCR_BATCH_WINDOW 가 0보다 큰 경우 MicroBatcher 의 결과(Future)를 event loop 에서 대기
+    """
+    with timer("ocr"):
+        if settings.OCR_BATCH_WINDOW > 0:
+            future = get_batcher().submit(data, filename, content_type, URL, SECRET_KEY)
+            return await asyncio.wrap_future(future)
+        return await get_async_client().recognize(data, filename, content_type, URL, SECRET_KEY)
@@ -0,0 +1,151 @@
+import cv2
+import numpy as np
+
+# 셀 정보(cells) 구조화 배열 형식: 격자 위치, 병합 크기, 셀 내부 좌표(x, y, w, h)
+CELL_DTYPE = np.dtype(
+    [
+        ("row", np.int32),
+        ("col", np.int32),
+        ("rowspan", np.int32),
+        ("colspan", np.int32),
+        ("x", np.int32),
+        ("y", np.int32),
+        ("w", np.int32),
+        ("h", np.int32),
+    ]
+)
+
+# 인접한 두 셀 사이 구간에서 선이 차지해야 하는 최소 비율(미만이면 병합 셀)
+BORDER_RATIO = 0.5
+
+
+def line_runs(count, min_count):
+    """
+    투영 프로파일에서 선(separator)으로 판단되는 연속 구간
+    - 가로선/세로선 추출(오프닝)에서 kernel_len 보다 짧은 선분은 지워지므로
+      선 픽셀이 min_count 이상인 행(열)을 선으로 판단하고, 연속된 행(열)은 하나의 선으로 묶음
+
+    Keyword arguments:
+        count -- 행(열)별 선 픽셀 수
+        min_count -- 선으로 판단할 최소 선 픽셀 수
+
+    Returns:
+        선 구간의 (시작, 끝) 배열(shape: (n, 2), 끝 포함)
+    """
+    on = np.concatenate(([0], (count >= min_count).view(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(on))
+    return np.column_stack((edges[::2], edges[1::2] - 1))
+
+
+def border_ratio(lines, runs, bands, axis):
+    """
+    안쪽 선 구간(runs)별로 두 선 사이 구간(bands)을 지나는 선 픽셀의 비율
+    - 선 구간의 행(열)을 하나로 합친 후(logical_or.reduceat) 구간별 합계(add.reduceat)로 계산
+    - runs, bands 는 이미지 안쪽 구간이므로 reduceat 의 끝 index 는 항상 이미지 크기보다 작음
+
+    Keyword arguments:
+        lines -- 선 영역 이미지(bool, 세로선: axis=1, 가로선: axis=0)
+        runs -- 선 구간(시작, 끝) 배열(axis 방향)
+        bands -- 선 사이 구간(시작, 끝) 배열(다른 방향)
+        axis -- runs 방향(1: 세로선의 열, 0: 가로선의 행)
+
+    Returns:
+        비율 배열(axis=1: (len(bands), len(runs)), axis=0: (len(runs), len(bands)))
+    """
+    other = 1 - axis
+    if not len(runs):
+        shape = [0, 0]
+        shape[other] = len(bands)
+        return np.zeros(shape)
+    merged = np.logical_or.reduceat(lines, (runs + [0, 1]).ravel(), axis)
+    merged = merged.take(np.arange(0, merged.shape[axis], 2), axis)
+    sums = np.add.reduceat(merged, (bands + [0, 1]).ravel(), other, dtype=np.int32)
+    sums = sums.take(np.arange(0, sums.shape[other], 2), other)
+    length = bands[:, 1] - bands[:, 0] + 1
+    return sums / (length[:, None] if other == 0 else length)
+
+
+class Grid:
+    """
+    표의 행 x 열 격자와 셀(병합 셀 포함)
+    - 세로선/가로선 이미지의 투영 프로파일(projection profile)에서 열/행 구분선을 찾고,
+      인접한 격자 칸 사이에 선이 없으면 하나의 셀로 병합
+
+    Keyword arguments:
+        vertical_lines -- 세로선 영역 이미지(bool 또는 0/1 uint8)
+        horizontal_lines -- 가로선 영역 이미지(bool 또는 0/1 uint8)
+        min_length -- 선으로 판단할 최소 길이(px)
+
+    Attributes:
+        col_lines, row_lines -- 열/행 구분선 구간(시작, 끝) 배열
+        labels -- (행 수, 열 수) 배열, 격자 칸마다 해당하는 셀의 index(cells)
+        cells -- 위에서 아래, 왼쪽에서 오른쪽 순서의 셀 정보(CELL_DTYPE 구조화 배열)
+    """
+
+    def __init__(self, vertical_lines, horizontal_lines, min_length):
+        vertical = vertical_lines.view(bool)
+        horizontal = horizontal_lines.view(bool)
+        self.col_lines = line_runs(vertical_lines.sum(axis=0, dtype=np.int32), min_length)
+        self.row_lines = line_runs(horizontal_lines.sum(axis=1, dtype=np.int32), min_length)
+
+        rows, cols = len(self.row_lines) - 1, len(self.col_lines) - 1
+        if rows < 1 or cols < 1:
+            self.labels = np.zeros((max(rows, 0), max(cols, 0)), np.int32)
+            self.cells = np.zeros(0, CELL_DTYPE)
+            return
+
+        # 선 사이 구간(셀 내부)
+        col_bands = np.column_stack((self.col_lines[:-1, 1] + 1, self.col_lines[1:, 0] - 1))
+        row_bands = np.column_stack((self.row_lines[:-1, 1] + 1, self.row_lines[1:, 0] - 1))
+
+        # 안쪽 구분선이 격자 칸 사이를 지나는지 확인((rows, cols - 1), (rows - 1, cols))
+        ver_border = border_ratio(vertical, self.col_lines[1:-1], row_bands, 1) >= BORDER_RATIO
+        hor_border = border_ratio(horizontal, self.row_lines[1:-1], col_bands, 0) >= BORDER_RATIO
+
+        # 격자 칸(짝수 위치)과 칸 사이(홀수 위치)로 이루어진 이미지에서 연결 요소로 병합 셀 검출
+        # - 선이 없는 칸 사이를 연결하고, 연결 요소의 외접 사각형을 병합 셀로 사용
+        links = np.zeros((2 * rows - 1, 2 * cols - 1), np.uint8)
+        links[::2, ::2] = 1
+        links[::2, 1::2] = ~ver_border
+        links[1::2, ::2] = ~hor_border
+        count, components, stats, _ = cv2.connectedComponentsWithStats(links, connectivity=4)
+        stats = stats[1:]
+        row, col = stats[:, cv2.CC_STAT_TOP] // 2, stats[:, cv2.CC_STAT_LEFT] // 2
+        rowspan = stats[:, cv2.CC_STAT_HEIGHT] // 2 + 1
+        colspan = stats[:, cv2.CC_STAT_WIDTH] // 2 + 1
+
+        # 셀 순서(위 -> 아래, 왼쪽 -> 오른쪽)로 정렬하고 격자 칸에 셀 index 표시
+        order = np.lexsort((col, row))
+        index = np.empty(count, np.int32)
+        index[0] = -1
+        index[1 + order] = np.arange(len(order), dtype=np.int32)
+        self.labels = index[components[::2, ::2]]
+
+        cells = np.zeros(len(order), CELL_DTYPE)
+        cells["row"], cells["col"] = row[order], col[order]
+        cells["rowspan"], cells["colspan"] = rowspan[order], colspan[order]
+        cells["x"] = col_bands[cells["col"], 0]
+        cells["y"] = row_bands[cells["row"], 0]
+        cells["w"] = col_bands[cells["col"] + cells["colspan"] - 1, 1] - cells["x"] + 1
+        cells["h"] = row_bands[cells["row"] + cells["rowspan"] - 1, 1] - cells["y"] + 1
+        self.cells = cells
+
+    @property
+    def shape(self):
+        """ (행 수, 열 수) """
+        return self.labels.shape
+
+    def boxes(self):
+        """ 셀 좌표(x, y, w, h) 목록(get_frame 결과와 같은 형식) """
+        return [tuple(box) for box in self.cells[["x", "y", "w", "h"]].tolist()]
+
+    def to_data(self):
+        """
+        bounding_boxes 에 저장할 격자 정보
+        - cells 는 boxes() 와 같은 순서의 (row, col, rowspan, colspan) 목록
+        """
+        return {
+            "rows": self.shape[0],
+            "cols": self.shape[1],
+            "cells": self.cells[["row", "col", "rowspan", "colspan"]].tolist(),
+        }
@@ -0,0 +1,168 @@
+from contextlib import contextmanager
+import io
+import mmap
+import os
+import warnings
+
+from django.conf import settings
+from PIL import Image as PILImage
+
+
+class UploadError(ValueError):
+    """ 처리할 수 없는 업로드 이미지(빈 파일, 인식할 수 없는 형식) """
+
+
+class UploadTooLarge(UploadError):
+    """ 크기(bytes) 또는 픽셀 수 제한을 넘는 업로드 이미지 """
+
+
+class BufferReader(io.RawIOBase):
+    """
+    buffer(bytes, memoryview, mmap)를 복사하지 않고 읽는 읽기 전용 file object
+    - io.BytesIO 는 bytes 가 아닌 buffer 를 전체 복사하므로 헤더만 읽거나 나눠서 전송할 때 사용
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer).cast("B")
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        size = max(0, min(len(b), len(self.buffer) - self.position))
+        b[:size] = self.buffer[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.buffer)}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+def image_size(data):
+    """
+    이미지 헤더의 (width, height)(픽셀 데이터는 디코딩하지 않음)
+
+    Keyword arguments:
+        data -- image buffer(bytes, memoryview, mmap)
+
+    Returns:
+        (width, height), 인식할 수 없는 형식이면 None
+        (PIL 제한(MAX_IMAGE_PIXELS 의 2배)을 넘는 경우 PILImage.DecompressionBombError)
+    """
+    stream = io.BytesIO(data) if isinstance(data, bytes) else BufferReader(data)
+    try:
+        with warnings.catch_warnings():
+            # 픽셀 수 제한은 check_image 에서 확인
+            warnings.simplefilter("ignore", PILImage.DecompressionBombWarning)
+            return PILImage.open(stream).size
+    except PILImage.DecompressionBombError:
+        raise
+    except Exception:
+        return None
+
+
+def check_bytes(size, max_bytes=None):
+    """ 업로드 파일 크기 확인(max_bytes 기본값: settings.UPLOAD_MAX_BYTES) """
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    if not size:
+        raise UploadError("빈 파일입니다.")
+    if size > max_bytes:
+        raise UploadTooLarge(
+            "파일 크기({} bytes)가 최대 크기({} bytes)를 넘습니다.".format(size, max_bytes)
+        )
+
+
+def check_image(data, max_bytes=None, max_pixels=None):
+    """
+    디코딩 전 업로드 이미지의 크기, 픽셀 수 확인
+    - 압축률이 높은 이미지(decompression bomb)는 파일이 작아도 디코딩 시 메모리를 많이 사용하므로
+      헤더의 width * height 로 제한
+
+    Keyword arguments:
+        data -- image buffer(bytes, memoryview, mmap)
+        max_bytes -- 최대 파일 크기(bytes, 기본값: settings.UPLOAD_MAX_BYTES)
+        max_pixels -- 최대 픽셀 수(기본값: settings.UPLOAD_MAX_PIXELS)
+    """
+    max_pixels = max_pixels or settings.UPLOAD_MAX_PIXELS
+    check_bytes(len(data), max_bytes)
+    try:
+        size = image_size(data)
+    except PILImage.DecompressionBombError as ex:
+        raise UploadTooLarge(str(ex))
+    if size is None:
+        raise UploadError("이미지 형식을 인식할 수 없습니다.")
+    if size[0] * size[1] > max_pixels:
+        raise UploadTooLarge(
+            "이미지 픽셀 수({}x{})가 최대 픽셀 수({})를 넘습니다.".format(size[0], size[1], max_pixels)
+        )
+
+
+@contextmanager
+def open_buffer(file):
+    """
+    파일 내용을 복사하지 않고 참조하는 buffer(memoryview)
+    - 디스크에 저장된 파일(FILE_UPLOAD_MAX_MEMORY_SIZE 를 넘어 임시 파일로 저장된 업로드 포함):
+      읽기 전용 mmap, 페이지 단위로 필요할 때 읽고 프로세스 메모리에 복사하지 않음
+    - 메모리에 있는 업로드(BytesIO): getbuffer()
+    - 그 외(fileno 가 없는 storage 파일 등): read()
+
+    Keyword arguments:
+        file -- UploadedFile, FieldFile or file object
+    """
+    # Django File -> 실제 file object
+    stream = file
+    while hasattr(stream, "file"):
+        stream = stream.file
+
+    mapped = None
+    if isinstance(stream, io.BytesIO):
+        view = stream.getbuffer()
+    else:
+        try:
+            fileno = stream.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            fileno = None
+        # 빈 파일은 mmap 할 수 없음
+        if fileno is not None and os.fstat(fileno).st_size:
+            mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+        else:
+            file.seek(0)
+            view = memoryview(file.read())
+    try:
+        yield view
+    finally:
+        try:
+            view.release()
+            if mapped is not None:
+                mapped.close()
+        except BufferError:
+            # 참조(numpy 배열 등)가 남아 있으면 참조가 없어질 때 해제
+            pass
+
+
+@contextmanager
+def open_upload(file, max_bytes=None, max_pixels=None):
+    """
+    open_buffer + check_image
+
+    Keyword arguments:
+        file -- UploadedFile, FieldFile or file object
+        max_bytes -- 최대 파일 크기(bytes, 기본값: settings.UPLOAD_MAX_BYTES)
+        max_pixels -- 최대 픽셀 수(기본값: settings.UPLOAD_MAX_PIXELS)
+    """
+    # 파일을 열기 전에 크기부터 확인
+    if getattr(file, "size", None) is not None:
+        check_bytes(file.size, max_bytes)
+    with open_buffer(file) as data:
+        check_image(data, max_bytes, max_pixels)
+        yield data
@@ -0,0 +1,16 @@
+import functools
+
+import cv2
+
+
+@functools.lru_cache(maxsize=128)
+def get_kernel(shape, size):
+    """
+    형태학적 변환(morphological transformations) 커널
+    - shape, size 별로 한 번만 생성하고 재사용(커널은 읽기 전용으로 사용)
+
+    Keyword arguments:
+        shape -- cv2.MORPH_RECT, cv2.MORPH_ELLIPSE ...
+        size -- 커널 크기(width, height)
+    """
+    return cv2.getStructuringElement(shape, size)
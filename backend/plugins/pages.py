@@ -0,0 +1,126 @@
+import threading
+import warnings
+
+import cv2
+import numpy as np
+from PIL import Image as PILImage
+
+from plugins.ingest import BufferReader, UploadError, UploadTooLarge
+
+PDF_MAGIC = b"%PDF-"
+
+# PDFium 은 스레드 안전하지 않으므로 문서 열기, 렌더링, 닫기를 한 스레드씩 수행
+_pdfium_lock = threading.Lock()
+
+
+class PageReader:
+    """
+    여러 페이지 문서(PDF, 여러 페이지 TIFF, 일반 이미지)를 한 페이지씩 디코딩
+    - 페이지 수, 페이지별 픽셀 수는 디코딩 전에 확인
+    - 디코딩한 페이지는 target_size(가장 긴 변, px)에 가깝게 축소해서 반환
+      (PDF: 렌더링 배율, TIFF: 정수 배율 reduce)
+
+    Keyword arguments:
+        data -- document buffer(bytes, memoryview, mmap)
+        max_pages -- 최대 페이지 수
+        max_pixels -- 페이지의 최대 픽셀 수(width * height)
+    """
+
+    def __init__(self, data, max_pages, max_pixels):
+        self.data = data
+        self.is_pdf = bytes(data[:len(PDF_MAGIC)]) == PDF_MAGIC
+        if self.is_pdf:
+            self.count = self._pdf_count()
+        else:
+            self.count = self._image_count(max_pixels)
+        if self.count > max_pages:
+            raise UploadTooLarge(
+                "페이지 수({})가 최대 페이지 수({})를 넘습니다.".format(self.count, max_pages)
+            )
+
+    def _pdf_count(self):
+        try:
+            import pypdfium2
+        except ImportError:
+            raise UploadError("PDF 를 처리하려면 pypdfium2 를 설치해야 합니다.")
+        with _pdfium_lock:
+            try:
+                pdf = pypdfium2.PdfDocument(BufferReader(self.data))
+            except pypdfium2.PdfiumError as ex:
+                raise UploadError("PDF 를 열 수 없습니다.({})".format(ex))
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+
+    def _image_count(self, max_pixels):
+        try:
+            with warnings.catch_warnings():
+                # 픽셀 수 제한은 아래에서 확인
+                warnings.simplefilter("ignore", PILImage.DecompressionBombWarning)
+                img = PILImage.open(BufferReader(self.data))
+                count = getattr(img, "n_frames", 1)
+                # 페이지 헤더(IFD)만 읽고 픽셀 데이터는 디코딩하지 않음
+                for index in range(count):
+                    img.seek(index)
+                    width, height = img.size
+                    if width * height > max_pixels:
+                        raise UploadTooLarge(
+                            "{} 페이지의 픽셀 수({}x{})가 최대 픽셀 수({})를 넘습니다.".format(
+                                index + 1, width, height, max_pixels
+                            )
+                        )
+        except PILImage.DecompressionBombError as ex:
+            raise UploadTooLarge(str(ex))
+        except UploadError:
+            raise
+        except Exception:
+            raise UploadError("이미지 형식을 인식할 수 없습니다.")
+        return count
+
+    def pages(self, target_size):
+        """
+        페이지 순서대로 (페이지 번호(1~), BGR ndarray) 생성
+        - 한 번에 한 페이지만 디코딩하므로 메모리는 처리 중인 페이지 수에 비례
+
+        Keyword arguments:
+            target_size -- 페이지 이미지의 가장 긴 변(px, 이보다 작아지지 않는 범위에서 축소)
+        """
+        if self.is_pdf:
+            yield from self._pdf_pages(target_size)
+        else:
+            yield from self._image_pages(target_size)
+
+    def _pdf_pages(self, target_size):
+        import pypdfium2
+
+        with _pdfium_lock:
+            pdf = pypdfium2.PdfDocument(BufferReader(self.data))
+        try:
+            for index in range(self.count):
+                with _pdfium_lock:
+                    page = pdf[index]
+                    # 가장 긴 변이 target_size 가 되는 배율로 렌더링(1pt = 1px at scale 1)
+                    scale = target_size / max(page.get_size())
+                    img = page.render(scale=scale).to_numpy()
+                    page.close()
+                if img.shape[2] == 4:
+                    img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+                yield index + 1, img
+        finally:
+            with _pdfium_lock:
+                pdf.close()
+
+    def _image_pages(self, target_size):
+        img = PILImage.open(BufferReader(self.data))
+        for index in range(self.count):
+            img.seek(index)
+            if img.format == "JPEG":
+                # JPEG 은 DCT 단계에서 축소해서 디코딩(reduced_decode 와 같은 방식)
+                img.draft("RGB", (target_size, target_size))
+            frame = img.convert("RGB")
+            # 정수 배율 축소(box filter)로 처리 중인 페이지의 메모리를 줄임
+            factor = int(max(frame.size) // target_size)
+            if factor > 1:
+                frame = frame.reduce(factor)
+            yield index + 1, cv2.cvtColor(np.asarray(frame), cv2.COLOR_RGB2BGR)
@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import threading
+
+import cv2
+
+from plugins.detector import Detection
+
+_pool = None
+_pool_lock = threading.Lock()
+# 작업 프로세스별 Detection 엔진(생성 옵션별로 하나)
+_detectors = {}
+
+
+def _init_worker():
+    # 프로세스 하나당 코어 하나를 사용하도록 OpenCV 내부 스레드 비활성화
+    cv2.setNumThreads(1)
+
+
+def get_pool(max_workers=None):
+    """
+    Detection 처리용 프로세스 풀(최초 호출 시 생성, 이후 재사용)
+
+    Keyword arguments:
+        max_workers -- 프로세스 수(기본값: CPU 코어 수)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count(),
+                # 스레드가 실행 중인 서버 프로세스를 fork 하지 않도록 spawn 사용
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def detect_bytes(data, crop=True, watermark=False, options=None):
+    """
+    이미지 바이트(또는 디코딩된 페이지 이미지)에서 표 영역 검출(프로세스 풀에서 실행)
+
+    Keyword arguments:
+        data -- image bytes or decoded image(BGR ndarray)
+        crop -- ROI 영역 분리 여부
+        watermark -- 워터마크 제거 여부
+        options -- Detection 생성 옵션
+
+    Returns:
+        DetectionResult
+    """
+    options = options or {}
+    key = tuple(sorted(options.items()))
+    if key not in _detectors:
+        _detectors[key] = Detection(**options)
+    return _detectors[key].detect(data, crop=crop, watermark=watermark)
@@ -0,0 +1,231 @@
+import numpy as np
+
+# 한 상자가 차지할 수 있는 최대 bucket 수(넘는 상자는 모든 좌표에서 따로 확인)
+MAX_BUCKETS_PER_BOX = 64
+
+
+class BoxIndex:
+    """
+    셀 좌표(x, y, w, h)에 대한 균일 격자(uniform grid) 공간 색인
+    - 좌표 평면을 셀 크기(중간값)의 bucket 으로 나누고 bucket 마다 겹치는 상자 목록 보관
+    - 좌표가 속한 상자 검색은 bucket 하나의 후보만 확인하므로 상자 수와 관계없이 일정한 시간
+      (여러 좌표를 한 번에 numpy 배열 연산으로 검색)
+    - 표 전체처럼 큰 상자(MAX_BUCKETS_PER_BOX 초과)는 bucket 에 넣지 않고 따로 확인
+
+    Keyword arguments:
+        boxes -- 상자 좌표(x, y, w, h) 목록 또는 (n, 4) 배열
+        bucket_size -- bucket 크기(width, height), 기본값: 상자 너비, 높이의 중간값
+    """
+
+    def __init__(self, boxes, bucket_size=None):
+        boxes = np.asarray(boxes, np.float64).reshape(-1, 4)
+        self.x0, self.y0 = boxes[:, 0], boxes[:, 1]
+        self.x1, self.y1 = boxes[:, 0] + boxes[:, 2], boxes[:, 1] + boxes[:, 3]
+        self.area = boxes[:, 2] * boxes[:, 3]
+        if not len(boxes):
+            self.table = np.full((1, 0), -1, np.int64)
+            self.large = np.zeros(0, np.int64)
+            self.grid_shape = (1, 1)
+            self.bucket_size = (1.0, 1.0)
+            return
+
+        if bucket_size is None:
+            bucket_size = (np.median(boxes[:, 2]), np.median(boxes[:, 3]))
+        self.bucket_size = tuple(max(1.0, float(size)) for size in bucket_size)
+        width, height = self.bucket_size
+        # 좌표 평면의 원점은 (0, 0), 음수 좌표는 첫 번째 bucket 에 포함
+        bx0 = np.clip(self.x0 // width, 0, None).astype(np.int64)
+        by0 = np.clip(self.y0 // height, 0, None).astype(np.int64)
+        bx1 = np.maximum(np.ceil(self.x1 / width).astype(np.int64) - 1, bx0)
+        by1 = np.maximum(np.ceil(self.y1 / height).astype(np.int64) - 1, by0)
+        self.grid_shape = (int(by1.max()) + 1, int(bx1.max()) + 1)
+
+        spans_x, spans_y = bx1 - bx0 + 1, by1 - by0 + 1
+        counts = spans_x * spans_y
+        small = counts <= MAX_BUCKETS_PER_BOX
+        self.large = np.flatnonzero(~small)
+
+        # (상자, bucket) 쌍 생성: 상자마다 겹치는 bucket 을 행 우선 순서로 나열
+        ids = np.flatnonzero(small)
+        counts = counts[ids]
+        owner = np.repeat(ids, counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        col = bx0[owner] + offset % spans_x[owner]
+        row = by0[owner] + offset // spans_x[owner]
+        bucket = row * self.grid_shape[1] + col
+
+        # bucket 별 상자 목록을 (bucket 수, 최대 상자 수) 배열로 저장(빈 자리: -1)
+        order = np.argsort(bucket, kind="stable")
+        bucket, owner = bucket[order], owner[order]
+        starts = np.searchsorted(bucket, bucket, side="left")
+        slot = np.arange(len(bucket)) - starts
+        depth = int(slot.max()) + 1 if len(slot) else 0
+        self.table = np.full((self.grid_shape[0] * self.grid_shape[1], depth), -1, np.int64)
+        self.table[bucket, slot] = owner
+
+    def __len__(self):
+        return len(self.area)
+
+    def query(self, points):
+        """
+        좌표마다 좌표를 포함하는 상자 중 가장 작은(안쪽) 상자의 index
+
+        Keyword arguments:
+            points -- 좌표(x, y) 목록 또는 (m, 2) 배열
+
+        Returns:
+            (m,) index 배열(포함하는 상자가 없으면 -1)
+        """
+        points = np.asarray(points, np.float64).reshape(-1, 2)
+        px, py = points[:, :1], points[:, 1:]
+        width, height = self.bucket_size
+        col, row = np.floor(px[:, 0] / width), np.floor(py[:, 0] / height)
+        inside = (col >= 0) & (row >= 0) & (col < self.grid_shape[1]) & (row < self.grid_shape[0])
+        bucket = np.where(inside, row * self.grid_shape[1] + col, 0).astype(np.int64)
+
+        candidates = self.table[bucket]
+        candidates[~inside] = -1
+        candidates = np.concatenate(
+            (candidates, np.broadcast_to(self.large, (len(points), len(self.large)))), axis=1
+        )
+        safe = np.maximum(candidates, 0)
+        hit = (
+            (candidates >= 0)
+            & (self.x0[safe] <= px)
+            & (px < self.x1[safe])
+            & (self.y0[safe] <= py)
+            & (py < self.y1[safe])
+        )
+        area = np.where(hit, self.area[safe], np.inf)
+        if not area.shape[1]:
+            return np.full(len(points), -1, np.int64)
+        best = np.argmin(area, axis=1)
+        rows = np.arange(len(points))
+        return np.where(hit[rows, best], candidates[rows, best], -1)
+
+
+def field_centers(fields):
+    """
+    OCR 결과 field 별 boundingPoly 꼭지점의 중심 좌표
+
+    Returns:
+        (len(fields), 2) 배열(꼭지점이 없는 field: nan)
+    """
+    centers = np.full((len(fields), 2), np.nan)
+    for index, field in enumerate(fields):
+        vertices = field.get("boundingPoly", {}).get("vertices") or []
+        if vertices:
+            centers[index] = (
+                sum(v.get("x", 0) for v in vertices) / len(vertices),
+                sum(v.get("y", 0) for v in vertices) / len(vertices),
+            )
+    return centers
+
+
+def transform_field(field, matrix):
+    """ field 의 boundingPoly 꼭지점 좌표를 3x3 변환 행렬(원근 변환)로 변환한 복사본 """
+    vertices = field.get("boundingPoly", {}).get("vertices") or []
+    points = np.array([[v.get("x", 0), v.get("y", 0), 1.0] for v in vertices]).reshape(-1, 3)
+    mapped = points @ np.asarray(matrix, np.float64).reshape(3, 3).T
+    mapped = mapped[:, :2] / mapped[:, 2:]
+    result = dict(field)
+    result["boundingPoly"] = {"vertices": [{"x": x, "y": y} for x, y in mapped.tolist()]}
+    return result
+
+
+def assign_fields(fields, boxes, transform=None):
+    """
+    OCR 결과 fields 를 중심 좌표가 포함된 셀로 분류(BoxIndex)
+
+    Keyword arguments:
+        fields -- OCR 엔진 응답의 fields
+        boxes -- 셀 좌표(x, y, w, h) 목록
+        transform -- field 좌표를 셀 좌표 기준으로 변환하는 3x3 행렬(None: 변환하지 않음)
+
+    Returns:
+        [{"box": [x, y, w, h], "text": "...", "fields": [...]}, ...] (boxes 순서)
+    """
+    fields = list(fields or [])
+    if transform is not None:
+        fields = [transform_field(field, transform) for field in fields]
+    cells = [{"box": list(box), "text": "", "fields": []} for box in boxes]
+    if fields and cells:
+        for field, index in zip(fields, BoxIndex(boxes).query(field_centers(fields))):
+            if index >= 0:
+                cells[index]["fields"].append(field)
+    for cell in cells:
+        cell["text"] = " ".join(field.get("inferText", "") for field in cell["fields"])
+    return cells
+
+
+def edge_clusters(edges, tolerance):
+    """ 정렬된 좌표에서 tolerance 이내로 이어지는 좌표들을 묶은 구간별 시작 좌표 """
+    edges = np.sort(edges)
+    if not len(edges):
+        return edges
+    return edges[np.concatenate(([True], np.diff(edges) > tolerance))]
+
+
+def table_layout(boxes, tolerance=8):
+    """
+    셀 좌표로부터 행 x 열 격자 위치 추정(grid_engine="contours" 결과)
+    - 셀의 왼쪽/위쪽 좌표를 tolerance 이내끼리 묶어 열/행 시작 위치로 사용하고,
+      셀 범위에 포함된 열/행 시작 위치 수를 병합 크기로 사용
+
+    Returns:
+        (rows, cols, [(row, col, rowspan, colspan), ...])
+    """
+    boxes = np.asarray(boxes, np.float64).reshape(-1, 4)
+    col_starts = edge_clusters(boxes[:, 0], tolerance)
+    row_starts = edge_clusters(boxes[:, 1], tolerance)
+    col = np.searchsorted(col_starts, boxes[:, 0] + tolerance, side="right") - 1
+    row = np.searchsorted(row_starts, boxes[:, 1] + tolerance, side="right") - 1
+    col_end = np.searchsorted(col_starts, boxes[:, 0] + boxes[:, 2] - tolerance, side="left")
+    row_end = np.searchsorted(row_starts, boxes[:, 1] + boxes[:, 3] - tolerance, side="left")
+    spans = np.column_stack(
+        (row, col, np.maximum(row_end - row, 1), np.maximum(col_end - col, 1))
+    )
+    return len(row_starts), len(col_starts), [tuple(span) for span in spans.tolist()]
+
+
+def make_table(cells, grid=None):
+    """
+    셀 단위 인식 결과를 표 형태(행 x 열)로 변환
+
+    Keyword arguments:
+        cells -- assign_fields, CellAtlas.map_fields 결과
+        grid -- bounding_boxes["grid"] 와 셀 좌표(boxes)
+                (grid_engine="projection", None 이거나 셀이 없으면 좌표로 격자 추정)
+
+    Returns:
+        {"rows": 행 수, "cols": 열 수,
+         "cells": [{"row", "col", "rowspan", "colspan", "box", "text"}, ...] (행, 열 순서),
+         "grid": 행 x 열 배열(칸마다 해당 셀의 text, 병합 셀은 첫 번째 칸에만)}
+    """
+    boxes = [tuple(cell["box"]) for cell in cells]
+    spans = None
+    if grid is not None:
+        data, grid_boxes = grid
+        positions = dict(zip((tuple(box) for box in grid_boxes), map(tuple, data["cells"])))
+        if all(box in positions for box in boxes):
+            rows, cols = data["rows"], data["cols"]
+            spans = [positions[box] for box in boxes]
+    if spans is None:
+        rows, cols, spans = table_layout(boxes)
+
+    table = [[None] * cols for _ in range(rows)]
+    result = []
+    for cell, (row, col, rowspan, colspan) in sorted(zip(cells, spans), key=lambda c: c[1][:2]):
+        result.append(
+            {
+                "row": row,
+                "col": col,
+                "rowspan": rowspan,
+                "colspan": colspan,
+                "box": cell["box"],
+                "text": cell["text"],
+            }
+        )
+        if table[row][col] is None:
+            table[row][col] = cell["text"]
+    return {"rows": rows, "cols": cols, "cells": result, "grid": table}
@@ -0,0 +1,88 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+
+MESSAGE_PATTERN = re.compile(rb'name="message"\r\n\r\n(.*?)\r\n--', re.S)
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # 동시 연결이 많은 부하 테스트에서 연결이 거부되지 않도록 listen backlog 확대
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StubOCRServer:
+    """
+    테스트/벤치마크용 OCR 엔진(CLOVA OCR V2 형식) 서버
+    - 요청마다 delay + 이미지 수 * image_delay 초 후 응답
+    - 받은 요청 본문은 requests 에 기록
+
+    Keyword arguments:
+        delay -- 요청당 처리 시간(seconds)
+        image_delay -- 이미지당 처리 시간(seconds)
+        fields -- 이미지별로 응답할 fields
+        statuses -- 요청 순서대로 응답할 status code(모두 사용한 뒤에는 200)
+    """
+
+    def __init__(self, delay=0.0, image_delay=0.0, fields=None, statuses=()):
+        self.delay = delay
+        self.image_delay = image_delay
+        self.fields = fields or [{"inferText": "text"}]
+        self.statuses = list(statuses)
+        self.requests = []
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                match = MESSAGE_PATTERN.search(body)
+                images = json.loads(match.group(1))["images"] if match else [{}]
+                with server.lock:
+                    server.requests.append(body)
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    code = server.statuses.pop(0) if server.statuses else 200
+                time.sleep(server.delay + server.image_delay * len(images))
+                with server.lock:
+                    server.active -= 1
+
+                payload = json.dumps(
+                    {
+                        "images": [
+                            {"name": image.get("name"), "fields": server.fields_for(image)}
+                            for image in images
+                        ]
+                    }
+                ).encode()
+                try:
+                    self.send_response(code)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # timeout 으로 클라이언트가 먼저 연결을 끊은 경우
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = StubHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}/".format(self.httpd.server_port)
+
+    def fields_for(self, image):
+        return self.fields
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+
+
+def make_table_image(
+    size=2048,
+    rows=20,
+    cols=8,
+    skew=0.05,
+    watermark=False,
+    text=True,
+    background=120,
+    seed=0,
+    merges=(),
+):
+    """
+    벤치마크/테스트용 표 이미지 생성
+    - 회색 배경 위에 원근 왜곡된 표(세로 3:4 비율)를 배치
+
+    Keyword arguments:
+        size -- 이미지의 가장 긴 변(px)
+        rows, cols -- 표의 행, 열 수
+        skew -- 꼭지점 위치를 흔드는 정도(이미지 크기 대비 비율, 0: 왜곡 없음)
+        watermark -- 대각선 방향 반투명 워터마크 추가 여부
+        text -- 셀마다 숫자 텍스트 추가 여부
+        background -- 배경 밝기(0~255)
+        seed -- 난수 seed
+        merges -- 병합 셀 (row, col, rowspan, colspan) 목록(병합된 셀 사이의 선을 지움)
+    """
+    rng = np.random.default_rng(seed)
+    height, width = size, size * 3 // 4
+    table_h, table_w = int(height * 0.8), int(width * 0.8)
+    line = max(2, size // 700)
+
+    table = np.full((table_h, table_w, 3), 255, np.uint8)
+    for r in range(rows + 1):
+        y = r * (table_h - 1) // rows
+        cv2.line(table, (0, y), (table_w - 1, y), (0, 0, 0), line)
+    for c in range(cols + 1):
+        x = c * (table_w - 1) // cols
+        cv2.line(table, (x, 0), (x, table_h - 1), (0, 0, 0), line)
+
+    # 병합 셀 내부의 선을 지우고, 병합 셀에는 첫 번째(왼쪽 위) 셀에만 텍스트 추가
+    covered = set()
+    for row, col, rowspan, colspan in merges:
+        top, left = row * (table_h - 1) // rows, col * (table_w - 1) // cols
+        bottom = (row + rowspan) * (table_h - 1) // rows
+        right = (col + colspan) * (table_w - 1) // cols
+        cv2.rectangle(
+            table, (left + line, top + line), (right - line, bottom - line), (255, 255, 255), -1
+        )
+        covered.update(
+            (r, c) for r in range(row, row + rowspan) for c in range(col, col + colspan)
+        )
+        covered.discard((row, col))
+
+    if text:
+        # 5자리 숫자가 셀 안에 들어가도록 글자 크기 조정
+        scale = min(table_h / rows / 60, table_w / cols / 150)
+        for r in range(rows):
+            for c in range(cols):
+                if (r, c) in covered:
+                    continue
+                origin = (c * table_w // cols + line * 4, (r + 1) * table_h // rows - line * 4)
+                value = str(rng.integers(0, 10 ** 5))
+                cv2.putText(
+                    table, value, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), max(1, line // 2)
+                )
+
+    if watermark:
+        mark = np.full_like(table, 255)
+        cv2.putText(
+            mark,
+            "SAMPLE",
+            (table_w // 10, table_h * 2 // 3),
+            cv2.FONT_HERSHEY_DUPLEX,
+            table_w / 200,
+            (200, 200, 200),
+            max(4, size // 100),
+        )
+        rotation = cv2.getRotationMatrix2D((table_w / 2, table_h / 2), 35, 1.0)
+        mark = cv2.warpAffine(mark, rotation, (table_w, table_h), borderValue=(255, 255, 255))
+        table = np.minimum(table, mark)
+
+    margin_x, margin_y = (width - table_w) / 2, (height - table_h) / 2
+    dst = np.float32(
+        [
+            [margin_x, margin_y],
+            [margin_x + table_w, margin_y],
+            [margin_x + table_w, margin_y + table_h],
+            [margin_x, margin_y + table_h],
+        ]
+    )
+    dst += rng.uniform(-skew, skew, dst.shape).astype(np.float32) * min(margin_x, margin_y) * 10
+    src = np.float32([[0, 0], [table_w, 0], [table_w, table_h], [0, table_h]])
+    matrix = cv2.getPerspectiveTransform(src, dst)
+    return cv2.warpPerspective(
+        table, matrix, (width, height), borderValue=(background, background, background)
+    )
+
+
+def encode(img, ext=".jpg"):
+    """ 이미지를 업로드 형식(bytes)으로 인코딩 """
+    return cv2.imencode(ext, img)[1].tobytes()
@@ -0,0 +1,241 @@
+from collections import OrderedDict
+import threading
+
+import cv2
+import numpy as np
+
+from plugins.kernels import get_kernel
+
+# 레이아웃 지문을 계산할 축소 이미지의 폭(px, 정수 배율로 축소하므로 근사값)
+PREVIEW_WIDTH = 256
+# 가로/세로 투영(projection) 프로파일 구간 수
+PROFILE_BINS = 128
+
+
+def line_centers(profile):
+    """ 투영 프로파일에서 선으로 판단되는 구간들의 중심 위치(0~1) """
+    on = profile > profile.max() * 0.5 if profile.max() > 0 else np.zeros(len(profile), bool)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], on.view(np.int8), [0]))))
+    starts, ends = edges[::2], edges[1::2]
+    return (starts + ends) / 2 / len(profile)
+
+
+def profile_bits(profile, bins=PROFILE_BINS):
+    """ 투영 프로파일을 bins 개 구간으로 줄여 선이 있는 구간만 표시한 bit 배열 """
+    binned = cv2.resize(profile[None], (bins, 1), interpolation=cv2.INTER_AREA)[0]
+    return binned > binned.max() * 0.3 if binned.max() > 0 else np.zeros(bins, bool)
+
+
+def bits_distance(a, b):
+    """ 1 구간 이내에 대응하는 선이 없는 구간의 비율(0: 같은 배치) """
+    near_a = np.convolve(a, [1, 1, 1], "same") > 0
+    near_b = np.convolve(b, [1, 1, 1], "same") > 0
+    missing = np.count_nonzero(a & ~near_b) + np.count_nonzero(b & ~near_a)
+    return missing / max(1, np.count_nonzero(a) + np.count_nonzero(b))
+
+
+class Layout:
+    """
+    이미지의 레이아웃 지문(fingerprint)
+    - 축소 이미지에서 추출한 세로선/가로선의 투영 프로파일 중 선이 있는 구간만 남긴 bit 배열
+      (2 x PROFILE_BINS bits)
+
+    Keyword arguments:
+        img -- grayscale image(get_frame 입력 이미지)
+    """
+
+    def __init__(self, img):
+        height, width = img.shape[:2]
+        self.shape = (height, width)
+        # 정수 배율 INTER_AREA 축소는 임의 배율보다 빠름
+        factor = max(1, round(width / PREVIEW_WIDTH))
+        preview = cv2.resize(img, None, fx=1 / factor, fy=1 / factor, interpolation=cv2.INTER_AREA)
+        inv_img = 255 - preview
+        # 어두운(선, 글자) 영역
+        self.dark = cv2.threshold(inv_img, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+
+        # 축소 이미지에서 get_frame 과 같은 방식(오프닝)으로 글자를 지우고 가로선, 세로선만 남김
+        kernel_len = max(3, preview.shape[1] // 16)
+        ver_kernel = get_kernel(cv2.MORPH_RECT, (1, kernel_len))
+        hor_kernel = get_kernel(cv2.MORPH_RECT, (kernel_len, 1))
+        vertical_lines = cv2.morphologyEx(inv_img, cv2.MORPH_OPEN, ver_kernel)
+        horizontal_lines = cv2.morphologyEx(inv_img, cv2.MORPH_OPEN, hor_kernel)
+
+        # 선 영역(템플릿으로 등록되는 경우 새 이미지와 비교하는 데 사용)
+        self.lines = cv2.threshold(
+            cv2.max(vertical_lines, horizontal_lines), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU
+        )[1]
+
+        col_profile = vertical_lines.mean(axis=0, dtype=np.float32)
+        row_profile = horizontal_lines.mean(axis=1, dtype=np.float32)
+        self.cols, self.rows = line_centers(col_profile), line_centers(row_profile)
+        self.bits = (profile_bits(col_profile), profile_bits(row_profile))
+
+    def distance(self, other):
+        return max(bits_distance(a, b) for a, b in zip(self.bits, other.bits))
+
+    def mapping(self, other):
+        """
+        other(템플릿)의 선 위치를 이 이미지의 선 위치에 대응시키는 축별 좌표(0~1) 목록
+        - 가장 가까운 선끼리 대응시키고 선 사이 좌표는 선형 보간
+        """
+        axes = []
+        for src, dst in ((other.cols, self.cols), (other.rows, self.rows)):
+            pairs = [(0.0, 0.0), (1.0, 1.0)]
+            tolerance = 1.5 / PROFILE_BINS
+            for position in src:
+                if len(dst):
+                    nearest = dst[np.argmin(np.abs(dst - position))]
+                    if abs(nearest - position) <= tolerance:
+                        pairs.append((position, nearest))
+            pairs.sort()
+            axes.append((np.array([p[0] for p in pairs]), np.array([p[1] for p in pairs])))
+        return axes
+
+
+class Template:
+    """
+    등록된 양식의 레이아웃 지문, 셀 좌표
+
+    Keyword arguments:
+        layout -- 템플릿 이미지의 Layout
+        boxes -- get_frame 으로 추출한 셀 좌표(x, y, w, h) 목록
+    """
+
+    def __init__(self, layout, boxes):
+        self.layout = layout
+        # 템플릿 비교에는 새 이미지의 어두운 영역만 사용하므로 템플릿에는 선 영역만 보관
+        self.lines = layout.lines
+        layout.dark = layout.lines = None
+        height, width = layout.shape
+        boxes = np.array(boxes, np.float64).reshape(-1, 4)
+        # 셀 좌표를 이미지 크기 기준 비율(x0, y0, x1, y1)로 저장
+        self.boxes = np.column_stack(
+            [
+                boxes[:, 0] / width,
+                boxes[:, 1] / height,
+                (boxes[:, 0] + boxes[:, 2]) / width,
+                (boxes[:, 1] + boxes[:, 3]) / height,
+            ]
+        )
+
+    def coverage(self, layout, axes):
+        """ 정렬한 템플릿 선 영역 중 layout 이미지에서도 어두운 영역의 비율 """
+        height, width = layout.dark.shape
+        (tx, lx), (ty, ly) = axes
+        # layout 좌표 -> 템플릿 좌표(역방향 매핑)
+        map_x = np.interp((np.arange(width) + 0.5) / width, lx, tx) * self.lines.shape[1] - 0.5
+        map_y = np.interp((np.arange(height) + 0.5) / height, ly, ty) * self.lines.shape[0] - 0.5
+        lines = cv2.remap(
+            self.lines,
+            np.tile(map_x.astype(np.float32), (height, 1)),
+            np.tile(map_y.astype(np.float32)[:, None], (1, width)),
+            cv2.INTER_NEAREST,
+        )
+        total = np.count_nonzero(lines)
+        if not total:
+            return 0.0
+        dark = cv2.dilate(layout.dark, np.ones((3, 3), np.uint8))
+        return np.count_nonzero(lines & dark) / total
+
+    def align(self, layout, axes):
+        """ 템플릿 셀 좌표를 layout 이미지 좌표(x, y, w, h)로 변환 """
+        height, width = layout.shape
+        (tx, lx), (ty, ly) = axes
+        x0 = np.rint(np.interp(self.boxes[:, 0], tx, lx) * width).astype(int)
+        y0 = np.rint(np.interp(self.boxes[:, 1], ty, ly) * height).astype(int)
+        x1 = np.rint(np.interp(self.boxes[:, 2], tx, lx) * width).astype(int)
+        y1 = np.rint(np.interp(self.boxes[:, 3], ty, ly) * height).astype(int)
+        boxes = [
+            (int(x), int(y), int(max(1, r - x)), int(max(1, b - y)))
+            for x, y, r, b in zip(x0, y0, x1, y1)
+        ]
+        return tuple(sorted(boxes, key=lambda box: (box[1], box[0])))
+
+
+class TemplateRegistry:
+    """
+    자주 들어오는 양식(template)의 셀 좌표 저장소
+    1. get_frame 결과를 레이아웃 지문과 함께 등록
+    2. 새 이미지의 지문과 가까운 템플릿을 찾아 선 위치 기준으로 셀 좌표 정렬
+    3. 정렬한 템플릿의 선이 새 이미지에서도 충분히 겹치는 경우에만 재사용
+    - capacity 를 넘으면 가장 오래 사용되지 않은 템플릿 삭제(LRU)
+
+    Keyword arguments:
+        capacity -- 최대 템플릿 수
+        max_distance -- 같은 양식으로 판단할 지문 거리의 최대값(0~1)
+        min_coverage -- 재사용에 필요한 템플릿 선 영역의 최소 겹침 비율(0~1)
+    """
+
+    def __init__(self, capacity=64, max_distance=0.1, min_coverage=0.9):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.min_coverage = min_coverage
+        self.templates = OrderedDict()
+        self.hits = self.misses = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.templates)
+
+    def match(self, layout):
+        """
+        layout 과 같은 양식의 템플릿으로 셀 좌표 계산
+
+        Returns:
+            셀 좌표(x, y, w, h) 목록, 일치하는 템플릿이 없으면 None
+        """
+        with self._lock:
+            candidates = sorted(
+                (template.layout.distance(layout), key, template)
+                for key, template in self.templates.items()
+            )
+
+        for distance, key, template in candidates:
+            if distance > self.max_distance:
+                break
+            axes = layout.mapping(template.layout)
+            if template.coverage(layout, axes) < self.min_coverage:
+                continue
+            with self._lock:
+                if key in self.templates:
+                    self.templates.move_to_end(key)
+                self.hits += 1
+            return template.align(layout, axes)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def add(self, layout, boxes):
+        """
+        get_frame 결과를 템플릿으로 등록
+
+        Keyword arguments:
+            layout -- get_frame 입력 이미지의 Layout
+            boxes -- 셀 좌표(x, y, w, h) 목록
+        """
+        template = Template(layout, boxes)
+        with self._lock:
+            self.templates[self._next_id] = template
+            self._next_id += 1
+            while len(self.templates) > self.capacity:
+                self.templates.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.templates.clear()
+            self.hits = self.misses = 0
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(capacity):
+    """ 프로세스 공용 TemplateRegistry(capacity 별로 하나) """
+    with _registries_lock:
+        if capacity not in _registries:
+            _registries[capacity] = TemplateRegistry(capacity)
+        return _registries[capacity]
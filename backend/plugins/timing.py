@@ -0,0 +1,133 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import contextvars
+import functools
+import threading
+import time
+
+# 단계별 실행 시간 histogram 구간(seconds)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 요청 처리 중 측정된 단계별 실행 시간(Server-Timing 헤더용)
+_timings = contextvars.ContextVar("timings", default=None)
+
+# 측정 활성화 여부(비활성화 시 timer/timed 는 flag 확인만 수행)
+enabled = False
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def configure(enable):
+    global enabled
+    enabled = bool(enable)
+
+
+def record(name, seconds):
+    """ 단계 실행 시간 기록(histogram + 현재 요청의 timings) """
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, Histogram())
+    histogram.observe(seconds)
+
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timer(name):
+    """ with 블록의 실행 시간 측정 """
+    if not enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def timed(name):
+    """ 함수 실행 시간 측정 decorator """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def start_request():
+    """ 요청 단위 측정 시작, 측정 결과(dict)와 종료용 token 반환 """
+    timings = {}
+    return timings, _timings.set(timings)
+
+
+def end_request(token):
+    _timings.reset(token)
+
+
+def bind(func):
+    """
+    다른 스레드(executor)에서 실행할 함수에 현재 요청의 측정 context 연결
+    - contextvars 는 스레드 풀로 전달되지 않으므로 context 를 복사해서 실행
+    """
+    if not enabled:
+        return func
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def server_timing(timings):
+    """ Server-Timing 헤더 값 생성(ms) """
+    return ", ".join(
+        "{};dur={:.1f}".format(name, seconds * 1000) for name, seconds in timings.items()
+    )
+
+
+def prometheus(prefix="ocr_api_stage_seconds"):
+    """ 단계별 histogram 을 Prometheus text format 으로 변환 """
+    lines = [
+        "# HELP {} Time spent in each processing stage.".format(prefix),
+        "# TYPE {} histogram".format(prefix),
+    ]
+    for name in sorted(_histograms):
+        counts, total, count = _histograms[name].snapshot()
+        buckets = _histograms[name].buckets
+        cumulative = 0
+        for bound, bucket_count in zip(buckets + ("+Inf",), counts):
+            cumulative += bucket_count
+            lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(prefix, name, bound, cumulative))
+        lines.append('{}_sum{{stage="{}"}} {}'.format(prefix, name, total))
+        lines.append('{}_count{{stage="{}"}} {}'.format(prefix, name, count))
+    return "\n".join(lines) + "\n"